@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from datetime import datetime, timezone
 from auth.roles import require_role
 from auth.auth import get_current_user
+from auth.principal_cache import notify_user_changed
 from database.deps import get_db
 from database.models import AdminRequest, User
 
@@ -69,6 +70,7 @@ def approve_admin(username: str, db: Session = Depends(get_db), owner=Depends(re
 
     user.role = "admin"
     request.status = "approved"
+    notify_user_changed(db, username)
 
     db.commit()
     return {"msg": f"Пользователь {username} теперь админ"}
@@ -90,6 +92,7 @@ def reject_admin(username: str, db: Session = Depends(get_db), owner=Depends(req
 
     user.role = "user"
     request.status = "rejected"
+    notify_user_changed(db, username)
     
     db.commit()
     return {"msg": f"Заявка от пользователя {username} отклонена"}
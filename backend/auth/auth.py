@@ -4,6 +4,7 @@ from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from database.fake_users import users_db
 from database.models import User
+from auth.principal_cache import Principal, principal_cache
 from database.deps import get_db
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
@@ -24,7 +25,8 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+def get_current_user(request: Request, db: Session = Depends(get_db)) -> Principal:
+    """Пользователь из токена; роль берётся из кеша, в БД идём только при промахе"""
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=401, detail="Токен отсутствует")
@@ -35,9 +37,15 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
         if not username:
             raise HTTPException(status_code=401, detail="Неверный токен")
 
-        user = db.query(User).filter(User.username == username).first()
+        principal = principal_cache.get(username)
+        if principal:
+            return principal
+
+        user = db.query(User.id, User.username, User.role).filter(User.username == username).first()
         if not user:
             raise HTTPException(status_code=404, detail="Пользователь не найден")
-        return user
+        principal = Principal(id=user.id, username=user.username, role=user.role.value)
+        principal_cache.put(principal)
+        return principal
     except JWTError:
         raise HTTPException(status_code=401, detail="Неверный токен")
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Кеш пользователей для get_current_user.
+
+Каждый запрос с авторизацией раньше читал строку users только ради роли.
+Теперь (username → id, роль) хранится в ограниченном TTL-кеше процесса,
+и повторные запросы обходятся без обращения к БД.
+
+Изменения пользователя (смена роли, пароля) рассылаются через Postgres
+LISTEN/NOTIFY: notify_user_changed отправляет уведомление в той же
+транзакции, а слушатель в каждом процессе сбрасывает запись после коммита.
+Если слушатель потерял соединение, кеш очищается при переподключении;
+в худшем случае устаревшая запись живёт не дольше AUTH_CACHE_TTL.
+"""
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+import psycopg2
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database.database import engine
+
+load_dotenv()
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+NOTIFY_CHANNEL = "auth_user_changed"
+LISTEN_RECONNECT_DELAY = 5
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Лёгкая замена ORM-объекта User для проверки доступа"""
+    id: int
+    username: str
+    role: str
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Principal, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def get(self, username: str) -> Principal | None:
+        self._ensure_listener()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+            return principal
+
+    def put(self, principal: Principal):
+        with self._lock:
+            self._entries[principal.username] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _ensure_listener(self):
+        # После fork (воркеры uvicorn, multiprocessing) поток слушателя нужен заново
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._entries.clear()
+            self._listener_pid = pid
+        threading.Thread(target=self._listen, name="principal-cache-listener", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                # Отдельное соединение вне пула: оно занято слушателем всё время работы процесса
+                cargs, cparams = engine.dialect.create_connect_args(engine.url)
+                conn = psycopg2.connect(*cargs, **cparams)
+                try:
+                    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    # Пока соединения не было, уведомления могли потеряться
+                    self.clear()
+                    while True:
+                        if select.select([conn], [], [], 60) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            self.invalidate(conn.notifies.pop(0).payload)
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"[!] Слушатель изменений пользователей: {e}")
+                self.clear()
+                time.sleep(LISTEN_RECONNECT_DELAY)
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES)
+
+
+def notify_user_changed(db: Session, username: str):
+    """Сбрасывает кеш пользователя во всех процессах; уведомление уйдёт при коммите db"""
+    principal_cache.invalidate(username)
+    db.execute(text("SELECT pg_notify(:channel, :username)"), {"channel": NOTIFY_CHANNEL, "username": username})
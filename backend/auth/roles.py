@@ -1,9 +1,9 @@
 from fastapi import Depends, HTTPException
 from auth.auth import get_current_user
-from database.models import User
+from auth.principal_cache import Principal
 
 def require_role(*roles: str):
-    def checker(user: User = Depends(get_current_user)):
+    def checker(user: Principal = Depends(get_current_user)):
         if user.role not in roles:
             raise HTTPException(status_code=403, detail="Недостаточно прав")
         return user
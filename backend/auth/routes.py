@@ -9,6 +9,7 @@ from auth.auth import (
     create_access_token, 
     get_current_user
 )
+from auth.principal_cache import Principal, notify_user_changed
 from database.fake_users import users_db
 from fastapi.security import OAuth2PasswordRequestForm
 
@@ -64,7 +65,7 @@ def login(user: UserCreate, db: Session = Depends(get_db), response: Response =
 
 
 @router.get("/me")
-def read_me(user: User = Depends(get_current_user)):
+def read_me(user: Principal = Depends(get_current_user)):
     return {
         "username": user.username,
         "role": user.role
@@ -72,7 +73,7 @@ def read_me(user: User = Depends(get_current_user)):
 
 
 @router.post("/change-password")
-def change_password(data: PasswordChange, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def change_password(data: PasswordChange, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     db_user = db.query(User).filter(User.username == current_user.username).first()
 
     if not db_user:
@@ -82,6 +83,7 @@ def change_password(data: PasswordChange, db: Session = Depends(get_db), current
         raise HTTPException(status_code=401, detail="Старый пароль неверен")
 
     db_user.hashed_password = get_password_hash(data.new_password)
+    notify_user_changed(db, db_user.username)
     db.commit()
 
     return {"msg": "Пароль успешно изменён"}
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Бенчмарк накладных расходов авторизации на запрос.
+
+Запуск: python -m benchmarks.bench_auth USERNAME [--requests N]
+Нужна база из DATABASE_URL с существующим пользователем USERNAME.
+Сравниваются:
+- без кеша: разбор JWT и запрос роли в БД, как было до кеша пользователей;
+- с кешем: разбор JWT и чтение роли из principal_cache.
+"""
+import argparse
+import sys
+import time
+from starlette.requests import Request
+
+from auth.auth import create_access_token, get_current_user
+from auth.principal_cache import principal_cache
+from database.database import SessionLocal
+
+
+def make_request(token: str) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/me",
+        "headers": [(b"cookie", f"access_token={token}".encode())],
+    })
+
+
+def bench(token: str, requests: int, cached: bool) -> float:
+    """Среднее время get_current_user в микросекундах; сессия БД — новая на каждый запрос, как в get_db"""
+    request = make_request(token)
+    principal_cache.clear()
+    start = time.perf_counter()
+    for _ in range(requests):
+        if not cached:
+            principal_cache.clear()
+        db = SessionLocal()
+        try:
+            get_current_user(request, db)
+        finally:
+            db.close()
+    return (time.perf_counter() - start) / requests * 1_000_000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("username", help="Существующий пользователь")
+    arg_parser.add_argument("--requests", type=int, default=2000, help="Сколько запросов прогонять")
+    args = arg_parser.parse_args()
+
+    token = create_access_token({"sub": args.username})
+    db = SessionLocal()
+    try:
+        get_current_user(make_request(token), db)
+    except Exception as e:
+        print(f"Не удалось авторизовать {args.username}: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    uncached = bench(token, args.requests, cached=False)
+    cached = bench(token, args.requests, cached=True)
+    print(f"Запросов: {args.requests}")
+    print(f"без кеша: {uncached:.0f} мкс на запрос")
+    print(f" с кешем: {cached:.0f} мкс на запрос")
+    print(f"Ускорение: x{uncached / cached:.1f}")
+
+
+if __name__ == "__main__":
+    main()
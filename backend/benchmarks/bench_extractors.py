@@ -0,0 +1,88 @@
+"""
+Бенчмарк бэкендов извлечения тендеров на сохранённых страницах результатов.
+
+Запуск: python -m benchmarks.bench_extractors [файлы.html ...] [--repeat N]
+Без аргументов берутся все страницы из benchmarks/fixtures/results_page_*.html.
+Сначала проверяется, что все бэкенды возвращают одинаковые записи, затем
+для каждого печатается скорость в блоках в секунду.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+from parser.extractors import EXTRACTORS, get_extractor
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_pages(paths: list[str]) -> list[str]:
+    pages = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def check_identical(pages: list[str]) -> bool:
+    reference_name = "soup"
+    reference = [get_extractor(reference_name).extract(html) for html in pages]
+    ok = True
+    for name in EXTRACTORS:
+        if name == reference_name:
+            continue
+        extractor = get_extractor(name)
+        for page_index, html in enumerate(pages):
+            records = extractor.extract(html)
+            if records != reference[page_index]:
+                ok = False
+                print(f"[!] {name}: записи на странице {page_index + 1} отличаются от {reference_name}")
+                for expected, actual in zip(reference[page_index], records):
+                    if expected != actual:
+                        print(f"    ожидалось: {expected}\n    получено:  {actual}")
+                        break
+                if len(records) != len(reference[page_index]):
+                    print(f"    блоков: {len(records)} против {len(reference[page_index])}")
+    return ok
+
+
+def bench(name: str, pages: list[str], repeat: int) -> tuple[int, float]:
+    extractor = get_extractor(name)
+    blocks = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            blocks += len(extractor.extract(html))
+    return blocks, time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("paths", nargs="*", help="HTML-страницы результатов поиска")
+    arg_parser.add_argument("--repeat", type=int, default=20, help="Сколько раз прогонять набор страниц")
+    args = arg_parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(FIXTURES_DIR, "results_page_*.html")))
+    if not paths:
+        print("Нет страниц для бенчмарка")
+        sys.exit(1)
+    pages = load_pages(paths)
+    print(f"Страниц: {len(pages)}, повторов: {args.repeat}")
+
+    if not check_identical(pages):
+        sys.exit(1)
+    print("Записи всех бэкендов совпадают")
+
+    results = {}
+    for name in EXTRACTORS:
+        blocks, elapsed = bench(name, pages, args.repeat)
+        results[name] = blocks / elapsed
+        print(f"{name:>6}: {blocks} блоков за {elapsed:.2f} сек — {results[name]:.0f} блоков/сек")
+
+    if "lxml" in results and "soup" in results:
+        print(f"Ускорение lxml относительно soup: x{results['lxml'] / results['soup']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк анализа длинного договора: один запрос против map-reduce по фрагментам.
+
+Запуск: python -m benchmarks.bench_map_reduce [--pages N] [--concurrency 1,2,4,8]
+        [--ms-per-token 0.5] [--base-ms 300]
+
+Сеть не нужна: ответ LLM имитируется задержкой base + время генерации,
+пропорциональное числу выходных токенов (оно и определяет задержку
+реальной модели). Печатается длительность анализа при разном числе
+одновременных запросов (LLM_CONCURRENCY; здесь — семафор вместо
+parser.throttle), время повторного анализа, когда фрагменты уже в кеше,
+и доля попаданий в кеш фрагментов за оба прохода (DocumentCache.stats).
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import llm.analysis as analysis
+from llm.doc_cache import DocumentCache
+
+PAGE_TEXT = (
+    "Поставщик обязуется поставить товар в сроки, предусмотренные настоящим контрактом, "
+    "а Заказчик обязуется принять и оплатить товар. Контракт может быть расторгнут по "
+    "соглашению сторон, по решению суда или в связи с односторонним отказом стороны. "
+) * 20
+
+
+def parse_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def fake_complete(base_ms: float, ms_per_token: float, concurrency: int, calls: list):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def complete(message: str, max_tokens: int, temperature: float = 0.6, on_text=None) -> str:
+        async with slots:
+            calls.append(max_tokens)
+            # Модель дописывает ответ до лимита — худший случай по времени
+            await asyncio.sleep((base_ms + ms_per_token * max_tokens) / 1000)
+        return "Выдержка: " + "условие " * 50
+    return complete
+
+
+async def run(text: str, concurrency: int, args) -> tuple[float, int, float, float]:
+    calls = []
+    analysis.complete = fake_complete(args.base_ms, args.ms_per_token, concurrency, calls)
+    analysis.doc_cache = DocumentCache(tempfile.mkdtemp(), 1024 ** 3)
+
+    chunks = analysis.split_into_chunks(text)
+    start = time.perf_counter()
+    await analysis.analyze_long_contract(chunks)
+    elapsed = time.perf_counter() - start
+    first_calls = len(calls)
+
+    start = time.perf_counter()
+    await analysis.analyze_long_contract(chunks)
+    cached = time.perf_counter() - start
+    return elapsed, first_calls, cached, analysis.doc_cache.stats().get("chunk_hit_rate", 0.0)
+
+
+async def main_async(args):
+    text = "\n\n".join(f"--- Страница {page} ---\n{PAGE_TEXT}" for page in range(1, args.pages + 1))
+    tokens = analysis.estimate_tokens(text)
+    chunks = analysis.split_into_chunks(text)
+    print(f"Страниц: {args.pages}, ~{tokens} токенов, фрагментов: {len(chunks)} по {analysis.LLM_CHUNK_TOKENS}")
+    single = (args.base_ms + args.ms_per_token * analysis.LLM_MAX_TOKENS) / 1000
+    print(f"Один запрос: не меньше {single:.1f} сек., и текст длиннее контекста модели будет обрезан")
+    print(f"{'потоков':>8} {'сек.':>7} {'запросов':>9} {'повтор, сек.':>13} {'попаданий':>10}")
+    for concurrency in args.concurrency:
+        elapsed, calls, cached, hit_rate = await run(text, concurrency, args)
+        print(f"{concurrency:>8} {elapsed:>7.1f} {calls:>9} {cached:>13.1f} {hit_rate:>10.0%}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--pages", type=int, default=40)
+    arg_parser.add_argument("--concurrency", type=parse_list, default=[1, 2, 4, 8])
+    arg_parser.add_argument("--base-ms", type=float, default=300, help="Задержка до первого токена")
+    arg_parser.add_argument("--ms-per-token", type=float, default=0.5, help="Время генерации одного токена")
+    asyncio.run(main_async(arg_parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Подбор настроек растеризации для OCR: точность против размера запроса.
+
+Запуск: python -m benchmarks.ocr_eval [файлы.pdf ...] [--dpi 150,200,300]
+        [--quality 60,75,90] [--color gray,rgb] [--pages N] [--no-ocr]
+
+Для каждого сочетания настроек страницы рендерятся так же, как в llm.ocr,
+и печатаются средний размер запроса на страницу (base64) и CER —
+доля посимвольных ошибок распознанного текста относительно эталона.
+Эталон — текстовый слой самой страницы, поэтому нужны PDF с текстом
+(сгенерированные, а не отсканированные); без аргументов собирается
+синтетический договор. Распознавание идёт через Yandex OCR (нужны
+YANDEX_OCR_TOKEN и YANDEX_LLM_FOLD_ID); с --no-ocr считается только размер.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+
+import fitz
+
+from benchmarks.bench_pdf_text import synthetic_contract
+from llm.clients import close_http_clients, get_http_client
+from llm.ocr import RenderSettings, OCR_RENDER_SETTINGS, render_page, read_text_layer, yandex_ocr, \
+    extract_text_from_yandex_response
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def char_error_rate(reference: str, hypothesis: str) -> float:
+    """Расстояние Левенштейна, делённое на длину эталона"""
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1] / len(reference)
+
+
+def parse_list(value: str, cast=int) -> list:
+    return [cast(item) for item in value.split(",") if item]
+
+
+async def evaluate(documents: list[str], settings: RenderSettings, pages: int, ocr: bool) -> tuple[float, float | None]:
+    sizes, errors = [], []
+    session = get_http_client("ocr")
+    for path in documents:
+        with open(path, "rb") as f:
+            references = read_text_layer(f.read())
+        for page_index, reference in enumerate(references[:pages]):
+            if not reference.strip():
+                continue
+            image_b64 = render_page(path, page_index, settings)
+            sizes.append(len(image_b64))
+            if ocr:
+                response_json = await yandex_ocr(session, image_b64)
+                text = extract_text_from_yandex_response(response_json) if response_json else ""
+                errors.append(char_error_rate(reference, text))
+    mean_size = sum(sizes) / len(sizes) if sizes else 0.0
+    mean_error = sum(errors) / len(errors) if errors else None
+    return mean_size, mean_error
+
+
+async def run(args):
+    documents, temp_path = args.paths, None
+    if not documents:
+        # render_page принимает путь, как в пуле растеризации
+        fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            f.write(synthetic_contract(pages=args.pages, scan_every=args.pages + 1))
+        documents = [temp_path]
+
+    print(f"{'dpi':>4} {'цвет':>5} {'кач.':>4} {'КБ/стр':>8} {'CER':>7}")
+    for dpi, color, quality in itertools.product(args.dpi, args.color, args.quality):
+        settings = RenderSettings(
+            dpi=dpi,
+            min_dpi=min(dpi, OCR_RENDER_SETTINGS.min_dpi),
+            grayscale=color == "gray",
+            jpeg_quality=quality,
+            max_side=args.max_side,
+            adaptive=OCR_RENDER_SETTINGS.adaptive,
+        )
+        size, error = await evaluate(documents, settings, args.pages, not args.no_ocr)
+        error_text = f"{error:.3f}" if error is not None else "—"
+        print(f"{dpi:>4} {color:>5} {quality:>4} {size / 1024:>8.0f} {error_text:>7}")
+    await close_http_clients()
+    if temp_path:
+        os.unlink(temp_path)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("paths", nargs="*", help="PDF-файлы с текстовым слоем")
+    arg_parser.add_argument("--dpi", type=parse_list, default=[150, 200, 300])
+    arg_parser.add_argument("--quality", type=parse_list, default=[60, 75, 90])
+    arg_parser.add_argument("--color", type=lambda v: parse_list(v, str), default=["gray", "rgb"])
+    arg_parser.add_argument("--max-side", type=int, default=OCR_RENDER_SETTINGS.max_side)
+    arg_parser.add_argument("--pages", type=int, default=5, help="Сколько страниц каждого файла оценивать")
+    arg_parser.add_argument("--no-ocr", action="store_true", help="Только размер запроса, без вызовов OCR")
+    asyncio.run(run(arg_parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
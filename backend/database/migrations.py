@@ -0,0 +1,194 @@
+"""
+Инициализация схемы и миграции существующих баз.
+
+create_all создаёт только недостающие таблицы, поэтому изменения уже
+существующих таблиц описываются здесь SQL-шагами. Каждый шаг выполняется
+один раз и записывается в schema_migrations; на новой базе шаги ничего
+не меняют. Несколько процессов (uvicorn-воркеры, воркеры парсинга)
+безопасно стартуют одновременно — всё делается под advisory lock.
+
+Шаг — SQL-строка или функция от соединения: значения, которые считает
+Python-код приложения (разбор цен и дат), заполняются им же, пачками.
+"""
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from database.database import Base, engine
+from parser.normalize import parse_date, parse_price
+
+MIGRATIONS_LOCK_ID = 742_001
+BACKFILL_BATCH_SIZE = 1000
+
+TYPED_DATE_COLUMNS = ["contract_date", "execution_date", "publish_date", "update_date"]
+
+
+def backfill_typed_columns(conn: Connection, where: str = "TRUE"):
+    """
+    price_value и *_date_value по parser.normalize, как при записи тендера в ingest.
+    В SQL округление и диапазон NUMERIC отличались бы от parse_price: значения
+    расходились бы с перезаписанными тендерами, а слишком большая цена
+    роняла бы миграцию и с ней запуск приложения.
+    """
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            f"SELECT id, price, {', '.join(TYPED_DATE_COLUMNS)} FROM parsed_tenders "
+            f"WHERE id > :last_id AND ({where}) ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BACKFILL_BATCH_SIZE}).mappings().all()
+        if not rows:
+            return
+        conn.execute(text(
+            "UPDATE parsed_tenders SET price_value = :price_value, "
+            + ", ".join(f"{column}_value = :{column}_value" for column in TYPED_DATE_COLUMNS)
+            + " WHERE id = :id"
+        ), [
+            {"id": row["id"], "price_value": parse_price(row["price"]),
+             **{f"{column}_value": parse_date(row[column]) for column in TYPED_DATE_COLUMNS}}
+            for row in rows
+        ])
+        last_id = rows[-1]["id"]
+
+
+MIGRATIONS: list[tuple[str, list[str | Callable[[Connection], None]]]] = [
+    ("0001_dedupe_parsed_tenders", [
+        "ALTER TABLE parsed_tenders ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+        # Канонический тендер — самая ранняя запись с тем же реестровым номером
+        """
+        CREATE TEMP TABLE tender_canon ON COMMIT DROP AS
+        SELECT id, MIN(id) OVER (PARTITION BY title) AS canon_id
+        FROM parsed_tenders WHERE title IS NOT NULL
+        """,
+        # Старые сессии получают состав через таблицу связей
+        """
+        INSERT INTO parse_session_tenders (session_id, tender_id)
+        SELECT pt.session_id, c.canon_id
+        FROM parsed_tenders pt JOIN tender_canon c ON c.id = pt.id
+        WHERE pt.session_id IS NOT NULL
+        GROUP BY pt.session_id, c.canon_id
+        ORDER BY MIN(pt.id)
+        ON CONFLICT DO NOTHING
+        """,
+        # На канонический тендер остаётся один анализ: его собственный или самый свежий из дублей
+        """
+        DELETE FROM tender_analyses a USING (
+            SELECT ta.id, ROW_NUMBER() OVER (
+                PARTITION BY c.canon_id
+                ORDER BY (ta.tender_id = c.canon_id) DESC, ta.analyzed_at DESC
+            ) AS rn
+            FROM tender_analyses ta JOIN tender_canon c ON c.id = ta.tender_id
+        ) ranked
+        WHERE a.id = ranked.id AND ranked.rn > 1
+        """,
+        """
+        UPDATE tender_analyses a SET tender_id = c.canon_id
+        FROM tender_canon c WHERE a.tender_id = c.id AND c.id <> c.canon_id
+        """,
+        """
+        DELETE FROM parsed_tenders pt USING tender_canon c
+        WHERE pt.id = c.id AND c.id <> c.canon_id
+        """,
+        # Формула совпадает с parser.ingest.content_hash
+        """
+        UPDATE parsed_tenders SET content_hash = encode(sha256(convert_to(concat_ws(chr(31),
+            coalesce(link, ''), coalesce(customer, ''), coalesce(price, ''),
+            coalesce(contract_number, ''), coalesce(purchase_objects, ''),
+            coalesce(contract_date, ''), coalesce(execution_date, ''),
+            coalesce(publish_date, ''), coalesce(update_date, '')), 'UTF8')), 'hex')
+        WHERE content_hash IS NULL
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_parsed_tenders_title ON parsed_tenders (title)",
+    ]),
+    ("0002_parse_jobs_profiles", [
+        """
+        ALTER TABLE parse_jobs
+            ADD COLUMN IF NOT EXISTS profile_id INTEGER REFERENCES filter_profiles (id) ON DELETE SET NULL,
+            ADD COLUMN IF NOT EXISTS incremental BOOLEAN DEFAULT false
+        """,
+    ]),
+    ("0003_typed_tender_columns", [
+        """
+        ALTER TABLE parsed_tenders
+            ADD COLUMN IF NOT EXISTS price_value NUMERIC(18, 2),
+            ADD COLUMN IF NOT EXISTS contract_date_value DATE,
+            ADD COLUMN IF NOT EXISTS execution_date_value DATE,
+            ADD COLUMN IF NOT EXISTS publish_date_value DATE,
+            ADD COLUMN IF NOT EXISTS update_date_value DATE
+        """,
+        backfill_typed_columns,
+        "CREATE INDEX IF NOT EXISTS ix_parsed_tenders_price_value ON parsed_tenders (price_value)",
+        "CREATE INDEX IF NOT EXISTS ix_parsed_tenders_contract_date_value ON parsed_tenders (contract_date_value)",
+        "CREATE INDEX IF NOT EXISTS ix_parsed_tenders_execution_date_value ON parsed_tenders (execution_date_value)",
+        "CREATE INDEX IF NOT EXISTS ix_parsed_tenders_publish_date_value ON parsed_tenders (publish_date_value)",
+        "CREATE INDEX IF NOT EXISTS ix_parsed_tenders_update_date_value ON parsed_tenders (update_date_value)",
+    ]),
+    ("0004_session_listing_indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_parse_sessions_owner_created ON parse_sessions (owner_username, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_parse_sessions_created_at ON parse_sessions (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_parse_session_tenders_session_id_id ON parse_session_tenders (session_id, id)",
+    ]),
+    ("0005_parse_session_revision", [
+        "ALTER TABLE parse_sessions ADD COLUMN IF NOT EXISTS revision INTEGER NOT NULL DEFAULT 0",
+    ]),
+    ("0006_tender_analysis_status", [
+        """
+        ALTER TABLE tender_analyses
+            ADD COLUMN IF NOT EXISTS status VARCHAR DEFAULT 'done',
+            ADD COLUMN IF NOT EXISTS error TEXT,
+            ADD COLUMN IF NOT EXISTS started_at TIMESTAMPTZ
+        """,
+    ]),
+    ("0007_parse_job_checkpoints", [
+        """
+        ALTER TABLE parse_jobs
+            ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS cancel_requested BOOLEAN DEFAULT false
+        """,
+        "ALTER TABLE parse_job_pages ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0",
+        # Страницы, обработанные до миграции, считаются загруженными с одной попытки
+        "UPDATE parse_job_pages SET attempts = 1 WHERE status IN ('done', 'failed')",
+        # Без отметки задачи, оставшиеся running после прошлого запуска, сразу можно перехватить
+        "UPDATE parse_jobs SET heartbeat_at = COALESCE(finished_at, started_at, created_at)",
+    ]),
+    ("0008_parse_job_partitions", [
+        """
+        ALTER TABLE parse_jobs
+            ADD COLUMN IF NOT EXISTS partitioned BOOLEAN DEFAULT false,
+            ADD COLUMN IF NOT EXISTS parent_id INTEGER REFERENCES parse_jobs (id)
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_parse_jobs_parent_id ON parse_jobs (parent_id)",
+    ]),
+    ("0009_tender_analysis_heartbeat", [
+        "ALTER TABLE tender_analyses ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ",
+        "UPDATE tender_analyses SET heartbeat_at = started_at",
+    ]),
+    # Базы, где 0003 заполнила цены в SQL: округление расходится с parse_price
+    # только у цен с тремя и более знаками после запятой
+    ("0010_backfill_price_rounding", [
+        lambda conn: backfill_typed_columns(conn, r"price ~ '[.,][0-9]{3,}'"),
+    ]),
+]
+
+
+def init_db():
+    """Создаёт таблицы и применяет непримененные миграции"""
+    import database.models  # noqa: F401 — регистрирует модели в Base.metadata
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+        Base.metadata.create_all(bind=conn)
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "name VARCHAR PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+        applied = set(conn.execute(text("SELECT name FROM schema_migrations")).scalars())
+
+        for name, statements in MIGRATIONS:
+            if name in applied:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(text(statement))
+            conn.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": name})
+            print(f"[✅] Применена миграция {name}")
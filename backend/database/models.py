@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Enum, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, Numeric, Float, DateTime, Date, Boolean, Enum, ForeignKey, Text, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from database.database import Base
 import enum
@@ -31,7 +31,7 @@ class ParsedTender(Base):
     __tablename__ = "parsed_tenders"
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String)
+    title = Column(String, unique=True, index=True)  # реестровый номер контракта — ключ тендера
     link = Column(Text)
     customer = Column(String)
     price = Column(String)
@@ -41,9 +41,16 @@ class ParsedTender(Base):
     execution_date = Column(String)
     publish_date = Column(String)
     update_date = Column(String)
+    # Нормализованные значения для сортировки и фильтрации в БД, исходный текст остаётся выше
+    price_value = Column(Numeric(18, 2), index=True)
+    contract_date_value = Column(Date, index=True)
+    execution_date_value = Column(Date, index=True)
+    publish_date_value = Column(Date, index=True)
+    update_date_value = Column(Date, index=True)
+    content_hash = Column(String(64))  # sha256 от полей страницы, без изменений запись не перезаписывается
     parsed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     parsed_by = Column(String, ForeignKey("users.username"))
-    session_id = Column(Integer, ForeignKey("parse_sessions.id"))
+    session_id = Column(Integer, ForeignKey("parse_sessions.id"))  # сессия, в которой тендер встретился впервые
 
     def to_dict(self):
         return {
@@ -64,12 +71,28 @@ class ParsedTender(Base):
         
 class ParseSession(Base):
     __tablename__ = "parse_sessions"
+    __table_args__ = (Index("ix_parse_sessions_owner_created", "owner_username", "created_at"),)
 
     id = Column(Integer, primary_key=True)
     owner_username = Column(String, ForeignKey("users.username"))
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+    revision = Column(Integer, default=0, nullable=False)  # растёт при любом изменении выдачи сессии, входит в ETag
 
-    tenders = relationship("ParsedTender", backref="session", cascade="all, delete-orphan")
+    tenders = relationship("ParsedTender", secondary="parse_session_tenders",
+                           order_by="ParseSessionTender.id", viewonly=True)
+
+class ParseSessionTender(Base):
+    """Состав сессии: какие тендеры нашлись в ней, в порядке парсинга"""
+    __tablename__ = "parse_session_tenders"
+    __table_args__ = (
+        UniqueConstraint("session_id", "tender_id"),
+        # Keyset-пагинация состава сессии идёт по (session_id, id)
+        Index("ix_parse_session_tenders_session_id_id", "session_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("parse_sessions.id"), nullable=False)
+    tender_id = Column(Integer, ForeignKey("parsed_tenders.id"), nullable=False)
 
 class UserSessionView(Base):
     __tablename__ = "user_session_views"
@@ -84,7 +107,225 @@ class TenderAnalysis(Base):
 
     id = Column(Integer, primary_key=True)
     tender_id = Column(Integer, ForeignKey("parsed_tenders.id"), unique=True)
+    status = Column(String, default="done")  # running / done / failed — строка служит и блокировкой запуска
     result = Column(Text)
+    error = Column(Text)
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))  # обновляется, пока запуск идёт; по нему видно, что процесс жив
     analyzed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     tender = relationship("ParsedTender", backref="analysis")
+
+    def to_dict(self):
+        return {
+            "tenderId": self.tender_id,
+            "status": self.status,
+            "analysis": self.result,
+            "error": self.error,
+            "startedAt": self.started_at,
+            "analyzedAt": self.analyzed_at,
+        }
+
+class AnalysisBatch(Base):
+    """Анализ всех тендеров сессии, у которых ещё нет готового анализа"""
+    __tablename__ = "analysis_batches"
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("parse_sessions.id"), nullable=False, index=True)
+    owner_username = Column(String, ForeignKey("users.username"), nullable=False)
+    status = Column(String, default="running")  # running / done / failed
+    total = Column(Integer, default=0)
+    done_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime(timezone=True))
+
+    def to_dict(self, failures: list[dict] | None = None):
+        processed = (self.done_count or 0) + (self.failed_count or 0)
+        elapsed = ((self.finished_at or datetime.now(timezone.utc)) - self.created_at).total_seconds()
+        per_minute = processed / elapsed * 60 if elapsed > 0 else 0.0
+        remaining = (self.total or 0) - processed
+        data = {
+            "id": self.id,
+            "sessionId": self.session_id,
+            "ownerUsername": self.owner_username,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done_count,
+            "failed": self.failed_count,
+            "tendersPerMinute": round(per_minute, 2),
+            "etaSeconds": round(remaining / per_minute * 60) if per_minute and self.status == "running" else None,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "finishedAt": self.finished_at,
+        }
+        if failures is not None:
+            data["failures"] = failures
+        return data
+
+class ParseJob(Base):
+    __tablename__ = "parse_jobs"
+
+    id = Column(Integer, primary_key=True)
+    owner_username = Column(String, ForeignKey("users.username"), nullable=False)
+    filters = Column(JSON, nullable=False)
+    profile_id = Column(Integer, ForeignKey("filter_profiles.id", ondelete="SET NULL"))
+    incremental = Column(Boolean, default=False)
+    # queued / running / split (разбита на части, выполняются дочерние) / done / failed / cancelled
+    status = Column(String, default="queued", index=True)
+    partitioned = Column(Boolean, default=False)  # сначала разбить поиск на части (parser/partition.py)
+    parent_id = Column(Integer, ForeignKey("parse_jobs.id"), index=True)
+    session_id = Column(Integer, ForeignKey("parse_sessions.id"))
+    pages_total = Column(Integer, default=0)
+    pages_done = Column(Integer, default=0)
+    tenders_count = Column(Integer, default=0)
+    error = Column(Text)
+    worker_id = Column(String)
+    heartbeat_at = Column(DateTime(timezone=True))  # воркер жив; давно не обновлялось — задачу можно перехватить
+    cancel_requested = Column(Boolean, default=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    pages = relationship("ParseJobPage", backref="job", cascade="all, delete-orphan",
+                         order_by="ParseJobPage.page_number")
+    children = relationship("ParseJob", order_by="ParseJob.id")
+
+    def to_dict(self, with_pages: bool = False):
+        pages_done = self.pages_done or 0
+        elapsed = ((self.finished_at or datetime.now(timezone.utc)) - self.started_at).total_seconds() if self.started_at else 0
+        per_minute = pages_done / elapsed * 60 if elapsed > 0 else 0.0
+        remaining = (self.pages_total or 0) - pages_done
+        data = {
+            "id": self.id,
+            "status": self.status,
+            "ownerUsername": self.owner_username,
+            "filters": self.filters,
+            "profileId": self.profile_id,
+            "incremental": self.incremental,
+            "partitioned": self.partitioned,
+            "parentId": self.parent_id,
+            "sessionId": self.session_id,
+            "pagesTotal": self.pages_total,
+            "pagesDone": self.pages_done,
+            "tendersCount": self.tenders_count,
+            "pagesPerMinute": round(per_minute, 2),
+            "etaSeconds": round(remaining / per_minute * 60) if per_minute and self.status in ("running", "split") else None,
+            "cancelRequested": bool(self.cancel_requested),
+            "error": self.error,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "heartbeatAt": self.heartbeat_at,
+            "finishedAt": self.finished_at,
+        }
+        if with_pages:
+            data["pages"] = [page.to_dict() for page in self.pages]
+            if self.partitioned:
+                data["partitions"] = [child.to_dict() for child in self.children]
+        return data
+
+class ParseJobPage(Base):
+    __tablename__ = "parse_job_pages"
+    __table_args__ = (UniqueConstraint("job_id", "page_number"),)
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("parse_jobs.id"), nullable=False, index=True)
+    page_number = Column(Integer, nullable=False)
+    status = Column(String, default="pending")  # pending / done / failed / skipped
+    attempts = Column(Integer, default=0)
+    tenders_count = Column(Integer, default=0)
+    error = Column(Text)
+    finished_at = Column(DateTime(timezone=True))
+
+    def to_dict(self):
+        return {
+            "page": self.page_number,
+            "status": self.status,
+            "attempts": self.attempts,
+            "tendersCount": self.tenders_count,
+            "error": self.error,
+            "finishedAt": self.finished_at,
+        }
+
+class FilterProfile(Base):
+    """Сохранённый набор ParseFilters с отметкой уровня для инкрементального парсинга"""
+    __tablename__ = "filter_profiles"
+    __table_args__ = (UniqueConstraint("owner_username", "name"),)
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    owner_username = Column(String, ForeignKey("users.username"), nullable=False)
+    filters = Column(JSON, nullable=False)
+    watermark_date = Column(Date)  # самая поздняя дата обновления из уже спарсенных
+    watermark_numbers = Column(JSON, default=list)  # реестровые номера, виденные с этой датой
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "filters": self.filters,
+            "watermarkDate": self.watermark_date,
+            "watermarkCount": len(self.watermark_numbers or []),
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+        }
+
+class CrawlSchedule(Base):
+    """Регулярный парсинг по профилю фильтров: раз в interval_minutes или по cron (parser/scheduler.py)"""
+    __tablename__ = "crawl_schedules"
+
+    id = Column(Integer, primary_key=True)
+    profile_id = Column(Integer, ForeignKey("filter_profiles.id", ondelete="CASCADE"), nullable=False, index=True)
+    owner_username = Column(String, ForeignKey("users.username"), nullable=False)
+    interval_minutes = Column(Integer)
+    cron = Column(String)
+    incremental = Column(Boolean, default=True)
+    jitter_seconds = Column(Integer, default=0)  # случайный сдвиг запуска, чтобы расписания не совпадали
+    enabled = Column(Boolean, default=True)
+    next_run_at = Column(DateTime(timezone=True), index=True)
+    last_run_at = Column(DateTime(timezone=True))
+    last_job_id = Column(Integer, ForeignKey("parse_jobs.id", ondelete="SET NULL"))
+    skipped_runs = Column(Integer, default=0)  # запусков пропущено, потому что прошлый ещё шёл
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "profileId": self.profile_id,
+            "intervalMinutes": self.interval_minutes,
+            "cron": self.cron,
+            "incremental": self.incremental,
+            "jitterSeconds": self.jitter_seconds,
+            "enabled": self.enabled,
+            "nextRunAt": self.next_run_at,
+            "lastRunAt": self.last_run_at,
+            "lastJobId": self.last_job_id,
+            "skippedRuns": self.skipped_runs,
+            "createdAt": self.created_at,
+            "updatedAt": self.updated_at,
+        }
+
+class UpstreamLimit(Base):
+    """Общее для всех процессов состояние ограничителя запросов к внешнему сервису (parser/throttle.py)"""
+    __tablename__ = "upstream_limits"
+
+    name = Column(String, primary_key=True)  # zakupki / ocr / llm
+    tokens = Column(Float, nullable=False)  # токенов в корзине на момент refilled_at
+    rate = Column(Float, nullable=False)  # текущая скорость, запросов в секунду; снижается при 429/5xx
+    refilled_at = Column(DateTime(timezone=True), nullable=False)
+    failures = Column(Integer, nullable=False, default=0)  # ошибок подряд
+    open_until = Column(DateTime(timezone=True))  # до этого момента запросы приостановлены
+
+class UpstreamLease(Base):
+    """Выполняющийся запрос к внешнему сервису; истёкшие аренды (процесс умер) не учитываются"""
+    __tablename__ = "upstream_leases"
+    __table_args__ = (Index("ix_upstream_leases_name_expires", "name", "expires_at"),)
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
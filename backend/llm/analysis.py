@@ -1,7 +1,12 @@
+import asyncio
 import aiohttp
+import orjson
 import os
-from typing import Optional
+from typing import Callable, Optional
+from llm.clients import get_http_client
+from llm.doc_cache import doc_cache, sha256
 from llm.ocr import extract_text
+from parser.throttle import UpstreamUnavailable, throttle
 from dotenv import load_dotenv
 
 from database.models import ParsedTender
@@ -13,6 +18,21 @@ load_dotenv()
 YANDEX_OAUTH_TOKEN = os.getenv("YANDEX_OAUTH_TOKEN") 
 YANDEX_LLM_FOLD_ID = os.getenv("YANDEX_LLM_FOLD_ID") 
 
+LLM_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "5000"))  # длина итогового анализа
+# Длинный договор режется на фрагменты, каждый разбирается отдельным запросом (map),
+# а итоговый анализ пишется по выдержкам из всех фрагментов (reduce)
+LLM_CHUNK_TOKENS = int(os.getenv("LLM_CHUNK_TOKENS", "4000"))
+LLM_MAP_MAX_TOKENS = int(os.getenv("LLM_MAP_MAX_TOKENS", "1500"))
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", "3"))  # оценка для русского текста, с запасом
+
+class AnalysisError(Exception):
+    """Анализ не получен; текст попадает в tender_analyses.error"""
+
+
+# progress(событие, **данные) — этапы анализа и куски ответа LLM для потоковой выдачи клиенту
+Progress = Callable[..., None]
+
 
 def generate_analysis_prompt(contract_text: str) -> str:
     """Генерирует промт для юридического анализа"""
@@ -39,20 +59,140 @@ def generate_analysis_prompt(contract_text: str) -> str:
     return base_prompt.format(contract_text=contract_text)
 
 
-async def analyze_tender(tender: ParsedTender) -> Optional[str]:
-    """Отправляет промт в Yandex LLM и возвращает ответ"""
-    pdf_url = get_contract_termination_pdf(tender)
-    if not pdf_url:
-        return ""
-    contract_text = await extract_text(pdf_url)
-    message = generate_analysis_prompt(contract_text)
+def generate_chunk_prompt(chunk: str, index: int, total: int) -> str:
+    """Промт для одного фрагмента длинного договора: только выдержки, без выводов"""
+    base_prompt = """
+        Ты - опытный юрист с специализацией на договорном праве.
+        Ниже фрагмент {index} из {total} текста договора. Выпиши из него кратко, с цитатами:
+
+        1. Существенные условия (предмет, цена, сроки, порядок оплаты и приёмки)
+        2. Обязательства и ответственность сторон, неустойки, основания расторжения
+        3. Неясные формулировки, несбалансированные обязательства, проблемы с исполнимостью
+           и возможные нарушения законодательства
+
+        Если в фрагменте чего-то нет, не упоминай это. Не делай общих выводов по договору.
+
+        Фрагмент договора:
+        {chunk}
+        """
+    return base_prompt.format(chunk=chunk, index=index, total=total)
+
+
+def generate_merge_prompt(extracts: str) -> str:
+    """Промт для сжатия выдержек, если все вместе они не помещаются в итоговый запрос"""
+    base_prompt = """
+        Ты - опытный юрист с специализацией на договорном праве.
+        Ниже выдержки из нескольких фрагментов одного договора. Объедини их в один список
+        того же вида, убрав повторы и сохранив цитаты.
+
+        Выдержки:
+        {extracts}
+        """
+    return base_prompt.format(extracts=extracts)
+
+
+def generate_reduce_prompt(extracts: str) -> str:
+    """Итоговый промт по выдержкам из всех фрагментов — ответ в том же виде, что и для короткого договора"""
+    base_prompt = """
+        Ты - опытный юрист с специализацией на договорном праве. 
+        Договор слишком длинный, поэтому ниже приведены выдержки из всех его частей по порядку.
+        По ним выполни следующие задачи:
+
+        1. Определи все существенные условия договора
+        2. Выяви потенциальные юридические риски для стороны, с которой был заключён тендер:
+        - Неясные формулировки
+        - Несбалансированные обязательства
+        - Проблемы с исполнимостью
+        - Возможные нарушения законодательства
+        3. Оцени, какие положения могут быть оспорены в суде
+        4. Определи, нуждается ли сторона в юридической помощи по этому договору
+
+        Выдержки из договора:
+        {extracts}
+
+        Предоставь развернутый анализ с конкретными примерами из текста. 
+        Сначала кратко суммируй основные положения, затем детально разбери риски, 
+        и в конце дай четкую рекомендацию о необходимости юридической помощи.
+        """
+    return base_prompt.format(extracts=extracts)
 
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / LLM_CHARS_PER_TOKEN) + 1
+
+
+def split_into_chunks(text: str, max_tokens: int = None) -> list[str]:
+    """
+    Делит текст на фрагменты не длиннее max_tokens (по оценке).
+    Режет по границам страниц и абзацев, слишком длинный абзац — по строкам,
+    а строку без переносов — по символам.
+    """
+    max_tokens = max_tokens or LLM_CHUNK_TOKENS
+    max_chars = int(max_tokens * LLM_CHARS_PER_TOKEN)
+
+    pieces = []
+    for paragraph in text.split("\n\n"):
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.split("\n"):
+            pieces.extend(line[start:start + max_chars] for start in range(0, max(len(line), 1), max_chars))
+
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        if current and size + len(piece) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def _alternative_text(data: dict) -> Optional[str]:
+    return data.get("result", {}).get("alternatives", [{}])[0].get("message", {}).get("text")
+
+
+async def _read_stream(response, on_text: Callable[[str], None] | None = None) -> Optional[str]:
+    """
+    Потоковый ответ — JSON-объекты по строке на каждый; в каждом текст,
+    сгенерированный к этому моменту. Клиенту уходит только прирост.
+    """
+    text, buffer = "", b""
+
+    def feed(lines: list[bytes]):
+        nonlocal text
+        for line in lines:
+            if not line.strip():
+                continue
+            current = _alternative_text(orjson.loads(line)) or ""
+            delta = current[len(text):] if current.startswith(text) else current
+            text = current if current.startswith(text) else text + current
+            if delta and on_text is not None:
+                on_text(delta)
+
+    async for data in response.content.iter_any():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        feed(lines)
+    feed([buffer])  # последний объект может прийти без перевода строки
+    return text or None
+
+
+async def complete(message: str, max_tokens: int, temperature: float = 0.6,
+                   on_text: Callable[[str], None] | None = None) -> Optional[str]:
+    """
+    Один запрос к Yandex LLM; None — если ответа нет. Ответ всегда читается потоком:
+    у клиента нет таймаута на запрос целиком, а пауза между кусками ограничена,
+    так что долгая генерация не обрывается, а зависшая — не висит. on_text получает прирост текста.
+    """
     prompt = {
         "modelUri": f"gpt://{YANDEX_LLM_FOLD_ID}/yandexgpt",
         "completionOptions": {
-            "stream": False,
-            "temperature": 0.6,
-            "maxTokens": "5000"
+            "stream": True,
+            "temperature": temperature,
+            "maxTokens": str(max_tokens)
         },
         "messages": [
         {
@@ -62,21 +202,115 @@ async def analyze_tender(tender: ParsedTender) -> Optional[str]:
         ]
     }
 
-    url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Api-Key {YANDEX_OAUTH_TOKEN}"
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=prompt, timeout=30) as response:
+        # Темп и число одновременных запросов (LLM_CONCURRENCY) общие для всех процессов
+        async with throttle("llm") as permit:
+            async with get_http_client("llm").post(LLM_URL, headers=headers, json=prompt) as response:
+                permit.record(response.status, response.headers.get("Retry-After"))
                 if response.status != 200:
                     print(f"[!] Ошибка LLM: HTTP {response.status}")
                     return None
-
-                data = await response.json()
-                return data.get("result", {}).get("alternatives", [{}])[0].get("message", {}).get("text", "Не удалось получить ответ")
-    except aiohttp.ClientError as e:
+                return await _read_stream(response, on_text)
+    except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError, UpstreamUnavailable) as e:
         print(f"[!] Ошибка при запросе к Yandex LLM: {e}")
         return None
+
+
+async def complete_cached(message: str, max_tokens: int, temperature: float) -> Optional[str]:
+    """
+    Промежуточный запрос с кешем по хешу промта и параметров модели: при повторном
+    анализе уже разобранные фрагменты берутся из кеша, а не запрашиваются заново.
+    """
+    key = sha256(f"{YANDEX_LLM_FOLD_ID}/yandexgpt|{temperature}|{max_tokens}|{message}".encode("utf-8"))
+    cached = await asyncio.to_thread(doc_cache.get_chunk_result, key)
+    if cached is not None:
+        return cached
+    result = await complete(message, max_tokens, temperature)
+    if result:
+        await asyncio.to_thread(doc_cache.put_chunk_result, key, result)
+    return result
+
+
+async def map_chunks(messages: list[str], progress: Progress | None = None) -> Optional[list[str]]:
+    """Запросы по фрагментам идут параллельно (не больше LLM_CONCURRENCY); None, если хоть один не удался"""
+    done = 0
+
+    async def run(message: str) -> Optional[str]:
+        nonlocal done
+        result = await complete_cached(message, LLM_MAP_MAX_TOKENS, 0.2)
+        done += 1
+        if progress:
+            progress("chunk", done=done, total=len(messages))
+        return result
+
+    results = await asyncio.gather(*(run(message) for message in messages))
+    if not all(results):
+        print(f"[!] LLM не ответил на {sum(not result for result in results)} из {len(results)} фрагментов")
+        return None
+    return results
+
+
+async def analyze_long_contract(chunks: list[str], progress: Progress | None = None) -> Optional[str]:
+    """
+    Map-reduce: выдержки из каждого фрагмента, затем итоговый анализ по всем выдержкам.
+    Выдержки кешируются, поэтому если не удался только итоговый запрос,
+    повторный анализ начнётся сразу с него — об этом говорит AnalysisError.
+    """
+    total = len(chunks)
+    print(f"Договор разбит на {total} фрагментов для LLM")
+    if progress:
+        progress("chunks", total=total)
+    messages = [generate_chunk_prompt(chunk, index, total) for index, chunk in enumerate(chunks, 1)]
+    extracts = await map_chunks(messages, progress)
+    if extracts is None:
+        return None
+    extracts = [f"--- Фрагмент {index} ---\n{extract}" for index, extract in enumerate(extracts, 1)]
+
+    # Выдержек слишком много для одного запроса — сжимаем группами, пока не поместятся
+    while estimate_tokens("\n\n".join(extracts)) > LLM_CHUNK_TOKENS and len(extracts) > 1:
+        groups = split_into_chunks("\n\n".join(extracts))
+        if len(groups) >= len(extracts):
+            break  # каждая выдержка и так занимает целый фрагмент
+        extracts = await map_chunks([generate_merge_prompt(group) for group in groups])
+        if extracts is None:
+            return None
+
+    result = await generate(generate_reduce_prompt("\n\n".join(extracts)), progress)
+    if not result:
+        raise AnalysisError(f"LLM не вернул итоговый анализ; выдержки из {total} фрагментов сохранены, "
+                            f"повторный запуск начнётся с итогового запроса")
+    return result
+
+
+async def generate(message: str, progress: Progress | None = None) -> Optional[str]:
+    """Итоговый запрос; при подписчиках на прогресс ответ отдаётся по мере генерации"""
+    if not progress:
+        return await complete(message, LLM_MAX_TOKENS)
+    progress("generating")
+    return await complete(message, LLM_MAX_TOKENS, on_text=lambda delta: progress("token", text=delta))
+
+
+async def analyze_tender(tender: ParsedTender, progress: Progress | None = None) -> Optional[str]:
+    """
+    Отправляет промт в Yandex LLM и возвращает ответ; длинный договор разбирается по частям.
+    progress получает этапы (pdf_located, text_extracted, ocr, chunks, chunk, generating) и куски ответа (token).
+    """
+    pdf_url = await get_contract_termination_pdf(tender)
+    if not pdf_url:
+        return ""
+    if progress:
+        progress("pdf_located", url=pdf_url)
+    contract_text = await extract_text(pdf_url, progress)
+    if not contract_text:
+        return None
+
+    chunks = split_into_chunks(contract_text)
+    if len(chunks) > 1:
+        return await analyze_long_contract(chunks, progress)
+
+    return await generate(generate_analysis_prompt(contract_text), progress)
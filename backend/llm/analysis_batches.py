@@ -0,0 +1,184 @@
+"""
+Анализ всей сессии парсинга одним запросом.
+
+Пакет берёт тендеры сессии без готового анализа и прогоняет их через тот же
+одиночный запуск (claim_analysis / start_analysis), поэтому тендер, который
+уже анализируется по отдельному запросу или другим пакетом, повторно не
+запускается — пакет дожидается его результата.
+
+ANALYSIS_CONCURRENCY — предел на процесс: при N uvicorn-воркерах пакеты
+выполняют до N × ANALYSIS_CONCURRENCY анализов одновременно. Общую нагрузку
+на внешние сервисы ограничивают не пакеты, а запросы внутри анализа: вызовы
+LLM и OCR идут через parser.throttle (upstreams "llm" и "ocr") с лимитами,
+общими для всех процессов. Весь анализ через throttle не проводится: он
+длится минуты, и ожидающие пакеты упирались бы в THROTTLE_MAX_WAIT.
+
+Прогресс (готово / с ошибкой, тендеров в минуту) пишется в analysis_batches
+после каждого тендера; причины ошибок берутся из tender_analyses. Пока пакет
+идёт, updated_at обновляется и без готовых тендеров (BATCH_HEARTBEAT_INTERVAL):
+по нему повторный запрос отличает живой пакет от пакета умершего процесса.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from sqlalchemy import and_, select, text, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import AsyncSessionLocal
+from database.models import AnalysisBatch, ParsedTender, ParseSessionTender, TenderAnalysis
+from llm.analysis_runs import ANALYSIS_STALE_AFTER, claim_analysis, get_analysis, start_analysis, wait_for_analysis
+
+load_dotenv()
+
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))  # на процесс
+BATCH_HEARTBEAT_INTERVAL = ANALYSIS_STALE_AFTER / 3
+
+BATCH_LOCK_ID = 742_002
+FAILURES_LIMIT = 100
+
+_slots = asyncio.Semaphore(ANALYSIS_CONCURRENCY)  # только в этом процессе, см. описание модуля
+_batches: dict[int, asyncio.Task] = {}
+
+
+async def create_batch(db: AsyncSession, session_id: int, owner_username: str) -> tuple[AnalysisBatch, bool]:
+    """
+    Запускает пакет для сессии или возвращает уже идущий.
+    Возвращает (пакет, создан ли новый).
+    """
+    now = datetime.now(timezone.utc)
+    # Два одновременных запроса на одну сессию не создадут два пакета
+    await db.execute(text("SELECT pg_advisory_xact_lock(:lock_id, :session_id)"),
+                     {"lock_id": BATCH_LOCK_ID, "session_id": session_id})
+
+    stale_before = now - timedelta(seconds=ANALYSIS_STALE_AFTER)
+    active = (await db.execute(select(AnalysisBatch).where(
+        AnalysisBatch.session_id == session_id,
+        AnalysisBatch.status == "running",
+        AnalysisBatch.updated_at >= stale_before,
+    ))).scalars().first()
+    if active:
+        await db.commit()
+        return active, False
+
+    # Пакет, процесс которого умер, давно не обновлялся
+    await db.execute(update(AnalysisBatch).where(
+        AnalysisBatch.session_id == session_id, AnalysisBatch.status == "running",
+    ).values(status="failed", error="Пакет прерван", finished_at=now))
+
+    analysed = select(TenderAnalysis.id).where(
+        TenderAnalysis.tender_id == ParseSessionTender.tender_id, TenderAnalysis.status == "done",
+    ).exists()
+    tender_ids = list((await db.execute(
+        select(ParseSessionTender.tender_id)
+        .where(ParseSessionTender.session_id == session_id, ~analysed)
+        .order_by(ParseSessionTender.id)
+    )).scalars())
+
+    batch = AnalysisBatch(
+        session_id=session_id,
+        owner_username=owner_username,
+        status="running" if tender_ids else "done",
+        total=len(tender_ids),
+        created_at=now,
+        updated_at=now,
+        finished_at=None if tender_ids else now,
+    )
+    db.add(batch)
+    await db.commit()
+
+    if tender_ids:
+        task = asyncio.create_task(_run_batch(batch.id, tender_ids))
+        _batches[batch.id] = task
+        task.add_done_callback(lambda _: _batches.pop(batch.id, None))
+    return batch, True
+
+
+async def _update_batch(batch_id: int, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(AnalysisBatch).where(AnalysisBatch.id == batch_id).values(
+            updated_at=datetime.now(timezone.utc), **values,
+        ))
+        await db.commit()
+
+
+async def _heartbeat(batch_id: int):
+    while True:
+        await asyncio.sleep(BATCH_HEARTBEAT_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(AnalysisBatch).where(
+                    AnalysisBatch.id == batch_id, AnalysisBatch.status == "running",
+                ).values(updated_at=datetime.now(timezone.utc)))
+                await db.commit()
+        except SQLAlchemyError as e:
+            print(f"[!] Пакет анализа {batch_id}: не удалось обновить отметку ({e.__class__.__name__})")
+
+
+async def _analyze_one(batch_id: int, tender_id: int):
+    try:
+        tender, started = None, False
+        async with _slots:
+            async with AsyncSessionLocal() as db:
+                tender = await db.get(ParsedTender, tender_id)
+                if tender:
+                    started = await claim_analysis(db, tender_id)
+            if started:
+                await start_analysis(tender)
+        if tender and not started:
+            # Тендер уже анализируется по другому запросу — ждём его результата, не занимая слот
+            await wait_for_analysis(tender_id, ANALYSIS_STALE_AFTER)
+        analysis = await get_analysis(tender_id)
+        done = analysis is not None and analysis.status == "done"
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"[!] Пакет анализа {batch_id}, тендер {tender_id}: {e}")
+        done = False
+
+    if done:
+        await _update_batch(batch_id, done_count=AnalysisBatch.done_count + 1)
+    else:
+        await _update_batch(batch_id, failed_count=AnalysisBatch.failed_count + 1)
+
+
+async def _run_batch(batch_id: int, tender_ids: list[int]):
+    heartbeat = asyncio.create_task(_heartbeat(batch_id))
+    try:
+        await asyncio.gather(*(_analyze_one(batch_id, tender_id) for tender_id in tender_ids))
+    except asyncio.CancelledError:
+        await asyncio.shield(_update_batch(batch_id, status="failed", error="Пакет прерван остановкой сервера",
+                                           finished_at=datetime.now(timezone.utc)))
+        raise
+    except Exception as e:
+        print(f"[!] Пакет анализа {batch_id} завершился ошибкой: {e}")
+        await _update_batch(batch_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc))
+        return
+    finally:
+        heartbeat.cancel()
+    await _update_batch(batch_id, status="done", finished_at=datetime.now(timezone.utc))
+    print(f"[✅] Пакет анализа {batch_id}: обработано {len(tender_ids)} тендеров")
+
+
+async def batch_failures(db: AsyncSession, batch: AnalysisBatch) -> list[dict]:
+    """Тендеры сессии, анализ которых упал во время пакета, с причинами"""
+    rows = await db.execute(
+        select(ParsedTender.id, ParsedTender.title, TenderAnalysis.error)
+        .join(ParseSessionTender, ParseSessionTender.tender_id == ParsedTender.id)
+        .join(TenderAnalysis, TenderAnalysis.tender_id == ParsedTender.id)
+        .where(and_(
+            ParseSessionTender.session_id == batch.session_id,
+            TenderAnalysis.status == "failed",
+            TenderAnalysis.analyzed_at >= batch.created_at,
+        ))
+        .order_by(ParseSessionTender.id)
+        .limit(FAILURES_LIMIT)
+    )
+    return [{"tenderId": tender_id, "title": title, "error": error} for tender_id, title, error in rows]
+
+
+async def cancel_analysis_batches():
+    tasks = list(_batches.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
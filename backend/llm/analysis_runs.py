@@ -0,0 +1,202 @@
+"""
+Не больше одного запуска анализа на тендер.
+
+Строка tender_analyses служит одновременно блокировкой и результатом:
+claim_analysis вставляет её со статусом running через INSERT ... ON CONFLICT,
+и анализ запускает только тот, чья вставка прошла. Пока анализ идёт, запуск
+раз в ANALYSIS_HEARTBEAT_INTERVAL обновляет heartbeat_at. Упавший запуск (failed)
+и запуск без отметки дольше ANALYSIS_STALE_AFTER (процесс умер посреди анализа)
+можно захватить заново — долгий, но живой анализ не перехватывается.
+
+Анализ идёт фоновой задачей, не привязанной к запросу. В пределах процесса
+задачи лежат в _runs, и остальные запросы ждут ту же задачу; запросы из
+других процессов опрашивают строку в БД. Ход запуска (этапы и текст ответа
+по мере генерации) публикуется в AnalysisProgress — его читает потоковый эндпоинт.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import AsyncSessionLocal
+from database.models import ParsedTender, TenderAnalysis
+from llm.analysis import analyze_tender
+
+load_dotenv()
+
+ANALYSIS_STALE_AFTER = int(os.getenv("ANALYSIS_STALE_AFTER", "900"))
+ANALYSIS_WAIT_TIMEOUT = float(os.getenv("ANALYSIS_WAIT_TIMEOUT", "120"))
+ANALYSIS_POLL_INTERVAL = 1.0
+ANALYSIS_HEARTBEAT_INTERVAL = ANALYSIS_STALE_AFTER / 4
+
+EMPTY_RESULT = "Не удалось получить ответ"
+
+_runs: dict[int, asyncio.Task] = {}
+_progress: dict[int, "AnalysisProgress"] = {}
+
+
+class AnalysisProgress:
+    """
+    События одного запуска для подписчиков в этом процессе.
+    Подписавшийся позже получает пройденные этапы и уже сгенерированный текст.
+    """
+
+    def __init__(self):
+        self.stages: list[tuple[str, dict]] = []
+        self.text = ""
+        self.closed = False
+        self._subscribers: set[asyncio.Queue] = set()
+
+    def __call__(self, event: str, **data):
+        if event == "token":
+            self.text += data["text"]
+        elif self.stages and self.stages[-1][0] == event:
+            self.stages[-1] = (event, data)  # от ocr и chunk важен только последний счётчик
+        else:
+            self.stages.append((event, data))
+        for queue in self._subscribers:
+            queue.put_nowait((event, data))
+
+    def subscribe(self) -> asyncio.Queue:
+        """Очередь событий (событие, данные); None в очереди — запуск завершён"""
+        queue = asyncio.Queue()
+        for event, data in self.stages:
+            queue.put_nowait((event, data))
+        if self.text:
+            queue.put_nowait(("token", {"text": self.text}))
+        if self.closed:
+            queue.put_nowait(None)
+        else:
+            self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def close(self):
+        self.closed = True
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+        self._subscribers.clear()
+
+
+async def claim_analysis(db: AsyncSession, tender_id: int) -> bool:
+    """Захватывает запуск анализа тендера; True — запускать должен вызывающий"""
+    now = datetime.now(timezone.utc)
+    stmt = insert(TenderAnalysis).values(
+        tender_id=tender_id, status="running", started_at=now, heartbeat_at=now,
+        analyzed_at=None, result=None, error=None,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TenderAnalysis.tender_id],
+        set_={"status": "running", "started_at": now, "heartbeat_at": now,
+              "analyzed_at": None, "result": None, "error": None},
+        where=or_(
+            TenderAnalysis.status == "failed",
+            and_(TenderAnalysis.status == "running",
+                 TenderAnalysis.heartbeat_at < now - timedelta(seconds=ANALYSIS_STALE_AFTER)),
+        ),
+    ).returning(TenderAnalysis.id)
+    claimed = (await db.execute(stmt)).first() is not None
+    await db.commit()
+    return claimed
+
+
+async def _save(tender_id: int, status: str, result: str | None = None, error: str | None = None):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(TenderAnalysis).where(TenderAnalysis.tender_id == tender_id).values(
+            status=status, result=result, error=error, analyzed_at=datetime.now(timezone.utc),
+        ))
+        await db.commit()
+
+
+async def _heartbeat(tender_id: int):
+    while True:
+        await asyncio.sleep(ANALYSIS_HEARTBEAT_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(update(TenderAnalysis).where(
+                    TenderAnalysis.tender_id == tender_id, TenderAnalysis.status == "running",
+                ).values(heartbeat_at=datetime.now(timezone.utc)))
+                await db.commit()
+        except SQLAlchemyError as e:
+            print(f"[!] Анализ тендера {tender_id}: не удалось обновить отметку ({e.__class__.__name__})")
+
+
+async def _run(tender: ParsedTender, progress: AnalysisProgress):
+    heartbeat = asyncio.create_task(_heartbeat(tender.id))
+    try:
+        try:
+            result = await analyze_tender(tender, progress)
+        except asyncio.CancelledError:
+            await asyncio.shield(_save(tender.id, "failed", error="Анализ прерван остановкой сервера"))
+            raise
+        except Exception as e:
+            print(f"[!] Анализ тендера {tender.id} завершился ошибкой: {e}")
+            await _save(tender.id, "failed", error=str(e))
+            return
+
+        if result:
+            await _save(tender.id, "done", result=result)
+        else:
+            await _save(tender.id, "failed", error=EMPTY_RESULT)
+    finally:
+        heartbeat.cancel()
+        # Подписчики дочитывают результат из БД — он уже сохранён
+        progress.close()
+
+
+def start_analysis(tender: ParsedTender) -> asyncio.Task:
+    """Запускает анализ в фоне; вызывать только после успешного claim_analysis"""
+    progress = AnalysisProgress()
+    task = asyncio.create_task(_run(tender, progress))
+    _runs[tender.id] = task
+    _progress[tender.id] = progress
+
+    def forget(_):
+        _runs.pop(tender.id, None)
+        _progress.pop(tender.id, None)
+
+    task.add_done_callback(forget)
+    return task
+
+
+def get_progress(tender_id: int) -> AnalysisProgress | None:
+    """Ход запуска, если он идёт в этом процессе"""
+    return _progress.get(tender_id)
+
+
+async def get_analysis(tender_id: int) -> TenderAnalysis | None:
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(TenderAnalysis).filter_by(tender_id=tender_id))).scalar_one_or_none()
+
+
+async def wait_for_analysis(tender_id: int, timeout: float) -> TenderAnalysis | None:
+    """
+    Ждёт завершения текущего запуска не дольше timeout.
+    Возвращает строку анализа — со статусом running, если запуск ещё не закончился.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    task = _runs.get(tender_id)
+    if task is not None:
+        # shield: если запрос отменят, анализ продолжится для остальных
+        await asyncio.wait([asyncio.shield(task)], timeout=timeout)
+
+    while True:
+        analysis = await get_analysis(tender_id)
+        if analysis is None or analysis.status != "running" or loop.time() >= deadline:
+            return analysis
+        await asyncio.sleep(min(ANALYSIS_POLL_INTERVAL, deadline - loop.time()))
+
+
+async def cancel_analysis_runs():
+    """При остановке сервера: незавершённые запуски помечаются failed, их можно перезапустить"""
+    tasks = list(_runs.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,69 @@
+"""
+Потоковая выдача анализа тендера в формате Server-Sent Events.
+
+События:
+- stage — этап запуска: {"stage": "started" | "pdf_located" | "text_extracted" | "ocr" |
+  "chunks" | "chunk" | "generating", ...данные этапа}, например ocr — {"page": n, "total": N};
+- token — очередной кусок ответа LLM: {"text": "..."};
+- done — итог, как в GET /tenders/{id}/analysis, плюс "cached";
+- error — {"error": "..."}.
+
+Если анализ идёт в другом процессе, этапов и токенов не будет: поток ждёт
+строку в БД и отдаёт done или error. Пока ничего не происходит, уходит
+комментарий-пинг, чтобы прокси не закрыли соединение.
+"""
+import asyncio
+import orjson
+from llm.analysis_runs import EMPTY_RESULT, get_progress, wait_for_analysis
+
+SSE_PING_INTERVAL = 15.0
+SSE_PING = b": ping\n\n"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # nginx не копит ответ в буфере
+}
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def analysis_events(tender_id: int, cached: bool):
+    yield sse_event("stage", {"stage": "started", "cached": cached})
+
+    progress = get_progress(tender_id)
+    if progress is not None:
+        queue = progress.subscribe()
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), SSE_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield SSE_PING
+                    continue
+                if item is None:
+                    break
+                event, data = item
+                if event == "token":
+                    yield sse_event("token", data)
+                else:
+                    yield sse_event("stage", {"stage": event, **data})
+        finally:
+            progress.unsubscribe(queue)
+
+    while True:
+        analysis = await wait_for_analysis(tender_id, SSE_PING_INTERVAL)
+        if analysis is None or analysis.status != "running":
+            break
+        yield SSE_PING
+
+    if analysis is None:
+        yield sse_event("error", {"error": "Анализ не найден"})
+    elif analysis.status == "done" or analysis.error == EMPTY_RESULT:
+        result = analysis.to_dict()
+        if analysis.status != "done":
+            result["analysis"] = EMPTY_RESULT
+        yield sse_event("done", {**result, "cached": cached})
+    else:
+        yield sse_event("error", {"error": f"Ошибка анализа: {analysis.error}"})
@@ -0,0 +1,67 @@
+"""
+Общие HTTP-клиенты внешних API на всё время жизни приложения.
+
+Сессии создаются в lifespan (start_http_clients) и закрываются при остановке,
+поэтому запросы к OCR и LLM переиспользуют соединения (keep-alive, TLS)
+и кешированный DNS вместо нового пула на каждый вызов.
+
+У клиента LLM нет ограничения на запрос целиком: ответ читается потоком и
+генерация длинного анализа может идти минутами. Зависший ответ отсекает
+LLM_HTTP_READ_TIMEOUT — наибольшая пауза между кусками потока.
+Страницы и файлы zakupki.gov.ru качаются через parser.crawler.CrawlEngine.
+"""
+import os
+import aiohttp
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_DNS_TTL = int(os.getenv("HTTP_DNS_TTL", "300"))
+HTTP_KEEPALIVE = float(os.getenv("HTTP_KEEPALIVE", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+
+# имя клиента -> (соединений в пуле, таймауты)
+CLIENTS = {
+    "ocr": (
+        int(os.getenv("OCR_HTTP_CONNECTIONS", "10")),
+        aiohttp.ClientTimeout(total=float(os.getenv("OCR_HTTP_TIMEOUT", "30")), connect=HTTP_CONNECT_TIMEOUT),
+    ),
+    "llm": (
+        int(os.getenv("LLM_HTTP_CONNECTIONS", "10")),
+        aiohttp.ClientTimeout(total=None, connect=HTTP_CONNECT_TIMEOUT,
+                              sock_read=float(os.getenv("LLM_HTTP_READ_TIMEOUT", "60"))),
+    ),
+}
+
+_clients: dict[str, aiohttp.ClientSession] = {}
+
+
+def _create_client(name: str) -> aiohttp.ClientSession:
+    connections, timeout = CLIENTS[name]
+    connector = aiohttp.TCPConnector(
+        limit=connections,
+        ttl_dns_cache=HTTP_DNS_TTL,
+        keepalive_timeout=HTTP_KEEPALIVE,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+def get_http_client(name: str) -> aiohttp.ClientSession:
+    """Сессия клиента; вне lifespan (скрипты, бенчмарки) создаётся при первом обращении"""
+    client = _clients.get(name)
+    if client is None or client.closed:
+        client = _clients[name] = _create_client(name)
+    return client
+
+
+async def start_http_clients():
+    for name in CLIENTS:
+        get_http_client(name)
+
+
+async def close_http_clients():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        if not client.closed:
+            await client.close()
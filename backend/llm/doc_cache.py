@@ -0,0 +1,203 @@
+"""
+Локальный кеш документов и распознанного текста, адресуемый по содержимому.
+
+Раскладка в DOC_CACHE_DIR:
+- blobs/ab/<sha256>.pdf        — байты PDF по SHA-256 содержимого;
+- urls/<sha256(url)>           — SHA-256 документа, скачанного по этому адресу;
+- links/<sha256(реестровый №)> — ссылка на PDF расторжения, найденная на карточке контракта;
+- text/<sha256>/<стр>.<вид>    — текст страницы: text — слой PDF, ocr — распознанный;
+- chunks/ab/<sha256>           — ответ LLM на фрагмент длинного договора (ключ — хеш промта).
+
+Один и тот же файл из filestore по разным ссылкам хранится один раз, а
+повторный анализ тендера обходится без сети и платного OCR.
+Размер ограничен DOC_CACHE_MAX_BYTES: при превышении удаляются файлы,
+к которым дольше всего не обращались (время доступа — mtime, обновляется при чтении).
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DOC_CACHE_DIR = os.getenv("DOC_CACHE_DIR", "doc_cache")
+DOC_CACHE_MAX_BYTES = int(os.getenv("DOC_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+DOC_LINK_TTL = int(os.getenv("DOC_LINK_TTL", str(24 * 3600)))
+# «Документа нет» живёт меньше: PDF расторжения могут опубликовать в любой момент
+DOC_NO_LINK_TTL = int(os.getenv("DOC_NO_LINK_TTL", "1800"))
+
+EVICT_TO = 0.9  # после вытеснения кеш занимает не больше 90% лимита
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class DocumentCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.counters = Counter()  # <вид>_hit / <вид>_miss, evicted / evicted_bytes; меняются под _lock
+        self._lock = threading.Lock()
+        self._size = None  # считается при первой записи
+
+    # --- файлы ---
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    def _count(self, kind: str, hit: bool):
+        # Кеш читают из потоков asyncio.to_thread — без блокировки инкременты терялись бы
+        with self._lock:
+            self.counters[f"{kind}_{'hit' if hit else 'miss'}"] += 1
+
+    def _read(self, path: str, kind: str | None, ttl: int | None = None) -> bytes | None:
+        """kind=None — попадание считает вызывающий (get_link)"""
+        try:
+            if ttl is not None and time.time() - os.path.getmtime(path) > ttl:
+                if kind:
+                    self._count(kind, False)
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            if kind:
+                self._count(kind, False)
+            return None
+        if ttl is None:
+            # Отметка об использовании для LRU; у записей с TTL mtime — время записи
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        if kind:
+            self._count(kind, True)
+        return data
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # читатели не увидят недописанный файл
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - previous
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _files(self) -> list[tuple[float, int, str]]:
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue  # файл ещё дописывается
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._files())
+
+    def _evict(self):
+        # Размер пересчитывается по диску: в кеш пишут и другие процессы
+        files = sorted(self._files())
+        self._size = sum(size for _, size, _ in files)
+        target = self.max_bytes * EVICT_TO
+        for _, size, path in files:
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                continue
+            self.counters["evicted"] += 1
+            self.counters["evicted_bytes"] += size
+
+    # --- документы ---
+
+    def get_document_by_url(self, url: str) -> tuple[str, bytes] | None:
+        doc_hash = self._read(self._path("urls", sha256(url.encode("utf-8"))), "url")
+        if doc_hash is None:
+            return None
+        doc_hash = doc_hash.decode("ascii")
+        data = self.get_document(doc_hash)
+        return (doc_hash, data) if data is not None else None
+
+    def get_document(self, doc_hash: str) -> bytes | None:
+        return self._read(self._path("blobs", doc_hash[:2], f"{doc_hash}.pdf"), "document")
+
+    def document_path(self, doc_hash: str) -> str | None:
+        """Путь к PDF на диске — чтобы передавать в другие процессы путь, а не байты"""
+        path = self._path("blobs", doc_hash[:2], f"{doc_hash}.pdf")
+        return os.path.abspath(path) if os.path.exists(path) else None
+
+    def put_document(self, url: str, data: bytes) -> str:
+        doc_hash = sha256(data)
+        blob_path = self._path("blobs", doc_hash[:2], f"{doc_hash}.pdf")
+        if not os.path.exists(blob_path):
+            self._write(blob_path, data)
+        self._write(self._path("urls", sha256(url.encode("utf-8"))), doc_hash.encode("ascii"))
+        return doc_hash
+
+    # --- текст страниц ---
+
+    def get_page_text(self, doc_hash: str, page_num: int, kind: str) -> str | None:
+        data = self._read(self._path("text", doc_hash, f"{page_num:04d}.{kind}"), kind)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_page_text(self, doc_hash: str, page_num: int, kind: str, text: str):
+        self._write(self._path("text", doc_hash, f"{page_num:04d}.{kind}"), text.encode("utf-8"))
+
+    # --- промежуточные ответы LLM ---
+
+    def get_chunk_result(self, key: str) -> str | None:
+        data = self._read(self._path("chunks", key[:2], key), "chunk")
+        return data.decode("utf-8") if data is not None else None
+
+    def put_chunk_result(self, key: str, text: str):
+        self._write(self._path("chunks", key[:2], key), text.encode("utf-8"))
+
+    # --- ссылки на документы ---
+
+    def get_link(self, key: str) -> str | None:
+        """Найденная ссылка, "" — документа на карточке не было, None — надо проверить карточку"""
+        path = self._path("links", sha256(key.encode("utf-8")))
+        data = self._read(path, None, ttl=DOC_LINK_TTL)
+        if data == b"":
+            try:
+                if time.time() - os.path.getmtime(path) > DOC_NO_LINK_TTL:
+                    data = None  # устаревшая отметка «документа нет» — промах
+            except OSError:
+                data = None
+        self._count("link", data is not None)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_link(self, key: str, url: str):
+        self._write(self._path("links", sha256(key.encode("utf-8"))), url.encode("utf-8"))
+
+    def stats(self) -> dict:
+        """Счётчики и доля попаданий по видам записей (<вид>_hit_rate)"""
+        with self._lock:
+            stats = dict(self.counters)
+        for kind in {key.rsplit("_", 1)[0] for key in stats if key.endswith(("_hit", "_miss"))}:
+            hits, misses = stats.get(f"{kind}_hit", 0), stats.get(f"{kind}_miss", 0)
+            stats[f"{kind}_hit_rate"] = round(hits / (hits + misses), 3)
+        return stats
+
+
+doc_cache = DocumentCache(DOC_CACHE_DIR, DOC_CACHE_MAX_BYTES)
@@ -1,30 +1,33 @@
-import requests
+import asyncio
 from bs4 import BeautifulSoup
 from database.models import ParsedTender
+from parser.crawler import CrawlError, get_crawl_engine
+from llm.doc_cache import doc_cache
 
 
 
 
-def get_contract_termination_pdf(tender: ParsedTender) -> str:
+async def get_contract_termination_pdf(tender: ParsedTender) -> str:
     """
     Парсит страницу и возвращает ссылку на PDF-файл, связанный с расторжением контракта.
     Только из блока с заголовком: 'Информация об исполнении (о расторжении) контракта'
     """
 
     reestrNumber = tender.title
+    # Кеш на диске, а запись может запустить вытеснение с обходом всего каталога — не в event loop
+    cached = await asyncio.to_thread(doc_cache.get_link, reestrNumber)
+    if cached is not None:
+        return cached
 
     url = "https://zakupki.gov.ru/epz/contract/contractCard/document-info.html?reestrNumber=" + reestrNumber[2:]
 
-    headers = {
-        "User-Agent": "Mozilla/5.0"
-    }
-
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        print(f"Ошибка при загрузке страницы: {response.status_code}")
+    try:
+        html = await get_crawl_engine().fetch_text(url)
+    except CrawlError as e:
+        print(f"Ошибка при загрузке страницы: {e}")
         return ""
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
 
 
     blocks = soup.find_all('div', class_='card-attachments__block')
@@ -36,5 +39,8 @@ def get_contract_termination_pdf(tender: ParsedTender) -> str:
                 href = link['href']
                 title = link.get('title', '').lower()
                 if "pdf" in title and "filestore" in href:
+                    await asyncio.to_thread(doc_cache.put_link, reestrNumber, href)
                     return href
+    # Документа пока нет — это тоже запоминаем, но только на DOC_NO_LINK_TTL
+    await asyncio.to_thread(doc_cache.put_link, reestrNumber, "")
     return ""
\ No newline at end of file
@@ -1,14 +1,22 @@
 import asyncio
 import aiohttp
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import io
 import base64
+from dataclasses import dataclass
+from typing import Callable
 from PIL import Image
 import fitz
 import PyPDF2
+import tempfile
 import time
-import requests
 from dotenv import load_dotenv
 import os
+from llm.clients import get_http_client
+from llm.doc_cache import doc_cache
+from parser.crawler import get_crawl_engine
+from parser.throttle import throttle
 
 
 
@@ -17,13 +25,59 @@ load_dotenv()
 YANDEX_OAUTH_TOKEN = os.getenv("YANDEX_OCR_TOKEN") 
 YANDEX_LLM_FOLD_ID = os.getenv("YANDEX_LLM_FOLD_ID") 
 
-# Семафор для ограничения числа одновременных запросов
-SEM = asyncio.Semaphore(5)
+OCR_RENDER_PROCESSES = int(os.getenv("OCR_RENDER_PROCESSES", str(max(1, (os.cpu_count() or 2) // 2))))
+OCR_QUEUE_SIZE = int(os.getenv("OCR_QUEUE_SIZE", "4"))  # растеризованных страниц в ожидании OCR
+OCR_CONSUMERS = int(os.getenv("OCR_CONSUMERS", "5"))
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "30"))  # страница с текстовым слоем короче этого уходит на OCR
+PDF_TEXT_BACKEND = os.getenv("PDF_TEXT_BACKEND", "pymupdf")  # pymupdf / pypdf2
 
 
-def encode_image(img: Image.Image) -> str:
+@dataclass(frozen=True)
+class RenderSettings:
+    """Как страница превращается в картинку для OCR — от этого зависит размер запроса"""
+    dpi: int = 300  # верхняя граница
+    min_dpi: int = 150
+    grayscale: bool = True
+    jpeg_quality: int = 75
+    max_side: int = 3508  # длинная сторона картинки в пикселях (A4 при 300 dpi)
+    adaptive: bool = True  # не рендерить скан с разрешением выше, чем у него самого
+
+
+OCR_RENDER_SETTINGS = RenderSettings(
+    dpi=int(os.getenv("OCR_DPI", "300")),
+    min_dpi=int(os.getenv("OCR_MIN_DPI", "150")),
+    grayscale=os.getenv("OCR_GRAYSCALE", "true").lower() == "true",
+    jpeg_quality=int(os.getenv("OCR_JPEG_QUALITY", "75")),
+    max_side=int(os.getenv("OCR_MAX_SIDE", "3508")),
+    adaptive=os.getenv("OCR_ADAPTIVE_DPI", "true").lower() == "true",
+)
+
+
+def choose_dpi(page, settings: RenderSettings) -> int:
+    """
+    DPI страницы: не выше settings.dpi и разрешения встроенного скана
+    (выше — только апскейл без новых деталей), не ниже min_dpi,
+    и так, чтобы длинная сторона не превышала max_side.
+    """
+    dpi = settings.dpi
+    if settings.adaptive:
+        # Самая крупная картинка на странице — это и есть скан
+        images = [info for info in page.get_image_info() if info.get("width") and info.get("bbox")]
+        if images:
+            image = max(images, key=lambda info: fitz.Rect(info["bbox"]).get_area())
+            bbox_width = fitz.Rect(image["bbox"]).width
+            if bbox_width > 0:
+                native_dpi = image["width"] / (bbox_width / 72)
+                dpi = min(dpi, max(settings.min_dpi, round(native_dpi)))
+    longest_inches = max(page.rect.width, page.rect.height) / 72
+    if longest_inches > 0:
+        dpi = min(dpi, int(settings.max_side / longest_inches))
+    return max(dpi, 36)
+
+
+def encode_image(img: Image.Image, quality: int = 75) -> str:
     with io.BytesIO() as buffer:
-        img.save(buffer, format="JPEG")
+        img.save(buffer, format="JPEG", quality=quality, optimize=True)
         return base64.b64encode(buffer.getvalue()).decode("utf-8")
 
 
@@ -43,26 +97,22 @@ async def yandex_ocr(session: aiohttp.ClientSession, image_b64: str, max_retries
     backoff = 1  # начальная задержка
 
     for attempt in range(1, max_retries + 1):
-        async with SEM:
-            try:
-                async with session.post(url, headers=headers, json=data, timeout=30) as response:
-                    if response.status == 429:
-                        print(f"[!] 429 Too Many Requests — попытка {attempt}/{max_retries}, ждём {backoff:.1f} сек.")
-                        await asyncio.sleep(backoff)
-                        backoff *= 2
-                        continue
-
-                    response.raise_for_status()
-                    return await response.json()
-
-            except aiohttp.ClientError as e:
-                print(f"[!] Ошибка сети (попытка {attempt}): {e}")
-                await asyncio.sleep(backoff)
-                backoff *= 2
-                continue
-            except Exception as e:
-                print(f"[!] Ошибка Yandex OCR: {e}")
-                return None
+        # Темп и число одновременных запросов к OCR общие для всех процессов
+        try:
+            async with throttle("ocr") as permit:
+                async with session.post(url, headers=headers, json=data) as response:
+                    permit.record(response.status, response.headers.get("Retry-After"))
+                    if response.status != 429:
+                        response.raise_for_status()
+                        return await response.json()
+            print(f"[!] 429 Too Many Requests — попытка {attempt}/{max_retries}, ждём {backoff:.1f} сек.")
+        except aiohttp.ClientError as e:
+            print(f"[!] Ошибка сети (попытка {attempt}): {e}")
+        except Exception as e:
+            print(f"[!] Ошибка Yandex OCR: {e}")
+            return None
+        await asyncio.sleep(backoff)
+        backoff *= 2
 
     print("[!] Превышено количество попыток для Yandex OCR")
     return None
@@ -83,55 +133,190 @@ def extract_text_from_yandex_response(response_json: dict) -> str:
         return ""
 
 
-async def ocr_page(session: aiohttp.ClientSession, page_num: int, page) -> str:
-    pix = page.get_pixmap(dpi=300)
-    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-    img_b64 = encode_image(img)
-    response_json = await yandex_ocr(session, img_b64)
-    text = extract_text_from_yandex_response(response_json) if response_json else "[Ошибка OCR]"
-    return f"{page_num:04d}|||--- Страница {page_num} (OCR) ---\n{text}"
+_worker_doc = None  # в процессе пула: последний открытый документ (путь, fitz.Document)
+
+
+def render_page(path: str, page_index: int, settings: RenderSettings = OCR_RENDER_SETTINGS) -> str:
+    """
+    Растеризация страницы и кодирование в JPEG/base64 — выполняется в пуле процессов.
+    path — путь к PDF: в процесс уходит строка, а не байты документа, и документ
+    открывается один раз на процесс, а не на каждую страницу.
+    """
+    global _worker_doc
+    if _worker_doc is None or _worker_doc[0] != path:
+        if _worker_doc is not None:
+            _worker_doc[1].close()
+        _worker_doc = (path, fitz.open(path))
+    page = _worker_doc[1][page_index]
+    colorspace = fitz.csGRAY if settings.grayscale else fitz.csRGB
+    pix = page.get_pixmap(dpi=choose_dpi(page, settings), colorspace=colorspace, alpha=False)
+    img = Image.frombytes("L" if settings.grayscale else "RGB", [pix.width, pix.height], pix.samples)
+    return encode_image(img, settings.jpeg_quality)
+
+
+_render_pool: ProcessPoolExecutor | None = None
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        # spawn: fork процесса с потоками и открытыми соединениями небезопасен
+        _render_pool = ProcessPoolExecutor(max_workers=OCR_RENDER_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+async def parallel_ocr_async(path: str, page_nums: list[int], doc_hash: str,
+                             progress: Callable[..., None] | None = None) -> dict[int, str]:
+    """
+    Страницы растеризуются в пуле процессов по мере надобности и через ограниченную
+    очередь уходят на OCR: в памяти одновременно не больше OCR_QUEUE_SIZE + OCR_CONSUMERS
+    страниц, а растеризация следующих страниц идёт параллельно с запросами к OCR.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_render_pool()
+    texts: dict[int, str] = {}
+    cached = await asyncio.to_thread(
+        lambda: {page_num: doc_cache.get_page_text(doc_hash, page_num, "ocr") for page_num in page_nums})
+    texts.update((page_num, text) for page_num, text in cached.items() if text is not None)
+    pending = [page_num for page_num in page_nums if page_num not in texts]
+
+    def page_done():
+        if progress:
+            progress("ocr", page=len(texts), total=len(page_nums))
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=OCR_QUEUE_SIZE)
+
+    async def produce():
+        for page_num in pending:
+            await queue.put((page_num, loop.run_in_executor(pool, render_page, path, page_num - 1)))
+        for _ in range(OCR_CONSUMERS):
+            await queue.put(None)
+
+    async def consume(session: aiohttp.ClientSession):
+        while (item := await queue.get()) is not None:
+            page_num, rendered = item
+            try:
+                img_b64 = await rendered
+            except Exception as e:
+                print(f"[!] Ошибка растеризации страницы {page_num}: {e}")
+                texts[page_num] = "[Ошибка OCR]"
+                page_done()
+                continue
+            response_json = await yandex_ocr(session, img_b64)
+            del img_b64
+            if response_json:
+                texts[page_num] = extract_text_from_yandex_response(response_json)
+                await asyncio.to_thread(doc_cache.put_page_text, doc_hash, page_num, "ocr", texts[page_num])
+            else:
+                texts[page_num] = "[Ошибка OCR]"  # ошибку не кешируем — при следующем анализе страница распознается заново
+            page_done()
+
+    if pending:
+        session = get_http_client("ocr")
+        await asyncio.gather(produce(), *(consume(session) for _ in range(OCR_CONSUMERS)))
+
+    return texts
+
+
+async def download_pdf(pdf_url: str) -> tuple[str, bytes]:
+    """
+    PDF из кеша документов или из сети; возвращает (sha256, байты).
+    Файлы лежат в filestore zakupki.gov.ru, поэтому качаются общим движком
+    парсера — с его лимитами, таймаутами и повторами.
+    """
+    cached = await asyncio.to_thread(doc_cache.get_document_by_url, pdf_url)
+    if cached:
+        return cached
+    content = await get_crawl_engine().fetch_bytes(pdf_url)
+    return await asyncio.to_thread(doc_cache.put_document, pdf_url, content), content
+
+
+def read_text_layer(pdf_bytes: bytes, backend: str = None) -> list[str]:
+    """Текстовый слой каждой страницы; у отсканированных страниц он пустой"""
+    backend = backend or PDF_TEXT_BACKEND
+    if backend == "pypdf2":
+        reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        return [page.extract_text() or "" for page in reader.pages]
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [page.get_text() for page in doc]
+
+
+def pages_needing_ocr(texts: list[str]) -> list[int]:
+    """Номера страниц (с 1), где текстового слоя нет или он слишком короткий"""
+    return [page_num for page_num, text in enumerate(texts, 1) if len("".join(text.split())) < OCR_MIN_CHARS]
 
 
-async def parallel_ocr_async(doc) -> list[str]:
-    async with aiohttp.ClientSession() as session:
-        tasks = [ocr_page(session, i + 1, page) for i, page in enumerate(doc)]
-        results = await asyncio.gather(*tasks)
-    # Сортируем, чтобы сохранить порядок страниц
-    return [res.split("|||", 1)[1] for res in sorted(results)]
+def write_temp_pdf(pdf_bytes: bytes, doc_hash: str) -> str:
+    """Документа нет в кеше (вытеснен или не записался) — временный файл для пула растеризации"""
+    fd, path = tempfile.mkstemp(prefix=f"{doc_hash}-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    return path
 
 
-async def extract_text(pdf_url: str) -> str | None:
+def extract_text_layer(pdf_bytes: bytes, doc_hash: str) -> list[str]:
+    kind = f"text_{PDF_TEXT_BACKEND}"
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = doc.page_count
+    cached = [doc_cache.get_page_text(doc_hash, page_num, kind) for page_num in range(1, page_count + 1)]
+    if all(text is not None for text in cached):
+        return cached
+
     try:
-        start_all = time.time()
-        response = requests.get(pdf_url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=15)
-        response.raise_for_status()
+        texts = read_text_layer(pdf_bytes)
+    except Exception as e:
+        # Слой не читается — распознаём все страницы
+        print(f"[!] Ошибка извлечения текста ({PDF_TEXT_BACKEND}): {e}")
+        return [""] * page_count
+    for page_num, text in enumerate(texts, 1):
+        doc_cache.put_page_text(doc_hash, page_num, kind, text)
+    return texts
 
-        text_pages = []
-        pdf_bytes = io.BytesIO(response.content)
 
-        try:
-            reader = PyPDF2.PdfReader(pdf_bytes)
-            for page_num, page in enumerate(reader.pages, 1):
-                page_text = page.extract_text() or ""
-                if page_text.strip():
-                    text_pages.append(f"--- Страница {page_num} ---\n{page_text}")
-        except Exception as e:
-            print(f"PyPDF2 ошибка: {e}")
-            
-        if not text_pages:
-            print("OCR через Yandex API (асинхронно)...")
-            pdf_bytes.seek(0)
-            doc = fitz.open(stream=pdf_bytes.read(), filetype="pdf")
+async def extract_text(pdf_url: str, progress: Callable[..., None] | None = None) -> str | None:
+    """
+    Текст договора по страницам: где есть текстовый слой — берём его,
+    остальные страницы растеризуются и распознаются; результат в порядке страниц.
+    """
+    try:
+        start_all = time.time()
+        doc_hash, pdf_bytes = await download_pdf(pdf_url)
+
+        texts = await asyncio.to_thread(extract_text_layer, pdf_bytes, doc_hash)
+        ocr_pages = pages_needing_ocr(texts)
+        if progress:
+            progress("text_extracted", pages=len(texts), ocrPages=len(ocr_pages))
 
-            # Запускаем асинхронную OCR обработку
-            ocr_results = await parallel_ocr_async(doc)
-            text_pages.extend(ocr_results)
+        ocr_texts = {}
+        if ocr_pages:
+            print(f"OCR через Yandex API (асинхронно): {len(ocr_pages)} из {len(texts)} стр.")
+            path = await asyncio.to_thread(doc_cache.document_path, doc_hash)
+            temp_path = None if path else await asyncio.to_thread(write_temp_pdf, pdf_bytes, doc_hash)
+            try:
+                ocr_texts = await parallel_ocr_async(path or temp_path, ocr_pages, doc_hash, progress)
+            finally:
+                if temp_path:
+                    os.unlink(temp_path)
 
             duration_ocr = time.time() - start_all
             print(f"OCR завершён за {duration_ocr:.1f} сек.")
 
+        text_pages = []
+        for page_num, text in enumerate(texts, 1):
+            if page_num in ocr_texts:
+                text_pages.append(f"--- Страница {page_num} (OCR) ---\n{ocr_texts[page_num]}")
+            elif text.strip():
+                text_pages.append(f"--- Страница {page_num} ---\n{text}")
+
         total_duration = time.time() - start_all
-        print(f"Общая длительность: {total_duration:.1f} сек.")
+        print(f"Общая длительность: {total_duration:.1f} сек., кеш документов: {doc_cache.stats()}")
 
         return "\n\n".join(text_pages) if text_pages else None
 
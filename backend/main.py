@@ -1,15 +1,46 @@
+from contextlib import asynccontextmanager
+from brotli_asgi import BrotliMiddleware
 from fastapi import FastAPI
 from auth import routes as auth_routes
 from parser import routes as parser_routes
+from parser.crawler import close_crawl_engine, get_crawl_engine
+from parser.scheduler import start_scheduler, stop_scheduler
+from parser.throttle import close_throttle
+from database.database import async_engine
+from llm.analysis_batches import cancel_analysis_batches
+from llm.analysis_runs import cancel_analysis_runs
+from llm.clients import close_http_clients, start_http_clients
+from llm.ocr import shutdown_render_pool
 from admin_requests import routes as admin_requests_routes
+from profiles import routes as profiles_routes
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # HTTP-клиенты живут всё время работы приложения: пул соединений, keep-alive, кеш DNS
+    await get_crawl_engine().start()
+    await start_http_clients()
+    start_scheduler()
+    yield
+    await stop_scheduler()
+    await cancel_analysis_batches()
+    await cancel_analysis_runs()
+    shutdown_render_pool()
+    await close_crawl_engine()
+    await close_http_clients()
+    await close_throttle()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+# Сжатие согласуется по Accept-Encoding: brotli, для клиентов без него — gzip.
+# Потоки SSE не сжимаются: brotli копит данные и событие не дошло бы до клиента сразу
+app.add_middleware(BrotliMiddleware, minimum_size=1000, gzip_fallback=True, excluded_handlers=[r"/analyze/stream$"])
 app.include_router(auth_routes.router)
 app.include_router(parser_routes.router)
 app.include_router(admin_requests_routes.router)
+app.include_router(profiles_routes.router)
 
-from database.database import Base, engine
-import database.models
+from database.migrations import init_db
 
-# Base.metadata.drop_all(bind=engine) 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+init_db()
\ No newline at end of file
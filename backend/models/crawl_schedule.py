@@ -0,0 +1,46 @@
+from croniter import croniter
+from datetime import datetime, timedelta, timezone
+from pydantic import BaseModel, Field, model_validator
+from typing import Optional
+
+MIN_INTERVAL_MINUTES = 15
+MAX_JITTER_SECONDS = 3600
+CRON_CHECK_SPAN = timedelta(days=2)  # суточный узор и переход через полночь
+
+
+def min_cron_gap(cron: str, span: timedelta = CRON_CHECK_SPAN) -> timedelta:
+    """
+    Наименьший промежуток между соседними запусками cron на ближайшем отрезке span.
+    Проверять только два ближайших запуска мало: "0,5 * * * *" даёт 5 минут и 55.
+    Останавливается на первом промежутке короче MIN_INTERVAL_MINUTES.
+    """
+    limit = timedelta(minutes=MIN_INTERVAL_MINUTES)
+    runs = croniter(cron, datetime.now(timezone.utc))
+    previous = runs.get_next(datetime)
+    end = previous + span
+    smallest = span
+    while previous < end and smallest >= limit:
+        current = runs.get_next(datetime)
+        smallest = min(smallest, current - previous)
+        previous = current
+    return smallest
+
+
+class CrawlScheduleCreate(BaseModel):
+    profileId: int
+    intervalMinutes: Optional[int] = Field(None, ge=MIN_INTERVAL_MINUTES)
+    cron: Optional[str] = None  # "мин час день месяц день_недели", время UTC
+    incremental: bool = True
+    jitterSeconds: int = Field(300, ge=0, le=MAX_JITTER_SECONDS)
+    enabled: bool = True
+
+    @model_validator(mode="after")
+    def check_period(self) -> "CrawlScheduleCreate":
+        if bool(self.intervalMinutes) == bool(self.cron):
+            raise ValueError("Укажите либо intervalMinutes, либо cron")
+        if self.cron:
+            if not croniter.is_valid(self.cron):
+                raise ValueError(f"cron ({self.cron}) не является валидным выражением")
+            if min_cron_gap(self.cron) < timedelta(minutes=MIN_INTERVAL_MINUTES):
+                raise ValueError(f"cron ({self.cron}) запускается чаще, чем раз в {MIN_INTERVAL_MINUTES} минут")
+        return self
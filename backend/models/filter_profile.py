@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from models.parse import ParseFilters
+
+MIN_PROFILE_NAME_LENGTH = 1
+MAX_PROFILE_NAME_LENGTH = 64
+
+
+class FilterProfileCreate(BaseModel):
+    name: str = Field(...,
+                      min_length=MIN_PROFILE_NAME_LENGTH,
+                      max_length=MAX_PROFILE_NAME_LENGTH)
+    filters: ParseFilters
@@ -1,6 +1,8 @@
 from pydantic import BaseModel, Field, conlist, field_validator, model_validator
-from typing import Optional, List
-from datetime import datetime
+from typing import ClassVar, Optional, List
+from datetime import date, datetime
+from decimal import Decimal
+import os
 
 
 
@@ -11,7 +13,21 @@ UPDATE_DATE, PUBLISH_DATE, PRICE, RELEVANCE = range(1, 5)
 ALLOWED_SORT_BY = [UPDATE_DATE, PUBLISH_DATE, PRICE, RELEVANCE]
 ALLOWED_SORT_BY_STRINGS = ["UPDATE_DATE", "PUBLISH_DATE", "PRICE", "RELEVANCE"]
 
+LONG_CRAWL_MAX_PAGES = int(os.getenv("LONG_CRAWL_MAX_PAGES", "500"))
+
+# Диапазоны дат, по которым делится поиск с разбиением, в порядке предпочтения
+PARTITION_DATE_FIELDS = [
+    ("contractDateFrom", "contractDateTo"),
+    ("publishDateFrom", "publishDateTo"),
+    ("updateDateFrom", "updateDateTo"),
+]
+
+TENDERS_PAGE_LIMIT = 500
+TENDERS_PAGE_LIMIT_MAX = 1000
+
 class ParseFilters(BaseModel):
+    MAX_PAGES: ClassVar[int] = 10  # страниц за одну задачу
+
     pageStart: Optional[int] = 1
     pageEnd: Optional[int] = 1
     priceFrom: Optional[int] = None
@@ -67,8 +83,8 @@ class ParseFilters(BaseModel):
         if not self.pageStart and self.pageEnd:
             self.pageStart = self.pageEnd
         
-        if self.pageStart and self.pageEnd and (self.pageEnd - self.pageStart > 9):
-            raise ValueError(f"Нельзя обрабатывать больше 10 страниц разом")
+        if self.pageStart and self.pageEnd and (self.pageEnd - self.pageStart >= self.MAX_PAGES):
+            raise ValueError(f"Нельзя обрабатывать больше {self.MAX_PAGES} страниц разом")
         
         date_fields = {
             "contractDateFrom": self.contractDateFrom,
@@ -100,4 +116,80 @@ class ParseFilters(BaseModel):
         if self.priceFrom and self.priceTo and self.priceFrom > self.priceTo:
             raise ValueError(f"priceFrom ({self.priceFrom}) не может быть больше priceTo ({self.priceTo})")
                 
-        return self
\ No newline at end of file
+        return self
+
+
+class LongCrawlFilters(ParseFilters):
+    """
+    Длинный парсинг (POST /parse/long): сотни страниц одной задачей.
+    Прогресс хранится по страницам, поэтому после сбоя задача продолжается с незавершённых.
+    """
+    MAX_PAGES: ClassVar[int] = LONG_CRAWL_MAX_PAGES
+
+
+class PartitionFilters(ParseFilters):
+    """
+    Поиск с разбиением (POST /parse/partitioned): весь диапазон дат и цен делится
+    на подзапросы, каждый из которых помещается в глубину выдачи сайта.
+    pageStart и pageEnd не используются — страницы считаются по числу результатов.
+    """
+
+    @model_validator(mode="after")
+    def check_partition_range(self) -> "PartitionFilters":
+        if not any(getattr(self, df) and getattr(self, dt) for df, dt in PARTITION_DATE_FIELDS):
+            raise ValueError("Для разбиения нужен диапазон дат контракта, размещения или обновления с обеими границами")
+        return self
+
+
+class TenderQuery(BaseModel):
+    """
+    Фильтрация и сортировка сохранённых тендеров на стороне БД.
+    Названия совпадают с ParseFilters; нулевые и пустые значения означают «без ограничения».
+    """
+    priceFrom: Optional[Decimal] = None
+    priceTo: Optional[Decimal] = None
+    contractDateFrom: Optional[str] = ""
+    contractDateTo: Optional[str] = ""
+    publishDateFrom: Optional[str] = ""
+    publishDateTo: Optional[str] = ""
+    updateDateFrom: Optional[str] = ""
+    updateDateTo: Optional[str] = ""
+    executionDateStart: Optional[str] = ""
+    executionDateEnd: Optional[str] = ""
+    sortBy: Optional[int] = None  # None / RELEVANCE — порядок парсинга
+    sortAscending: Optional[bool] = False
+    # Без limit и cursor — весь список одним ответом, как раньше; с cursor без limit — TENDERS_PAGE_LIMIT
+    limit: Optional[int] = Field(None, ge=1, le=TENDERS_PAGE_LIMIT_MAX)
+    cursor: Optional[str] = None  # из заголовка X-Next-Cursor предыдущей страницы
+
+    @field_validator("sortBy")
+    @classmethod
+    def validate_sort_by(cls, v):
+        if not v:
+            return None
+        if v not in ALLOWED_SORT_BY:
+            raise ValueError(f"Недопустимое значения в sortBy. Разрешены только: {ALLOWED_SORT_BY}.")
+        return v
+
+    @model_validator(mode="after")
+    def check_dates(self) -> "TenderQuery":
+        for name in ("contractDateFrom", "contractDateTo", "publishDateFrom", "publishDateTo",
+                     "updateDateFrom", "updateDateTo", "executionDateStart", "executionDateEnd"):
+            value = getattr(self, name)
+            if value and not ParseFilters.is_valid_date(value):
+                raise ValueError(f"{name} ({value}) не является валидной датой")
+        if self.priceFrom and self.priceTo and self.priceFrom > self.priceTo:
+            raise ValueError(f"priceFrom ({self.priceFrom}) не может быть больше priceTo ({self.priceTo})")
+        return self
+
+    def date_ranges(self) -> dict[str, tuple[date | None, date | None]]:
+        """Диапазоны дат по колонкам ParsedTender"""
+        def to_date(value):
+            return datetime.strptime(value, "%d.%m.%Y").date() if value else None
+
+        return {
+            "contract_date_value": (to_date(self.contractDateFrom), to_date(self.contractDateTo)),
+            "publish_date_value": (to_date(self.publishDateFrom), to_date(self.publishDateTo)),
+            "update_date_value": (to_date(self.updateDateFrom), to_date(self.updateDateTo)),
+            "execution_date_value": (to_date(self.executionDateStart), to_date(self.executionDateEnd)),
+        }
@@ -0,0 +1,130 @@
+import asyncio
+import random
+import os
+import aiohttp
+from dotenv import load_dotenv
+from parser.throttle import UpstreamUnavailable, throttle
+
+load_dotenv()
+
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "3"))
+CRAWL_LIMIT_PER_HOST = int(os.getenv("CRAWL_LIMIT_PER_HOST", "3"))
+CRAWL_MAX_RETRIES = int(os.getenv("CRAWL_MAX_RETRIES", "3"))
+CRAWL_BACKOFF = float(os.getenv("CRAWL_BACKOFF", "2.0"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "15"))
+CRAWL_CONNECT_TIMEOUT = float(os.getenv("CRAWL_CONNECT_TIMEOUT", "10"))
+CRAWL_DNS_TTL = int(os.getenv("CRAWL_DNS_TTL", "300"))
+CRAWL_KEEPALIVE = float(os.getenv("CRAWL_KEEPALIVE", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+
+class CrawlError(Exception):
+    """Страница не загрузилась даже после всех повторных попыток"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CrawlEngine:
+    """
+    Асинхронный загрузчик страниц с общим пулом соединений.
+
+    - одна aiohttp-сессия на всё приложение: keep-alive, переиспользование TLS, кеш DNS;
+    - ограничение числа соединений на хост;
+    - темп запросов к сайту общий для всех процессов (parser/throttle.py):
+      корзина токенов, слоты и пауза при 429/5xx вместо случайных задержек;
+    - повторы с экспоненциальной задержкой для сетевых ошибок, 429 и 5xx.
+    """
+
+    def __init__(self,
+                 concurrency: int = CRAWL_CONCURRENCY,
+                 limit_per_host: int = CRAWL_LIMIT_PER_HOST,
+                 max_retries: int = CRAWL_MAX_RETRIES,
+                 backoff: float = CRAWL_BACKOFF,
+                 timeout: float = CRAWL_TIMEOUT,
+                 upstream: str = "zakupki"):
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.upstream = upstream
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=CRAWL_DNS_TTL,
+                keepalive_timeout=CRAWL_KEEPALIVE,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=DEFAULT_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=CRAWL_CONNECT_TIMEOUT),
+            )
+        return self
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _request(self, url: str, headers: dict | None, read):
+        await self.start()
+        wait = self.backoff
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with throttle(self.upstream) as permit:
+                    async with self._session.get(url, headers=headers) as response:
+                        permit.record(response.status, response.headers.get("Retry-After"))
+                        if response.status in RETRY_STATUSES:
+                            raise CrawlError(f"HTTP {response.status}")
+                        if response.status != 200:
+                            # 4xx кроме 429 повторять бессмысленно
+                            raise CrawlError(f"HTTP {response.status}", retryable=False)
+                        return await read(response)
+            except UpstreamUnavailable as e:
+                raise CrawlError(f"{url}: {e}", retryable=False) from e
+            except (aiohttp.ClientError, asyncio.TimeoutError, CrawlError) as e:
+                if not getattr(e, "retryable", True) or attempt == self.max_retries:
+                    raise CrawlError(f"{url}: {e}", retryable=False) from e
+                # Retry-After учитывает ограничитель: следующая попытка дождётся конца паузы
+                print(f"[!] {e} — попытка {attempt}/{self.max_retries}, ждём {wait:.1f} сек.")
+                await asyncio.sleep(wait + random.uniform(0, wait / 2))
+                wait *= 2
+
+    async def fetch_text(self, url: str, headers: dict | None = None) -> str:
+        return await self._request(url, headers, lambda response: response.text())
+
+    async def fetch_bytes(self, url: str, headers: dict | None = None) -> bytes:
+        return await self._request(url, headers, lambda response: response.read())
+
+
+_engine: CrawlEngine | None = None
+
+
+def get_crawl_engine() -> CrawlEngine:
+    """Общий для процесса движок: через него ходят и парсер страниц, и fileLinkParser"""
+    global _engine
+    if _engine is None:
+        _engine = CrawlEngine()
+    return _engine
+
+
+async def close_crawl_engine():
+    global _engine
+    if _engine is not None:
+        await _engine.close()
+        _engine = None
@@ -0,0 +1,93 @@
+"""
+Потоковая выгрузка тендеров сессии в NDJSON, CSV и XLSX.
+
+Строки читаются серверным курсором пачками по EXPORT_BATCH_SIZE, поэтому
+память не зависит от размера сессии. NDJSON и CSV отдаются клиенту по мере
+чтения; XLSX пишется xlsxwriter в режиме constant_memory во временный файл,
+который удаляется после отправки.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Iterator
+import orjson
+import xlsxwriter
+from dotenv import load_dotenv
+from sqlalchemy import select
+from database.database import SessionLocal
+from database.models import ParsedTender, ParseSessionTender
+
+load_dotenv()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Колонки совпадают с ключами ParsedTender.to_dict
+EXPORT_COLUMNS = ["id", "title", "link", "customer", "price", "contractNumber", "purchaseObjects",
+                  "contractDate", "executionDate", "publishDate", "updateDate", "parsedAt", "parsedBy"]
+
+
+def iter_session_batches(session_id: int) -> Iterator[list[dict]]:
+    """
+    Тендеры сессии в порядке парсинга, пачками словарей to_dict.
+    Сессия БД открывается здесь: ответ читается уже после выхода из зависимостей роута.
+    """
+    db = SessionLocal()
+    try:
+        query = select(ParsedTender)\
+            .join(ParseSessionTender, ParseSessionTender.tender_id == ParsedTender.id)\
+            .where(ParseSessionTender.session_id == session_id)\
+            .order_by(ParseSessionTender.id.asc())\
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        # Карта идентичности держит объекты по слабым ссылкам — пачка освобождается сама.
+        # expunge_all здесь нельзя: он подменяет карту, и следующая пачка yield_per падает
+        for partition in db.execute(query).scalars().partitions():
+            yield [tender.to_dict() for tender in partition]
+    finally:
+        db.close()
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def stream_ndjson(session_id: int) -> Iterator[bytes]:
+    for batch in iter_session_batches(session_id):
+        yield b"".join(orjson.dumps(row) + b"\n" for row in batch)
+
+
+def stream_csv(session_id: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM — чтобы Excel открывал кириллицу без мастера импорта
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in iter_session_batches(session_id):
+        writer.writerows([_cell(row[column]) for column in EXPORT_COLUMNS] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def write_xlsx(session_id: int, path: str):
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet("Тендеры")
+        worksheet.write_row(0, 0, EXPORT_COLUMNS, workbook.add_format({"bold": True}))
+        row_number = 1
+        for batch in iter_session_batches(session_id):
+            for row in batch:
+                worksheet.write_row(row_number, 0, [_cell(row[column]) for column in EXPORT_COLUMNS])
+                row_number += 1
+    finally:
+        workbook.close()
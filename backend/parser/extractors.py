@@ -0,0 +1,210 @@
+"""
+Извлечение тендеров из HTML страницы результатов zakupki.gov.ru.
+
+Бэкенды возвращают одинаковые записи — лёгкие TenderRecord с полями ParsedTender:
+- lxml: разбор в C и заранее скомпилированные XPath-выражения (по умолчанию);
+- soup: исходная реализация на BeautifulSoup, остаётся запасным вариантом.
+
+Бэкенд выбирается переменной окружения PARSER_BACKEND (lxml / soup).
+"""
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from lxml import etree
+
+load_dotenv()
+
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml")
+
+BASE_URL = "https://zakupki.gov.ru"
+
+
+@dataclass(slots=True)
+class TenderRecord:
+    """Строка тендера до записи в БД — без ORM-состояния и накладных расходов"""
+    title: str
+    link: str
+    customer: str
+    price: str
+    contract_number: str
+    purchase_objects: str
+    contract_date: str
+    execution_date: str
+    publish_date: str
+    update_date: str
+
+
+TENDER_FIELDS = TenderRecord.__slots__
+
+
+def _record(title, link, customer, price, contract_number, purchase_objects, dates) -> TenderRecord:
+    return TenderRecord(
+        title=title,
+        link=f"{BASE_URL}{link}",
+        customer=customer,
+        price=price,
+        contract_number=contract_number.replace('\n', '').replace(' ', '').replace("№", "№ "),
+        purchase_objects=purchase_objects,
+        contract_date=dates[0],
+        execution_date=dates[1],
+        publish_date=dates[2],
+        update_date=dates[3],
+    )
+
+
+def parse_total(text: str) -> int | None:
+    """
+    «1 234 записи» -> 1234; «более 1 000 записей» -> 1001:
+    сайт не говорит точное число, но выдача точно больше.
+    """
+    digits = re.sub(r"\D", "", text)
+    if not digits:
+        return None
+    return int(digits) + (1 if "более" in text.lower() else 0)
+
+
+class TenderExtractor(ABC):
+    name = ""
+
+    @abstractmethod
+    def extract(self, html: str) -> list[TenderRecord]:
+        ...
+
+    @abstractmethod
+    def extract_total(self, html: str) -> int | None:
+        """Число результатов поиска из .search-results__total; None — блока нет"""
+
+
+class SoupExtractor(TenderExtractor):
+    name = "soup"
+
+    def extract(self, html: str) -> list[TenderRecord]:
+        soup = BeautifulSoup(html, "html.parser")
+        results: list[TenderRecord] = []
+
+        for block in soup.select(".search-registry-entry-block"):
+            try:
+                title_block = block.select_one(".registry-entry__header-mid__number")
+                title = title_block.get_text(strip=True)
+                link = title_block.select_one("a")["href"]
+                customer = block.select_one(".registry-entry__body-href").get_text(strip=False)
+                price = block.select_one(".price-block__value").get_text(strip=True)
+                contract_number = block.select_one(".registry-entry__body-value").get_text(strip=True)
+                try:
+                    purchase_objects = block.select_one(".lots-wrap-content__body__val span span").get_text(strip=False)
+                except Exception as e:
+                    purchase_objects = ""
+                dates = [value.get_text(strip=True) for value in block.select(".data-block__value")]
+                # status_block = block.select_one(".registry-entry__header-mid__title")
+                # status = status_block.get_text(strip=True).lower() if status_block else ""
+
+                results.append(_record(title, link, customer, price, contract_number, purchase_objects, dates))
+            except Exception as e:
+                continue
+
+        return results
+
+    def extract_total(self, html: str) -> int | None:
+        total = BeautifulSoup(html, "html.parser").select_one(".search-results__total")
+        return parse_total(total.get_text(" ", strip=True)) if total else None
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+_X_BLOCKS = etree.XPath(f"//*[{_has_class('search-registry-entry-block')}]")
+_X_TITLE = etree.XPath(f".//*[{_has_class('registry-entry__header-mid__number')}]")
+_X_LINK = etree.XPath("(.//a)[1]/@href")
+_X_CUSTOMER = etree.XPath(f".//*[{_has_class('registry-entry__body-href')}]")
+_X_PRICE = etree.XPath(f".//*[{_has_class('price-block__value')}]")
+_X_CONTRACT_NUMBER = etree.XPath(f".//*[{_has_class('registry-entry__body-value')}]")
+_X_PURCHASE_OBJECTS = etree.XPath(f".//*[{_has_class('lots-wrap-content__body__val')}]//span//span")
+_X_DATES = etree.XPath(f".//*[{_has_class('data-block__value')}]")
+_X_TEXT = etree.XPath(".//text()")
+_X_TOTAL = etree.XPath(f"//*[{_has_class('search-results__total')}]")
+
+
+# Парсер lxml нельзя использовать из нескольких потоков одновременно
+_local = threading.local()
+
+
+def _html_parser():
+    if not hasattr(_local, "parser"):
+        _local.parser = etree.HTMLParser(encoding="utf-8")
+    return _local.parser
+
+
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+
+def _collapse(part: str) -> str:
+    # BeautifulSoup заменяет строки из одних пробелов на "\n" или " " — повторяем это
+    if part.strip(_ASCII_SPACES):
+        return part
+    return "\n" if "\n" in part else " "
+
+
+def _text(element) -> str:
+    """Аналог get_text(strip=False)"""
+    return "".join(_collapse(part) for part in _X_TEXT(element))
+
+
+def _text_stripped(element) -> str:
+    """Аналог get_text(strip=True)"""
+    return "".join(part.strip() for part in _X_TEXT(element))
+
+
+class LxmlExtractor(TenderExtractor):
+    name = "lxml"
+
+    def extract(self, html: str) -> list[TenderRecord]:
+        root = etree.fromstring(html.encode("utf-8"), _html_parser())
+        if root is None:
+            return []
+        results: list[TenderRecord] = []
+
+        for block in _X_BLOCKS(root):
+            title_blocks = _X_TITLE(block)
+            customers = _X_CUSTOMER(block)
+            prices = _X_PRICE(block)
+            contract_numbers = _X_CONTRACT_NUMBER(block)
+            dates = _X_DATES(block)
+            if not title_blocks or not customers or not prices or not contract_numbers or len(dates) < 4:
+                continue
+            links = _X_LINK(title_blocks[0])
+            if not links:
+                continue
+            purchase_objects = _X_PURCHASE_OBJECTS(block)
+
+            results.append(_record(
+                _text_stripped(title_blocks[0]),
+                links[0],
+                _text(customers[0]),
+                _text_stripped(prices[0]),
+                _text_stripped(contract_numbers[0]),
+                _text(purchase_objects[0]) if purchase_objects else "",
+                [_text_stripped(value) for value in dates],
+            ))
+
+        return results
+
+    def extract_total(self, html: str) -> int | None:
+        root = etree.fromstring(html.encode("utf-8"), _html_parser())
+        totals = _X_TOTAL(root) if root is not None else []
+        return parse_total(" ".join(_X_TEXT(totals[0]))) if totals else None
+
+
+EXTRACTORS = {"soup": SoupExtractor, "lxml": LxmlExtractor}
+
+
+def get_extractor(name: str | None = None) -> TenderExtractor:
+    name = name or PARSER_BACKEND
+    if name not in EXTRACTORS:
+        print(f"[!] Неизвестный бэкенд парсинга '{name}', используется BeautifulSoup")
+        name = "soup"
+    return EXTRACTORS[name]()
@@ -0,0 +1,51 @@
+from datetime import date
+from database.models import FilterProfile
+from parser.extractors import TenderRecord
+from parser.normalize import parse_date
+
+
+class WatermarkTracker:
+    """
+    Отметка уровня профиля: самая поздняя дата обновления и реестровые номера,
+    уже виденные с этой датой. Дата на сайте указывается без времени, поэтому
+    тендер с той же датой, но новым номером считается новым.
+    """
+
+    def __init__(self, profile: FilterProfile):
+        self.old_date: date | None = profile.watermark_date
+        self.old_numbers: set[str] = set(profile.watermark_numbers or [])
+        self.max_date: date | None = None
+        self.max_numbers: set[str] = set()
+
+    def is_seen(self, record: TenderRecord) -> bool:
+        update_date = parse_date(record.update_date)
+        if self.old_date is None or update_date is None:
+            return False
+        if update_date < self.old_date:
+            return True
+        return update_date == self.old_date and record.title in self.old_numbers
+
+    def page_is_seen(self, records: list[TenderRecord]) -> bool:
+        """Страница целиком не новее отметки — дальше листать не нужно"""
+        return all(self.is_seen(record) for record in records)
+
+    def observe(self, records: list[TenderRecord]):
+        for record in records:
+            update_date = parse_date(record.update_date)
+            if update_date is None:
+                continue
+            if self.max_date is None or update_date > self.max_date:
+                self.max_date = update_date
+                self.max_numbers = {record.title}
+            elif update_date == self.max_date:
+                self.max_numbers.add(record.title)
+
+    def apply(self, profile: FilterProfile):
+        """Сдвигает отметку профиля вперёд по итогам успешного прохода"""
+        if self.max_date is None:
+            return
+        if self.old_date is None or self.max_date > self.old_date:
+            profile.watermark_date = self.max_date
+            profile.watermark_numbers = sorted(self.max_numbers)
+        elif self.max_date == self.old_date:
+            profile.watermark_numbers = sorted(self.old_numbers | self.max_numbers)
@@ -0,0 +1,107 @@
+import hashlib
+import random
+import time
+from datetime import datetime, timezone
+from sqlalchemy import select, update, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from database.models import ParsedTender, ParseSession, ParseSessionTender
+from parser.extractors import TenderRecord, TENDER_FIELDS
+from parser.normalize import parse_date, parse_price
+
+# Всё, кроме ключа (реестрового номера в title), входит в хеш содержимого
+HASHED_FIELDS = tuple(field for field in TENDER_FIELDS if field != "title")
+DATE_FIELDS = ("contract_date", "execution_date", "publish_date", "update_date")
+TYPED_FIELDS = ("price_value", *(f"{field}_value" for field in DATE_FIELDS))
+
+# deadlock_detected, serialization_failure: транзакцию можно просто повторить
+RETRYABLE_PGCODES = {"40P01", "40001"}
+INGEST_ATTEMPTS = 3
+
+
+def content_hash(record: TenderRecord) -> str:
+    """Формула совпадает с миграцией 0001 в database/migrations.py"""
+    payload = "\x1f".join(getattr(record, field) or "" for field in HASHED_FIELDS)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def upsert_tenders(db: Session, records: list[TenderRecord], session_id: int, parsed_by: str) -> tuple[int, int]:
+    """
+    Пакетная запись тендеров страницы без ORM-объектов.
+    Тендер с уже известным реестровым номером перезаписывается только если
+    изменился хеш содержимого; в сессию он попадает через parse_session_tenders.
+    Ревизия растёт у текущей сессии, если она пополнилась, и у всех сессий
+    с перезаписанными тендерами — от неё зависят ETag и кеш /tenders.
+    Коммит остаётся за вызывающим. Возвращает (тендеров в сессии, записано строк).
+
+    Части поиска с разбиением пишут в одну сессию параллельно и пересекаются
+    на границах, поэтому строки блокируются в одном порядке: тендеры и членство
+    по реестровому номеру, сессии — по id и в самом конце.
+    """
+    if not records:
+        return 0, 0
+
+    parsed_at = datetime.now(timezone.utc)
+    rows_by_title = {}
+    for record in records:
+        row = {field: getattr(record, field) for field in TENDER_FIELDS}
+        row["price_value"] = parse_price(record.price)
+        for field in DATE_FIELDS:
+            row[f"{field}_value"] = parse_date(getattr(record, field))
+        row["content_hash"] = content_hash(record)
+        row["parsed_by"] = parsed_by
+        row["parsed_at"] = parsed_at
+        row["session_id"] = session_id
+        rows_by_title[record.title] = row  # повтор на странице — берём последний
+
+    titles = sorted(rows_by_title)
+    stmt = insert(ParsedTender).values([rows_by_title[title] for title in titles])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ParsedTender.title],
+        set_={
+            column: stmt.excluded[column]
+            for column in (*HASHED_FIELDS, *TYPED_FIELDS, "content_hash", "parsed_by", "parsed_at")
+        },
+        where=ParsedTender.content_hash.is_distinct_from(stmt.excluded.content_hash),
+    ).returning(ParsedTender.id)
+    written_ids = db.execute(stmt).scalars().all()
+
+    ids_by_title = dict(db.execute(
+        select(ParsedTender.title, ParsedTender.id).where(ParsedTender.title.in_(rows_by_title))
+    ).all())
+    memberships = [{"session_id": session_id, "tender_id": ids_by_title[title]} for title in titles]
+    added = db.execute(
+        insert(ParseSessionTender).values(memberships).on_conflict_do_nothing().returning(ParseSessionTender.id)
+    ).all()
+
+    touched = []
+    if added:
+        touched.append(ParseSession.id == session_id)
+    if written_ids:
+        touched.append(ParseSession.id.in_(
+            select(ParseSessionTender.session_id).where(ParseSessionTender.tender_id.in_(written_ids))
+        ))
+    if touched:
+        session_ids = db.execute(
+            select(ParseSession.id).where(or_(*touched)).order_by(ParseSession.id).with_for_update()
+        ).scalars().all()
+        db.execute(update(ParseSession).where(ParseSession.id.in_(session_ids)).values(revision=ParseSession.revision + 1))
+
+    return len(memberships), len(written_ids)
+
+
+def retry_on_conflict(db: Session, write, *args):
+    """
+    Выполняет транзакцию записи write(db, *args) с коммитом внутри; жертва
+    взаимной блокировки откатывается и повторяется целиком, а не теряет страницу.
+    """
+    for attempt in range(1, INGEST_ATTEMPTS + 1):
+        try:
+            return write(db, *args)
+        except DBAPIError as e:
+            if getattr(e.orig, "pgcode", None) not in RETRYABLE_PGCODES or attempt == INGEST_ATTEMPTS:
+                raise
+            db.rollback()
+            print(f"[!] Конфликт блокировок при записи тендеров, повтор {attempt}/{INGEST_ATTEMPTS - 1}")
+            time.sleep(random.uniform(0.05, 0.2) * attempt)
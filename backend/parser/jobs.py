@@ -0,0 +1,264 @@
+import os
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from models.parse import ParseFilters
+from database.models import ParseJob, ParseJobPage, ParseSession
+from parser.extractors import TenderRecord
+from parser.ingest import retry_on_conflict, upsert_tenders
+
+load_dotenv()
+
+# Воркер отмечается после каждой страницы; задачу без отметки дольше этого считаем брошенной
+PARSE_JOB_STALE_AFTER = float(os.getenv("PARSE_JOB_STALE_AFTER", "600"))
+PARSE_PAGE_MAX_ATTEMPTS = int(os.getenv("PARSE_PAGE_MAX_ATTEMPTS", "3"))
+
+
+def _new_job(filters: ParseFilters, owner_username: str, **fields) -> ParseJob:
+    pages = list(range(filters.pageStart, filters.pageEnd + 1))
+    job = ParseJob(
+        owner_username=owner_username,
+        filters=filters.model_dump(exclude_unset=True),
+        status="queued",
+        pages_total=len(pages),
+        **fields,
+    )
+    job.pages = [ParseJobPage(page_number=page, status="pending") for page in pages]
+    return job
+
+
+def enqueue_parse_job(db: Session, filters: ParseFilters, owner_username: str,
+                      profile_id: int | None = None, incremental: bool = False) -> ParseJob:
+    """Ставит задачу парсинга в очередь и сразу создаёт строки прогресса по страницам"""
+    job = _new_job(filters, owner_username, profile_id=profile_id, incremental=incremental)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def enqueue_partitioned_job(db: Session, filters: ParseFilters, owner_username: str) -> ParseJob:
+    """Поиск с разбиением: страницы появятся у дочерних задач после планирования"""
+    job = ParseJob(
+        owner_username=owner_username,
+        filters=filters.model_dump(exclude_unset=True),
+        partitioned=True,
+        status="queued",
+        pages_total=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def enqueue_partitions(db: Session, parent: ParseJob, partitions: list, worker_id: str) -> bool:
+    """
+    Части поиска ставятся дочерними задачами одной транзакцией и пишут в сессию
+    родителя; родитель ждёт их в статусе split. Первые страницы, загруженные
+    при планировании, сохраняются сразу. False — задачу за это время забрал
+    другой воркер, части ставит он.
+    """
+    return retry_on_conflict(db, _enqueue_partitions, parent, partitions, worker_id)
+
+
+def _enqueue_partitions(db: Session, parent: ParseJob, partitions: list, worker_id: str) -> bool:
+    db.query(ParseJob).filter_by(id=parent.id).with_for_update().populate_existing().first()
+    if parent.status != "running" or parent.worker_id != worker_id:
+        db.rollback()
+        return False
+
+    now = datetime.now(timezone.utc)
+    parent.pages_total = parent.pages_done = parent.tenders_count = 0
+    queued = 0
+    for partition in partitions:
+        filters = partition.filters.model_copy(update={"pageStart": 1, "pageEnd": partition.pages})
+        child = _new_job(filters, parent.owner_username, parent_id=parent.id, session_id=parent.session_id)
+        tenders_count, _ = upsert_tenders(db, partition.records, parent.session_id, parent.owner_username)
+        first_page = child.pages[0]
+        first_page.status, first_page.attempts = "done", 1
+        first_page.tenders_count, first_page.finished_at = tenders_count, now
+        child.pages_done, child.tenders_count = 1, tenders_count
+        if child.pages_total == 1:
+            child.status, child.started_at, child.finished_at = "done", now, now
+        else:
+            queued += 1
+        db.add(child)
+        parent.pages_total += child.pages_total
+        parent.pages_done += 1
+        parent.tenders_count += tenders_count
+
+    parent.heartbeat_at = now
+    if queued:
+        parent.status = "split"
+    else:
+        # Все части уместились на первых страницах — догружать нечего
+        parent.status, parent.finished_at = "done", now
+    db.commit()
+    return True
+
+
+def claim_parse_job(db: Session, worker_id: str) -> ParseJob | None:
+    """
+    Забирает самую старую задачу из очереди.
+    FOR UPDATE SKIP LOCKED позволяет нескольким воркерам (процессам или узлам)
+    разбирать очередь параллельно, не получая одну и ту же задачу дважды.
+    Задача упавшего воркера (running без отметки дольше PARSE_JOB_STALE_AFTER)
+    забирается снова и продолжается с незавершённых страниц.
+    """
+    now = datetime.now(timezone.utc)
+    abandoned = and_(ParseJob.status == "running",
+                     ParseJob.heartbeat_at < now - timedelta(seconds=PARSE_JOB_STALE_AFTER))
+    job = db.query(ParseJob).filter(or_(ParseJob.status == "queued", abandoned))\
+        .order_by(ParseJob.created_at.asc(), ParseJob.id.asc())\
+        .with_for_update(skip_locked=True).first()
+    if not job:
+        return None
+
+    if job.status == "running":
+        print(f"[!] Задача {job.id} брошена воркером {job.worker_id}, продолжаем")
+    job.status = "running"
+    job.worker_id = worker_id
+    job.started_at = job.started_at or now
+    job.heartbeat_at = now
+    db.commit()
+    return job
+
+
+def start_parse_session(db: Session, job: ParseJob) -> ParseSession:
+    """
+    Сессия создаётся до первой страницы, чтобы результаты были видны по мере парсинга.
+    Продолженная задача пишет в ту же сессию.
+    """
+    if job.session_id:
+        return db.query(ParseSession).filter_by(id=job.session_id).first()
+    session = ParseSession(owner_username=job.owner_username)
+    db.add(session)
+    db.flush()
+    job.session_id = session.id
+    db.commit()
+    return session
+
+
+def touch_parse_job(db: Session, job_id: int):
+    """Отметка, что воркер жив, пока задача занята не страницами (планирование, долгое ожидание)"""
+    db.query(ParseJob).filter_by(id=job_id, status="running")\
+        .update({ParseJob.heartbeat_at: datetime.now(timezone.utc)}, synchronize_session=False)
+    db.commit()
+
+
+def save_page(db: Session, job: ParseJob, page_number: int, records: list[TenderRecord], error: str | None = None):
+    """
+    Пишет тендеры страницы и её статус одной транзакцией:
+    уже сохранённые страницы переживают сбой на следующих.
+    """
+    return retry_on_conflict(db, _save_page, job, page_number, records, error)
+
+
+def _save_page(db: Session, job: ParseJob, page_number: int, records: list[TenderRecord], error: str | None):
+    tenders_count, written = upsert_tenders(db, records, job.session_id, job.owner_username)
+
+    now = datetime.now(timezone.utc)
+    page = db.query(ParseJobPage).filter_by(job_id=job.id, page_number=page_number).first()
+    # Повтор упавшей страницы не увеличивает число обработанных
+    first_attempt = page is None or page.status == "pending"
+    if page:
+        page.status = "failed" if error else "done"
+        page.attempts = (page.attempts or 0) + 1
+        page.tenders_count = tenders_count
+        page.error = error
+        page.finished_at = now
+
+    if first_attempt:
+        job.pages_done = (job.pages_done or 0) + 1
+    job.tenders_count = (job.tenders_count or 0) + tenders_count
+    job.heartbeat_at = now
+    if job.parent_id:
+        # Прогресс и скорость поиска с разбиением видны у родителя
+        db.query(ParseJob).filter_by(id=job.parent_id).update({
+            ParseJob.pages_done: ParseJob.pages_done + (1 if first_attempt else 0),
+            ParseJob.tenders_count: ParseJob.tenders_count + tenders_count,
+        }, synchronize_session=False)
+    db.commit()
+    return written
+
+
+def pages_to_crawl(db: Session, job: ParseJob) -> list[int]:
+    """Ещё не обработанные страницы и упавшие, у которых остались попытки"""
+    pages = db.query(ParseJobPage.page_number).filter(
+        ParseJobPage.job_id == job.id,
+        or_(ParseJobPage.status == "pending",
+            and_(ParseJobPage.status == "failed", ParseJobPage.attempts < PARSE_PAGE_MAX_ATTEMPTS)),
+    ).order_by(ParseJobPage.page_number.asc()).all()
+    return [page_number for page_number, in pages]
+
+
+def skip_pending_pages(db: Session, job: ParseJob):
+    """Инкрементальный проход остановился раньше — оставшиеся страницы не нужны"""
+    db.query(ParseJobPage).filter_by(job_id=job.id, status="pending").update({"status": "skipped"})
+    db.commit()
+
+
+def cancel_parse_job(db: Session, job: ParseJob):
+    """Отмена: уже сохранённые страницы остаются в сессии, необработанные пропускаются"""
+    db.query(ParseJobPage).filter_by(job_id=job.id, status="pending").update({"status": "skipped"})
+    job.status = "cancelled"
+    job.finished_at = datetime.now(timezone.utc)
+    db.commit()
+    _finish_parent(db, job)
+
+
+def request_cancel(db: Session, job: ParseJob):
+    """
+    Задача из очереди отменяется сразу, выполняющаяся — воркером после
+    текущей страницы; у поиска с разбиением отменяются все части.
+    """
+    if job.status == "queued":
+        cancel_parse_job(db, job)
+        return
+    job.cancel_requested = True
+    db.commit()
+    if job.status != "split":
+        return
+    for child in job.children:
+        if child.status == "queued":
+            cancel_parse_job(db, child)
+        elif child.status == "running":
+            child.cancel_requested = True
+            db.commit()
+
+
+def finish_parse_job(db: Session, job: ParseJob, error: str | None = None):
+    job.status = "failed" if error else "done"
+    job.error = error
+    job.finished_at = datetime.now(timezone.utc)
+    db.commit()
+    _finish_parent(db, job)
+
+
+def _finish_parent(db: Session, job: ParseJob):
+    """
+    Последняя завершившаяся часть завершает родителя. Статус части уже
+    закоммичен до блокировки строки родителя, поэтому из двух частей,
+    закончивших одновременно, вторая увидит обе.
+    """
+    if not job.parent_id:
+        return
+    parent = db.query(ParseJob).filter_by(id=job.parent_id)\
+        .with_for_update().populate_existing().first()
+    statuses = [status for status, in db.query(ParseJob.status).filter_by(parent_id=job.parent_id)]
+    if parent is None or parent.status != "split" or any(status in ("queued", "running") for status in statuses):
+        db.commit()
+        return
+
+    if parent.cancel_requested:
+        parent.status = "cancelled"
+    elif all(status == "failed" for status in statuses):
+        parent.status = "failed"
+        parent.error = "Ни одну часть поиска не удалось загрузить"
+    else:
+        parent.status = "done"
+    parent.finished_at = datetime.now(timezone.utc)
+    db.commit()
+    print(f"[worker] Поиск с разбиением {parent.id} завершён ({parent.status}), сохранено {parent.tenders_count} тендеров")
@@ -0,0 +1,35 @@
+import re
+from datetime import date, datetime
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+
+_PRICE_NOISE = re.compile(r"[^0-9,.]")
+_PRICE_FORMAT = re.compile(r"^[0-9]+([.,][0-9]+)?$")
+PRICE_LIMIT = Decimal(10) ** 16  # price_value — NUMERIC(18, 2)
+
+
+def parse_date(value: str | None) -> date | None:
+    """Дата со страницы zakupki.gov.ru в формате dd.mm.yyyy"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip(), "%d.%m.%Y").date()
+    except ValueError:
+        return None
+
+
+def parse_price(value: str | None) -> Decimal | None:
+    """
+    Цена со страницы: "1 234 567,89 ₽" (пробелы — неразрывные) -> Decimal("1234567.89").
+    Копейки округляются до чётного; цена вне NUMERIC(18, 2) считается нераспознанной.
+    Миграции 0003 и 0010 заполняют price_value этой же функцией.
+    """
+    if not value:
+        return None
+    digits = _PRICE_NOISE.sub("", value)
+    if not _PRICE_FORMAT.match(digits):
+        return None
+    try:
+        price = Decimal(digits.replace(",", ".")).quantize(Decimal("0.01"), rounding=ROUND_HALF_EVEN)
+    except InvalidOperation:
+        return None
+    return price if price < PRICE_LIMIT else None
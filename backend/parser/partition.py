@@ -0,0 +1,142 @@
+"""
+Разбиение большого поиска на подзапросы (POST /parse/partitioned).
+
+zakupki.gov.ru не листает выдачу одного поиска глубже PARTITION_MAX_PAGES
+страниц, а длинная цепочка страниц упирается в одну задачу. Планировщик
+загружает первую страницу поиска и читает число результатов
+(.search-results__total). Если результаты не помещаются, диапазон делится
+пополам — сначала по дате (до одного дня), затем по цене — и половины
+проверяются так же, пока каждая часть не поместится.
+
+Части становятся дочерними задачами parse_jobs с общей сессией родителя и
+разбираются воркерами параллельно. Тендер, попавший в несколько частей,
+сохраняется один раз: upsert по реестровому номеру и уникальное членство
+в сессии. Первая страница каждой части уже загружена при проверке — она
+сохраняется сразу при постановке частей, а часть из одной страницы
+в очередь не попадает вовсе.
+"""
+import asyncio
+import math
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from models.parse import ParseFilters, PARTITION_DATE_FIELDS
+from parser.crawler import CrawlEngine, get_crawl_engine
+from parser.extractors import TenderExtractor, TenderRecord, get_extractor
+from parser.zakupki_parser import RECORDS_PER_PAGE, build_url, headers
+
+load_dotenv()
+
+PARTITION_MAX_PAGES = int(os.getenv("PARTITION_MAX_PAGES", "20"))  # глубже сайт выдачу не отдаёт
+PARTITION_MAX_PROBES = int(os.getenv("PARTITION_MAX_PROBES", "200"))  # защита от бесконечного деления
+PARTITION_PRICE_STEP = 1_000_000  # первая граница, если диапазон цен не ограничен сверху
+DATE_FORMAT = "%d.%m.%Y"
+
+
+class PartitionError(Exception):
+    pass
+
+
+@dataclass
+class Partition:
+    filters: ParseFilters
+    total: int
+    truncated: bool = False  # делить дальше некуда, часть результатов не будет загружена
+    records: list[TenderRecord] = field(default_factory=list)  # первая страница, загруженная при проверке
+
+    @property
+    def pages(self) -> int:
+        return min(PARTITION_MAX_PAGES, max(1, math.ceil(self.total / RECORDS_PER_PAGE)))
+
+
+def split_dates(filters: ParseFilters) -> tuple[ParseFilters, ParseFilters] | None:
+    for field_from, field_to in PARTITION_DATE_FIELDS:
+        start, end = getattr(filters, field_from), getattr(filters, field_to)
+        if not (start and end):
+            continue
+        start, end = datetime.strptime(start, DATE_FORMAT), datetime.strptime(end, DATE_FORMAT)
+        if start >= end:
+            continue
+        middle = start + timedelta(days=(end - start).days // 2)
+        return (
+            filters.model_copy(update={field_from: f"{start:{DATE_FORMAT}}", field_to: f"{middle:{DATE_FORMAT}}"}),
+            filters.model_copy(update={field_from: f"{middle + timedelta(days=1):{DATE_FORMAT}}", field_to: f"{end:{DATE_FORMAT}}"}),
+        )
+    return None
+
+
+def split_prices(filters: ParseFilters) -> tuple[ParseFilters, ParseFilters] | None:
+    """
+    Границы цен — целые рубли, а цены контрактов — с копейками, поэтому половины
+    делят общую границу: иначе контракт за 5 000 000,50 не попал бы ни в одну.
+    Тендеры ровно на границе придут в обеих частях и сохранятся один раз.
+    """
+    low, high = filters.priceFrom or 0, filters.priceTo
+    if high is None:
+        # Цены распределены с длинным хвостом — открытый сверху диапазон делим геометрически
+        middle = max(low * 2, PARTITION_PRICE_STEP)
+    elif high - low > 1:
+        middle = (low + high) // 2
+    else:
+        return None
+    return (
+        filters.model_copy(update={"priceFrom": low, "priceTo": middle}),
+        filters.model_copy(update={"priceFrom": middle, "priceTo": high}),
+    )
+
+
+def _extract_first_page(extractor: TenderExtractor, html: str) -> tuple[int | None, list[TenderRecord]]:
+    return extractor.extract_total(html), extractor.extract(html)
+
+
+async def probe(engine: CrawlEngine, extractor: TenderExtractor,
+                filters: ParseFilters) -> tuple[int, list[TenderRecord]]:
+    """Число результатов поиска и тендеры первой страницы"""
+    html = await engine.fetch_text(build_url(filters, 1), headers=headers)
+    total, records = await asyncio.to_thread(_extract_first_page, extractor, html)
+    if total is not None:
+        return total, records
+    # Без блока с числом результатов понятна только неполная страница
+    if len(records) < RECORDS_PER_PAGE:
+        return len(records), records
+    raise PartitionError("Не удалось определить число результатов поиска")
+
+
+async def plan_partitions(filters: ParseFilters) -> list[Partition]:
+    """Части поиска, каждая не больше PARTITION_MAX_PAGES страниц; пустые отбрасываются"""
+    engine = get_crawl_engine()
+    extractor = get_extractor()
+    limit = PARTITION_MAX_PAGES * RECORDS_PER_PAGE
+    probes = 0
+
+    async def plan(part: ParseFilters) -> list[Partition]:
+        nonlocal probes
+        probes += 1
+        if probes > PARTITION_MAX_PROBES:
+            raise PartitionError(f"Поиск не удалось разбить за {PARTITION_MAX_PROBES} запросов, сузьте фильтры")
+
+        total, records = await probe(engine, extractor, part)
+        if total == 0:
+            return []
+        if total <= limit:
+            return [Partition(part, total, records=records)]
+
+        halves = split_dates(part) or split_prices(part)
+        if halves is None:
+            print(f"[!] Часть поиска не делится дальше: {total} результатов, загрузим первые {limit}")
+            return [Partition(part, total, truncated=True, records=records)]
+
+        # Половины проверяются параллельно; ошибка одной отменяет остальные
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(plan(half)) for half in halves]
+        return [partition for task in tasks for partition in task.result()]
+
+    try:
+        return await plan(filters)
+    except ExceptionGroup as group:
+        # В задачу пишется понятная причина, а не «unhandled errors in a TaskGroup»
+        error = group
+        while isinstance(error, ExceptionGroup):
+            error = error.exceptions[0]
+        raise error
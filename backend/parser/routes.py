@@ -1,57 +1,129 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import Optional, List
-from parser.zakupki_parser import parse_zakupki
-from models.parse import ParseFilters
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Annotated, Literal, Optional, List
+from parser.jobs import enqueue_parse_job, enqueue_partitioned_job, request_cancel
+from parser.tender_query import resolve_session, can_view_session, fetch_tenders_page
+from parser.export import EXPORT_MEDIA_TYPES, stream_ndjson, stream_csv, write_xlsx
+from parser.session_cache import tenders_cache, session_etag, etag_matches, CACHE_CONTROL
+from models.parse import ParseFilters, LongCrawlFilters, PartitionFilters, TenderQuery
 from auth.roles import require_role
-from database.deps import get_db
+from auth.principal_cache import Principal
+from database.deps import get_db, get_async_db
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database.models import ParsedTender, User, ParseSession, UserSessionView, TenderAnalysis
-from llm.analysis import analyze_tender
+from database.models import ParsedTender, ParseSession, UserSessionView, TenderAnalysis, ParseJob, AnalysisBatch
+from llm.analysis_batches import create_batch, batch_failures
+from llm.analysis_runs import claim_analysis, start_analysis, wait_for_analysis, get_analysis, EMPTY_RESULT, ANALYSIS_WAIT_TIMEOUT
+from llm.analysis_stream import analysis_events, SSE_HEADERS
 import asyncio
+import orjson
+import os
+import tempfile
 
 router = APIRouter()
 
-@router.post("/parse")
-def parse_data(filters: ParseFilters, db: Session = Depends(get_db), user: User = Depends(require_role("admin", "owner"))):
-    parsed = parse_zakupki(filters)
-    session = ParseSession(owner_username=user.username)
-    db.add(session)
-    db.flush()
+@router.post("/parse", status_code=202)
+def parse_data(filters: ParseFilters, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    job = enqueue_parse_job(db, filters, user.username)
+    return {"msg": "Парсинг поставлен в очередь", "jobId": job.id, "status": job.status}
 
-    for tender in parsed:
-        tender.parsed_by = user.username
-        tender.session_id = session.id
-        db.add(tender)
 
-    db.commit()
+@router.post("/parse/long", status_code=202)
+def parse_long(filters: LongCrawlFilters, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    job = enqueue_parse_job(db, filters, user.username)
+    return {"msg": "Длинный парсинг поставлен в очередь", "jobId": job.id, "status": job.status, "pagesTotal": job.pages_total}
 
-    return {"msg": f"Сохранено {len(parsed)} тендеров"}
 
+@router.post("/parse/partitioned", status_code=202)
+def parse_partitioned(filters: PartitionFilters, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    job = enqueue_partitioned_job(db, filters, user.username)
+    return {"msg": "Поиск с разбиением поставлен в очередь", "jobId": job.id, "status": job.status}
 
-@router.get("/tenders")
-def get_saved_tenders(db: Session = Depends(get_db), user: User =Depends(require_role("user", "admin", "owner"))):
-    if user.role in ("admin", "owner"):
-        # Показываем только свою последнюю сессию
-        session = db.query(ParseSession).filter(ParseSession.owner_username == user.username)\
-            .order_by(ParseSession.created_at.desc()).first()
-    else:
-        view = db.query(UserSessionView).filter(UserSessionView.username == user.username).first()
-        if not view:
-            # первый вход — выдаём последнюю сессию от любого админа
-            latest = db.query(ParseSession).order_by(ParseSession.created_at.desc()).first()
-            if latest:
-                view = UserSessionView(username=user.username, session_id=latest.id)
-                db.add(view)
-                db.commit()
-        if not view:
-            return []
-        session = db.query(ParseSession).filter(ParseSession.id == view.session_id).first()
 
-    if not session:
-        return []
+@router.get("/parse/jobs")
+def get_parse_jobs(db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    # Части поиска с разбиением видны в задаче-родителе
+    jobs = db.query(ParseJob).filter(ParseJob.owner_username == user.username, ParseJob.parent_id.is_(None))\
+        .order_by(ParseJob.created_at.desc()).limit(20).all()
+    return [job.to_dict() for job in jobs]
+
+
+@router.get("/parse/jobs/{job_id}")
+def get_parse_job(job_id: int, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    job = db.query(ParseJob).filter_by(id=job_id).first()
+    if not job:
+        raise HTTPException(404, detail="Задача не найдена")
+    if job.owner_username != user.username and user.role != "owner":
+        raise HTTPException(403, detail="Недостаточно прав")
+    return job.to_dict(with_pages=True)
 
-    tenders = db.query(ParsedTender).filter(ParsedTender.session_id == session.id).order_by(ParsedTender.id.asc()).all()
-    return [t.to_dict() for t in tenders]
+
+@router.post("/parse/jobs/{job_id}/cancel")
+def cancel_job(job_id: int, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    job = db.query(ParseJob).filter_by(id=job_id).with_for_update().first()
+    if not job:
+        raise HTTPException(404, detail="Задача не найдена")
+    if job.owner_username != user.username and user.role != "owner":
+        raise HTTPException(403, detail="Недостаточно прав")
+    if job.status not in ("queued", "running", "split"):
+        raise HTTPException(400, detail="Задача уже завершена")
+
+    request_cancel(db, job)
+    return job.to_dict()
+
+
+@router.get("/tenders")
+def get_saved_tenders(params: Annotated[TenderQuery, Query()], request: Request, db: Session = Depends(get_db), user: Principal = Depends(require_role("user", "admin", "owner"))):
+    # Админ и владелец видят свою последнюю сессию, пользователь — назначенную ему
+    session = resolve_session(db, user)
+    if session is None:
+        return []
+    session_id, revision = session
+
+    query_key = params.model_dump_json()
+    etag = session_etag(session_id, revision, query_key)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    cache_key = (session_id, revision, query_key)
+    cached = tenders_cache.get(cache_key)
+    if cached is None:
+        tenders, next_cursor = fetch_tenders_page(db, session_id, params)
+        cached = (orjson.dumps([t.to_dict() for t in tenders]), next_cursor)
+        tenders_cache.put(cache_key, *cached)
+
+    body, next_cursor = cached
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/sessions/{session_id}/export")
+def export_session(session_id: int, format: Literal["ndjson", "csv", "xlsx"] = "ndjson", db: Session = Depends(get_db), user: Principal = Depends(require_role("user", "admin", "owner"))):
+    session = db.query(ParseSession).filter_by(id=session_id).first()
+    if not session:
+        raise HTTPException(404, detail="Сессия не найдена")
+    if not can_view_session(db, session, user):
+        raise HTTPException(403, detail="Недостаточно прав")
+
+    filename = f"session_{session_id}.{format}"
+    if format == "xlsx":
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            write_xlsx(session_id, path)
+        except Exception:
+            os.remove(path)
+            raise
+        return FileResponse(path, media_type=EXPORT_MEDIA_TYPES[format], filename=filename,
+                            background=BackgroundTask(os.remove, path))
+
+    stream = stream_ndjson if format == "ndjson" else stream_csv
+    return StreamingResponse(stream(session_id), media_type=EXPORT_MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 
 @router.post("/tenders/pull-latest")
@@ -70,25 +142,79 @@ def pull_latest(db: Session = Depends(get_db), user=Depends(require_role("user")
     db.commit()
     return {"msg": f"Получена последняя таблица от {latest.owner_username}"}
 
+def analysis_response(analysis: TenderAnalysis, cached: bool):
+    if analysis.status == "done":
+        return {"analysis": analysis.result, "cached": cached}
+    if analysis.status == "running":
+        return JSONResponse(status_code=202, content={"msg": "Анализ выполняется", **jsonable_encoder(analysis.to_dict())})
+    if analysis.error == EMPTY_RESULT:
+        return {"analysis": EMPTY_RESULT, "cached": False}
+    raise HTTPException(500, detail=f"Ошибка анализа: {analysis.error}")
+
+
 @router.post("/tenders/{tender_id}/analyze")
-async def analyze_tender_by_id(tender_id: int, db: Session = Depends(get_db), user=Depends(require_role("user", "admin", "owner"))):
-    tender = db.query(ParsedTender).filter_by(id=tender_id).first()
+async def analyze_tender_by_id(tender_id: int, wait: bool = True, db: AsyncSession = Depends(get_async_db), user=Depends(require_role("user", "admin", "owner"))):
+    """
+    Один запуск анализа на тендер: повторные запросы присоединяются к идущему.
+    Ответ ждёт результат не дольше ANALYSIS_WAIT_TIMEOUT, после — 202 со статусом running:
+    клиент опрашивает GET /tenders/{id}/analysis, пока status не станет done или failed.
+    """
+    tender = await db.get(ParsedTender, tender_id)
     if not tender:
         raise HTTPException(404, detail="Тендер не найден")
 
-    existing_analysis = db.query(TenderAnalysis).filter_by(tender_id=tender.id).first()
-    if existing_analysis:
-        return {"analysis": existing_analysis.result, "cached": True}
-    
-    try:
-        result = await analyze_tender(tender)
-    except Exception as e:
-        raise HTTPException(500, detail=f"Ошибка анализа: {str(e)}")
-    
-    if not result:
-        return {"analysis": "Не удалось получить ответ", "cached": False}
-    analysis = TenderAnalysis(tender_id=tender.id, result=result)
-    db.add(analysis)
-    db.commit()
+    started = await claim_analysis(db, tender.id)
+    if started:
+        start_analysis(tender)
+
+    analysis = await wait_for_analysis(tender.id, ANALYSIS_WAIT_TIMEOUT if wait else 0)
+    return analysis_response(analysis, cached=not started)
+
+
+@router.post("/tenders/{tender_id}/analyze/stream")
+async def stream_tender_analysis(tender_id: int, db: AsyncSession = Depends(get_async_db), user=Depends(require_role("user", "admin", "owner"))):
+    """
+    Тот же запуск анализа, но ответ — поток Server-Sent Events: этапы (PDF найден,
+    текст извлечён, OCR страницы n/N), затем текст LLM по мере генерации и итог (llm/analysis_stream.py).
+    """
+    tender = await db.get(ParsedTender, tender_id)
+    if not tender:
+        raise HTTPException(404, detail="Тендер не найден")
+
+    started = await claim_analysis(db, tender.id)
+    if started:
+        start_analysis(tender)
+
+    return StreamingResponse(analysis_events(tender.id, cached=not started), media_type="text/event-stream", headers=SSE_HEADERS)
+
 
-    return {"analysis": result, "cached": False}
+@router.get("/tenders/{tender_id}/analysis")
+async def get_tender_analysis(tender_id: int, user=Depends(require_role("user", "admin", "owner"))):
+    analysis = await get_analysis(tender_id)
+    if not analysis:
+        raise HTTPException(404, detail="Анализ не найден")
+    return analysis.to_dict()
+
+
+@router.post("/sessions/{session_id}/analyze", status_code=202)
+async def analyze_session(session_id: int, db: AsyncSession = Depends(get_async_db), user: Principal = Depends(require_role("admin", "owner"))):
+    """Анализ всех тендеров сессии без готового анализа; повторный запрос вернёт идущий пакет"""
+    session = await db.get(ParseSession, session_id)
+    if not session:
+        raise HTTPException(404, detail="Сессия не найдена")
+    if session.owner_username != user.username and user.role != "owner":
+        raise HTTPException(403, detail="Недостаточно прав")
+
+    batch, created = await create_batch(db, session_id, user.username)
+    msg = "Анализ сессии запущен" if created else "Анализ сессии уже выполняется"
+    return {"msg": msg, **batch.to_dict()}
+
+
+@router.get("/analysis-batches/{batch_id}")
+async def get_analysis_batch(batch_id: int, db: AsyncSession = Depends(get_async_db), user: Principal = Depends(require_role("admin", "owner"))):
+    batch = await db.get(AnalysisBatch, batch_id)
+    if not batch:
+        raise HTTPException(404, detail="Пакет анализа не найден")
+    if batch.owner_username != user.username and user.role != "owner":
+        raise HTTPException(403, detail="Недостаточно прав")
+    return batch.to_dict(failures=await batch_failures(db, batch))
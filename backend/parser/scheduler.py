@@ -0,0 +1,118 @@
+"""
+Регулярный парсинг по расписаниям (crawl_schedules).
+
+Планировщик работает внутри приложения: раз в SCHEDULER_POLL_INTERVAL он
+забирает наступившие расписания через SELECT ... FOR UPDATE SKIP LOCKED
+(поэтому несколько uvicorn-воркеров не запустят одно расписание дважды)
+и ставит задачу в ту же очередь parse_jobs, что и POST /parse.
+
+- к каждому запуску добавляется случайный сдвиг до jitter_seconds, чтобы
+  расписания не били по zakupki.gov.ru одновременно;
+- если прошлая задача расписания ещё в очереди или выполняется, запуск
+  пропускается;
+- после простоя пропущенные запуски не наверстываются по одному: расписание
+  запускается один раз, а следующий запуск считается от текущего момента.
+"""
+import asyncio
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from database.database import SessionLocal
+from database.models import CrawlSchedule, FilterProfile, ParseJob
+from croniter import croniter
+from models.parse import ParseFilters, UPDATE_DATE
+from parser.jobs import enqueue_parse_job
+
+load_dotenv()
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", "30"))
+SCHEDULER_BATCH = 20  # запусков за один проход
+
+_task: asyncio.Task | None = None
+
+
+def _jitter(schedule: CrawlSchedule) -> timedelta:
+    return timedelta(seconds=random.uniform(0, schedule.jitter_seconds or 0))
+
+
+def next_run_after(schedule: CrawlSchedule, after: datetime) -> datetime:
+    if schedule.cron:
+        return croniter(schedule.cron, after).get_next(datetime) + _jitter(schedule)
+    return after + timedelta(minutes=schedule.interval_minutes) + _jitter(schedule)
+
+
+def first_run_at(schedule: CrawlSchedule, now: datetime) -> datetime:
+    """Расписание с интервалом впервые запускается сразу (со сдвигом), cron — в ближайший слот"""
+    if schedule.cron:
+        return next_run_after(schedule, now)
+    return now + _jitter(schedule)
+
+
+def run_due_schedule(db: Session) -> bool:
+    """Обрабатывает одно наступившее расписание; False — таких нет"""
+    now = datetime.now(timezone.utc)
+    schedule = db.query(CrawlSchedule)\
+        .filter(CrawlSchedule.enabled.is_(True), CrawlSchedule.next_run_at <= now)\
+        .order_by(CrawlSchedule.next_run_at.asc())\
+        .with_for_update(skip_locked=True).first()
+    if not schedule:
+        return False
+
+    schedule.next_run_at = next_run_after(schedule, now)
+    last_job = db.query(ParseJob).filter_by(id=schedule.last_job_id).first() if schedule.last_job_id else None
+    if last_job and last_job.status in ("queued", "running"):
+        schedule.skipped_runs = (schedule.skipped_runs or 0) + 1
+        db.commit()
+        print(f"[scheduler] Расписание {schedule.id}: задача {last_job.id} ещё не завершена, запуск пропущен")
+        return True
+
+    profile = db.query(FilterProfile).filter_by(id=schedule.profile_id).first()
+    try:
+        filters = ParseFilters(**profile.filters)
+    except ValueError as e:
+        db.commit()
+        print(f"[!] Расписание {schedule.id}: фильтры профиля {schedule.profile_id} невалидны: {e}")
+        return True
+
+    # Фильтры профиля могли поменять после создания расписания
+    incremental = schedule.incremental and filters.sortBy == UPDATE_DATE and not filters.sortAscending
+    schedule.last_run_at = now
+    job = enqueue_parse_job(db, filters, schedule.owner_username, profile_id=profile.id, incremental=incremental)
+    schedule.last_job_id = job.id
+    db.commit()
+    print(f"[scheduler] Расписание {schedule.id}: поставлена задача {job.id}, следующий запуск {schedule.next_run_at:%d.%m.%Y %H:%M}")
+    return True
+
+
+def run_due_schedules() -> int:
+    started = 0
+    with SessionLocal() as db:
+        while started < SCHEDULER_BATCH and run_due_schedule(db):
+            started += 1
+    return started
+
+
+async def _loop():
+    while True:
+        try:
+            await asyncio.to_thread(run_due_schedules)
+        except Exception as e:
+            print(f"[!] Ошибка планировщика: {e}")
+        await asyncio.sleep(SCHEDULER_POLL_INTERVAL)
+
+
+def start_scheduler():
+    global _task
+    if SCHEDULER_ENABLED and _task is None:
+        _task = asyncio.create_task(_loop())
+
+
+async def stop_scheduler():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,79 @@
+"""
+HTTP-кеширование выдачи сохранённых тендеров.
+
+Выдача /tenders определяется сессией, её ревизией и параметрами запроса.
+Ревизия растёт при каждом изменении состава сессии или содержимого её
+тендеров (см. parser.ingest.upsert_tenders), поэтому:
+- ETag строится из (сессия, ревизия, параметры) — на повторный запрос
+  с If-None-Match отвечаем 304, не обращаясь к parsed_tenders;
+- уже сериализованные ответы хранятся в LRU процесса, ограниченном по байтам.
+Старые ревизии из кеша не удаляются явно — они вытесняются как давно не использованные.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TENDERS_CACHE_MAX_BYTES = int(os.getenv("TENDERS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+CACHE_CONTROL = "private, no-cache"  # браузер хранит ответ, но каждый раз сверяет ETag
+
+
+def session_etag(session_id: int, revision: int, query_key: str) -> str:
+    query_hash = hashlib.sha1(query_key.encode("utf-8")).hexdigest()[:12]
+    return f'W/"{session_id}.{revision}.{query_hash}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Сравнение слабое: префикс W/ не учитывается
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+class PayloadCache:
+    """LRU сериализованных ответов с ограничением на суммарный размер"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[bytes, str | None]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()  # синхронные роуты выполняются в пуле потоков
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> tuple[bytes, str | None] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, body: bytes, next_cursor: str | None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = (body, next_cursor)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+tenders_cache = PayloadCache(TENDERS_CACHE_MAX_BYTES)
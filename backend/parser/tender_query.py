@@ -0,0 +1,133 @@
+import base64
+import json
+from datetime import date
+from decimal import Decimal
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+from database.models import ParsedTender, ParseSession, ParseSessionTender, UserSessionView
+from models.parse import TenderQuery, TENDERS_PAGE_LIMIT, UPDATE_DATE, PUBLISH_DATE, PRICE
+
+SORT_COLUMNS = {
+    UPDATE_DATE: ParsedTender.update_date_value,
+    PUBLISH_DATE: ParsedTender.publish_date_value,
+    PRICE: ParsedTender.price_value,
+}
+
+
+def resolve_session(db: Session, user) -> tuple[int, int] | None:
+    """
+    Сессия, которую видит пользователь, и её ревизия — одним запросом:
+    админ и владелец — своя последняя, пользователь — назначенная ему,
+    а при первом входе — последняя сессия любого админа (назначение сохраняется).
+    """
+    if user.role in ("admin", "owner"):
+        row = db.execute(text(
+            "SELECT id, revision FROM parse_sessions WHERE owner_username = :username "
+            "ORDER BY created_at DESC LIMIT 1"
+        ), {"username": user.username}).first()
+        return tuple(row) if row else None
+
+    row = db.execute(text(
+        "WITH assigned AS (SELECT session_id FROM user_session_views WHERE username = :username) "
+        "SELECT id, revision, EXISTS (SELECT 1 FROM assigned) FROM parse_sessions WHERE id = COALESCE("
+        "(SELECT session_id FROM assigned), "
+        "(SELECT id FROM parse_sessions ORDER BY created_at DESC LIMIT 1))"
+    ), {"username": user.username}).first()
+    if not row:
+        return None
+    session_id, revision, assigned = row
+    if not assigned:
+        db.execute(text(
+            "INSERT INTO user_session_views (username, session_id, assigned_at) "
+            "VALUES (:username, :session_id, now()) ON CONFLICT (username) DO NOTHING"
+        ), {"username": user.username, "session_id": session_id})
+        db.commit()
+    return session_id, revision
+
+
+def can_view_session(db: Session, session: ParseSession, user) -> bool:
+    """Владелец видит все сессии, админ — свои, пользователь — назначенную ему"""
+    if user.role == "owner":
+        return True
+    if user.role == "admin":
+        return session.owner_username == user.username
+    view = db.query(UserSessionView).filter_by(username=user.username).first()
+    return view is not None and view.session_id == session.id
+
+
+def encode_cursor(sort_by: int | None, value, membership_id: int) -> str:
+    if isinstance(value, (date, Decimal)):
+        value = str(value)
+    payload = json.dumps([sort_by, value, membership_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: int | None):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort_by, value, membership_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort_by != sort_by:
+            raise ValueError("cursor from another sort order")
+        if value is not None:
+            value = Decimal(value) if sort_by == PRICE else date.fromisoformat(value)
+        return value, int(membership_id)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise HTTPException(400, detail="Неверный курсор")
+
+
+def apply_filters(query, params: TenderQuery):
+    """Фильтры по цене и датам выполняются в БД по типизированным колонкам"""
+    if params.priceFrom:
+        query = query.filter(ParsedTender.price_value >= params.priceFrom)
+    if params.priceTo:
+        query = query.filter(ParsedTender.price_value <= params.priceTo)
+    for name, (start, end) in params.date_ranges().items():
+        column = getattr(ParsedTender, name)
+        if start:
+            query = query.filter(column >= start)
+        if end:
+            query = query.filter(column <= end)
+    return query
+
+
+def fetch_tenders_page(db: Session, session_id: int, params: TenderQuery) -> tuple[list[ParsedTender], str | None]:
+    """
+    Страница тендеров сессии с keyset-пагинацией по (значение сортировки, parse_session_tenders.id).
+    Стоимость запроса не зависит от того, насколько далеко пролистан список.
+    Без limit и cursor возвращается весь список — так его читает фронтенд.
+    """
+    column = SORT_COLUMNS.get(params.sortBy)
+    query = db.query(ParsedTender, ParseSessionTender.id, column if column is not None else ParseSessionTender.id)\
+        .join(ParseSessionTender, ParseSessionTender.tender_id == ParsedTender.id)\
+        .filter(ParseSessionTender.session_id == session_id)
+    query = apply_filters(query, params)
+
+    if params.cursor:
+        value, last_id = decode_cursor(params.cursor, params.sortBy)
+        after_id = ParseSessionTender.id > last_id
+        if column is None:
+            query = query.filter(after_id)
+        elif value is None:
+            # NULL-значения идут в конце, дальше только они
+            query = query.filter(column.is_(None), after_id)
+        else:
+            beyond = column > value if params.sortAscending else column < value
+            query = query.filter(or_(beyond, and_(column == value, after_id), column.is_(None)))
+
+    if column is not None:
+        query = query.order_by(column.asc().nulls_last() if params.sortAscending else column.desc().nulls_last())
+    # RELEVANCE и без сортировки — порядок, в котором тендеры пришли с сайта
+    query = query.order_by(ParseSessionTender.id.asc())
+
+    if params.limit is None and params.cursor is None:
+        return [tender for tender, _, _ in query.all()], None
+
+    limit = params.limit or TENDERS_PAGE_LIMIT
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        _, membership_id, value = rows[-1]
+        next_cursor = encode_cursor(params.sortBy, value if column is not None else None, membership_id)
+    return [tender for tender, _, _ in rows], next_cursor
@@ -0,0 +1,433 @@
+"""
+Ограничение нагрузки на внешние сервисы, общее для всех процессов.
+
+Для каждого сервиса (zakupki, ocr, llm) действуют:
+- корзина токенов: не больше rate запросов в секунду с всплеском до burst;
+- предел одновременных запросов (concurrency) — через аренды с истечением,
+  поэтому слот процесса, умершего посреди запроса, освобождается сам;
+- адаптация: 429/5xx и сетевые ошибки вдвое снижают скорость, успешные
+  ответы постепенно возвращают её к настроенной;
+- автомат защиты: после breaker_threshold ошибок подряд запросы
+  приостанавливаются на breaker_cooldown секунд (или на Retry-After),
+  потом пропускается по одному запросу, пока сервис не ответит успешно.
+
+Состояние хранится в Postgres (upstream_limits, upstream_leases) и делится
+всеми uvicorn-воркерами и воркерами парсинга; часы — now() базы. Если база
+недоступна или THROTTLE_BACKEND=local, то же самое считается в памяти процесса.
+
+Ожидающие не опрашивают строку корзины под блокировкой: без токена спят
+ровно до следующего (по скорости пополнения), без свободного слота — до
+NOTIFY об освобождении (LISTEN на отдельном соединении процесса), а блокировка
+берётся, только если по чтению без блокировки слот и токен есть. Аренда
+продлевается, пока запрос идёт, поэтому долгий поток LLM не теряет слот.
+
+Использование:
+    async with throttle("ocr") as permit:
+        async with session.post(...) as response:
+            permit.record(response.status, response.headers.get("Retry-After"))
+"""
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import aiohttp
+import asyncpg
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from database.database import ASYNC_DATABASE_URL, SessionLocal
+from database.models import UpstreamLease, UpstreamLimit
+
+load_dotenv()
+
+THROTTLE_BACKEND = os.getenv("THROTTLE_BACKEND", "postgres")  # postgres / local
+THROTTLE_MAX_WAIT = float(os.getenv("THROTTLE_MAX_WAIT", "300"))  # дольше ждать слот не имеет смысла
+# Аренда продлевается каждые TTL / 3, пока запрос идёт; TTL — через сколько освобождается слот упавшего процесса
+THROTTLE_LEASE_TTL = float(os.getenv("THROTTLE_LEASE_TTL", "120"))
+THROTTLE_SLOT_RECHECK = 2.0  # слот перепроверяется и без NOTIFY: уведомление могло потеряться
+THROTTLE_JITTER = 0.05
+THROTTLE_NOTIFY_CHANNEL = "upstream_release"
+LISTEN_RETRY_AFTER = 60.0  # пауза перед новой попыткой LISTEN после ошибки
+
+SLOT_BUSY = math.inf  # все слоты заняты: ждать освобождения, а не времени
+
+MIN_RATE_SHARE = 0.05  # ниже этой доли настроенной скорости не опускаемся
+RECOVERY_SHARE = 0.1  # на столько от настроенной скорости растёт скорость после успешного ответа
+
+
+@dataclass(frozen=True)
+class UpstreamConfig:
+    rate: float  # запросов в секунду
+    burst: int
+    concurrency: int
+    breaker_threshold: int = 5
+    breaker_cooldown: float = 30.0
+
+
+def _config(prefix: str, rate: str, burst: str, concurrency: str) -> UpstreamConfig:
+    return UpstreamConfig(
+        rate=float(os.getenv(f"{prefix}_RATE", rate)),
+        burst=int(os.getenv(f"{prefix}_BURST", burst)),
+        concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+        breaker_threshold=int(os.getenv(f"{prefix}_BREAKER_THRESHOLD", "5")),
+        breaker_cooldown=float(os.getenv(f"{prefix}_BREAKER_COOLDOWN", "30")),
+    )
+
+
+UPSTREAMS = {
+    "zakupki": _config("ZAKUPKI", rate="1.5", burst="3", concurrency="3"),
+    "ocr": _config("OCR", rate="10", burst="10", concurrency="5"),
+    "llm": _config("LLM", rate="5", burst="5", concurrency="4"),
+}
+
+
+class UpstreamUnavailable(Exception):
+    """Слот не освободился за THROTTLE_MAX_WAIT: сервис перегружен или автомат защиты разомкнут"""
+
+
+@dataclass
+class UpstreamState:
+    tokens: float
+    rate: float
+    refilled_at: float  # секунды эпохи
+    failures: int = 0
+    open_until: float | None = None
+
+    def try_acquire(self, config: UpstreamConfig, in_flight: int, now: float) -> float:
+        """Забирает токен; 0 — можно идти, иначе сколько секунд подождать"""
+        if self.open_until is not None and now < self.open_until:
+            return self.open_until - now
+        # Полуоткрытый автомат: после паузы — по одному запросу до первого успеха
+        limit = 1 if self.failures >= config.breaker_threshold else config.concurrency
+        if in_flight >= limit:
+            return SLOT_BUSY
+        self.tokens = min(config.burst, self.tokens + max(0.0, now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        return 0.0
+
+    def report(self, config: UpstreamConfig, failed: bool, retry_after: float | None, now: float) -> bool:
+        """Учитывает исход запроса; True — автомат защиты только что разомкнулся"""
+        if not failed:
+            self.failures = 0
+            self.rate = min(config.rate, self.rate + config.rate * RECOVERY_SHARE)
+            return False
+        self.failures += 1
+        self.rate = max(config.rate * MIN_RATE_SHARE, self.rate / 2)
+        opened = False
+        if self.failures >= config.breaker_threshold:
+            self.open_until = now + config.breaker_cooldown
+            opened = True
+        if retry_after:
+            self.open_until = max(self.open_until or 0.0, now + retry_after)
+        return opened
+
+    def is_steady(self, config: UpstreamConfig) -> bool:
+        """Успешный ответ ничего не поменяет — запись в базу не нужна"""
+        return self.failures == 0 and self.rate >= config.rate
+
+
+class LocalBackend:
+    """Состояние в памяти процесса — при THROTTLE_BACKEND=local и если база недоступна"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: dict[str, UpstreamState] = {}
+        self._in_flight: dict[str, int] = {}
+
+    def _state(self, name: str, config: UpstreamConfig) -> UpstreamState:
+        if name not in self._states:
+            self._states[name] = UpstreamState(tokens=config.burst, rate=config.rate, refilled_at=time.time())
+        return self._states[name]
+
+    def acquire(self, name: str, config: UpstreamConfig) -> tuple[int | None, float]:
+        with self._lock:
+            wait = self._state(name, config).try_acquire(config, self._in_flight.get(name, 0), time.time())
+            if wait:
+                return None, wait
+            self._in_flight[name] = self._in_flight.get(name, 0) + 1
+            return 0, 0.0
+
+    def release(self, name: str, config: UpstreamConfig, lease_id: int, failed: bool, retry_after: float | None) -> bool:
+        with self._lock:
+            self._in_flight[name] = max(0, self._in_flight.get(name, 0) - 1)
+            return self._state(name, config).report(config, failed, retry_after, time.time())
+
+    def renew(self, lease_id: int):
+        pass  # слоты в памяти не истекают
+
+
+class PostgresBackend:
+    """Состояние в upstream_limits под блокировкой строки; слоты — строки upstream_leases"""
+
+    def acquire(self, name: str, config: UpstreamConfig) -> tuple[int | None, float]:
+        with SessionLocal() as db, db.begin():
+            # Сначала без блокировки: ожидающие не выстраиваются в очередь на строку корзины
+            row = db.execute(select(UpstreamLimit, func.now()).where(UpstreamLimit.name == name)).first()
+            if row is not None:
+                limit, now = row
+                in_flight = db.execute(select(func.count(UpstreamLease.id)).where(
+                    UpstreamLease.name == name, UpstreamLease.expires_at >= now)).scalar()
+                wait = _state_from_row(limit).try_acquire(config, in_flight, now.timestamp())
+                if wait:
+                    return None, wait
+
+            db.execute(insert(UpstreamLimit).values(
+                name=name, tokens=config.burst, rate=config.rate, refilled_at=func.now(), failures=0,
+            ).on_conflict_do_nothing())
+            row, now = db.execute(
+                select(UpstreamLimit, func.now()).where(UpstreamLimit.name == name)
+                .with_for_update().execution_options(populate_existing=True)
+            ).one()
+            db.execute(delete(UpstreamLease).where(UpstreamLease.name == name, UpstreamLease.expires_at < now))
+            in_flight = db.execute(select(func.count(UpstreamLease.id)).where(UpstreamLease.name == name)).scalar()
+
+            state = _state_from_row(row)
+            wait = state.try_acquire(config, in_flight, now.timestamp())
+            if wait:
+                return None, wait
+            row.tokens, row.refilled_at = state.tokens, now
+            lease = UpstreamLease(name=name, expires_at=now + timedelta(seconds=THROTTLE_LEASE_TTL))
+            db.add(lease)
+            db.flush()
+            return lease.id, 0.0
+
+    def release(self, name: str, config: UpstreamConfig, lease_id: int, failed: bool, retry_after: float | None) -> bool:
+        with SessionLocal() as db, db.begin():
+            db.execute(delete(UpstreamLease).where(UpstreamLease.id == lease_id))
+            # Уходит при коммите и будит ждущих слот во всех процессах
+            db.execute(select(func.pg_notify(THROTTLE_NOTIFY_CHANNEL, name)))
+            if not failed:
+                row = db.get(UpstreamLimit, name)
+                if row is None or _state_from_row(row).is_steady(config):
+                    return False
+            row, now = db.execute(
+                select(UpstreamLimit, func.now()).where(UpstreamLimit.name == name)
+                .with_for_update().execution_options(populate_existing=True)
+            ).one()
+            state = _state_from_row(row)
+            opened = state.report(config, failed, retry_after, now.timestamp())
+            row.rate, row.failures = state.rate, state.failures
+            row.open_until = datetime.fromtimestamp(state.open_until, timezone.utc) if state.open_until else None
+            return opened
+
+    def renew(self, lease_id: int):
+        with SessionLocal() as db, db.begin():
+            db.execute(update(UpstreamLease).where(UpstreamLease.id == lease_id)
+                       .values(expires_at=func.now() + timedelta(seconds=THROTTLE_LEASE_TTL)))
+
+
+def _state_from_row(row: UpstreamLimit) -> UpstreamState:
+    return UpstreamState(
+        tokens=row.tokens,
+        rate=row.rate,
+        refilled_at=row.refilled_at.timestamp(),
+        failures=row.failures,
+        open_until=row.open_until.timestamp() if row.open_until else None,
+    )
+
+
+class ReleaseListener:
+    """
+    LISTEN upstream_release на отдельном соединении asyncpg: ждущие слот в этом
+    процессе просыпаются, когда слот освобождается в любом процессе.
+    Без соединения ожидание просто ограничено THROTTLE_SLOT_RECHECK.
+    """
+
+    def __init__(self):
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._events: dict[str, asyncio.Event] = {}
+        self._conn = None
+        self._lock: asyncio.Lock | None = None
+        self._failed_at: float | None = None
+
+    def _reset(self, loop: asyncio.AbstractEventLoop):
+        # Новый цикл событий (asyncio.run в скрипте) — старые события и соединение ему не годятся
+        self._loop, self._events, self._conn = loop, {}, None
+        self._lock, self._failed_at = asyncio.Lock(), None
+
+    async def _listen(self):
+        async with self._lock:
+            if self._conn is not None or _postgres is None:
+                return
+            if self._failed_at is not None and self._loop.time() - self._failed_at < LISTEN_RETRY_AFTER:
+                return
+            dsn = make_url(ASYNC_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(THROTTLE_NOTIFY_CHANNEL, lambda _conn, _pid, _channel, name: self.wake(name))
+                conn.add_termination_listener(lambda _conn: setattr(self, "_conn", None))
+            except (OSError, asyncpg.PostgresError) as e:
+                self._failed_at = self._loop.time()
+                print(f"[!] Ограничители: LISTEN недоступен ({e.__class__.__name__}), слоты перепроверяются "
+                      f"раз в {THROTTLE_SLOT_RECHECK:.0f} сек.")
+                return
+            self._conn = conn
+
+    async def wait(self, name: str, timeout: float):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._reset(loop)
+        await self._listen()
+        event = self._events.setdefault(name, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def wake(self, name: str):
+        event = self._events.pop(name, None)
+        if event is not None:
+            event.set()
+
+    def wake_threadsafe(self, name: str):
+        """Слот освобождён в этом процессе — будим без круга через базу (и для LocalBackend)"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.wake, name)
+
+    async def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            await conn.close()
+
+
+_local = LocalBackend()
+_postgres = PostgresBackend() if THROTTLE_BACKEND == "postgres" else None
+_listener = ReleaseListener()
+_database_down = False  # сообщение об отказе базы печатается один раз на сбой
+
+
+def _database_failed(name: str, action: str, e: SQLAlchemyError):
+    global _database_down
+    if not _database_down:
+        _database_down = True
+        print(f"[!] Ограничитель {name}: база недоступна ({e.__class__.__name__}), {action}")
+
+
+def _database_ok():
+    global _database_down
+    if _database_down:
+        _database_down = False
+        print("[✅] Ограничители: база снова доступна")
+
+
+async def close_throttle():
+    await _listener.close()
+
+
+class Permit:
+    """Разрешение на один запрос; вызывающий сообщает ответ сервиса через record"""
+
+    def __init__(self, backend, lease_id: int):
+        self.backend = backend
+        self.lease_id = lease_id
+        self.failed = False
+        self.retry_after: float | None = None
+
+    def record(self, status: int, retry_after: str | None = None):
+        self.failed = status == 429 or status >= 500
+        if self.failed and retry_after and retry_after.isdigit():
+            self.retry_after = float(retry_after)
+
+
+def _acquire(name: str, config: UpstreamConfig) -> tuple[Permit | None, float]:
+    backend = _postgres or _local
+    try:
+        lease_id, wait = backend.acquire(name, config)
+        if backend is _postgres:
+            _database_ok()
+    except SQLAlchemyError as e:
+        _database_failed(name, "считаем в памяти процесса", e)
+        backend = _local
+        lease_id, wait = backend.acquire(name, config)
+    return (Permit(backend, lease_id) if lease_id is not None else None), wait
+
+
+def _renew(name: str, permit: Permit):
+    try:
+        permit.backend.renew(permit.lease_id)
+    except SQLAlchemyError as e:
+        _database_failed(name, "аренда слота не продлена", e)
+
+
+async def _keep_lease(name: str, permit: Permit):
+    while True:
+        await asyncio.sleep(THROTTLE_LEASE_TTL / 3)
+        await asyncio.to_thread(_renew, name, permit)
+
+
+def _release(name: str, config: UpstreamConfig, permit: Permit):
+    try:
+        opened = permit.backend.release(name, config, permit.lease_id, permit.failed, permit.retry_after)
+    except SQLAlchemyError as e:
+        _database_failed(name, "слот истечёт сам", e)
+        return
+    finally:
+        _listener.wake_threadsafe(name)
+    if opened:
+        print(f"[!] {name}: {config.breaker_threshold} ошибок подряд, запросы приостановлены "
+              f"на {config.breaker_cooldown:.0f} сек.")
+
+
+def _release_abandoned(name: str, config: UpstreamConfig, future: asyncio.Future):
+    """Запрос слота отменили, пока поток ходил в базу: полученный всё же слот сразу освобождаем"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    permit, _ = future.result()
+    if permit is not None:
+        future.get_loop().run_in_executor(None, _release, name, config, permit)
+
+
+async def _acquire_shielded(name: str, config: UpstreamConfig) -> tuple[Permit | None, float]:
+    # Отмена не прерывает поток: без shield аренда, вставленная после отмены, держала бы слот до истечения
+    future = asyncio.ensure_future(asyncio.to_thread(_acquire, name, config))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(lambda done: _release_abandoned(name, config, done))
+        raise
+
+
+@asynccontextmanager
+async def throttle(name: str):
+    """Ждёт токен и свободный слот сервиса name; после запроса слот освобождается"""
+    config = UPSTREAMS[name]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + THROTTLE_MAX_WAIT
+    while True:
+        permit, wait = await _acquire_shielded(name, config)
+        if permit is not None:
+            break
+        if wait == SLOT_BUSY:
+            if loop.time() > deadline:
+                raise UpstreamUnavailable(f"{name}: все слоты заняты дольше {THROTTLE_MAX_WAIT:.0f} сек.")
+            await _listener.wait(name, THROTTLE_SLOT_RECHECK + random.uniform(0, THROTTLE_JITTER))
+            continue
+        if loop.time() + wait > deadline:
+            raise UpstreamUnavailable(f"{name}: сервис недоступен, запросы приостановлены")
+        # Ровно до следующего токена (или конца паузы автомата защиты)
+        await asyncio.sleep(wait + random.uniform(0, THROTTLE_JITTER))
+
+    keeper = asyncio.create_task(_keep_lease(name, permit)) if permit.backend is _postgres else None
+    try:
+        yield permit
+    except aiohttp.ClientResponseError:
+        raise  # статус ответа уже учтён через record
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        permit.failed = True  # сервис не ответил — тоже повод сбавить темп
+        raise
+    finally:
+        if keeper is not None:
+            keeper.cancel()
+        # Повторная отмена во время освобождения не оставляет слот занятым
+        await asyncio.shield(asyncio.to_thread(_release, name, config, permit))
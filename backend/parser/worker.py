@@ -0,0 +1,251 @@
+"""
+Воркер очереди парсинга.
+
+Запуск: python -m parser.worker [--processes N]
+Можно поднимать несколько процессов и на нескольких узлах —
+задачи разбираются из таблицы parse_jobs через SELECT ... FOR UPDATE SKIP LOCKED.
+
+Каждая страница сохраняется отдельно, поэтому после перезапуска или падения
+воркера задача продолжается с незавершённых страниц. Упавшие страницы
+повторяются отдельными проходами (до PARSE_PAGE_MAX_ATTEMPTS попыток),
+отмена (POST /parse/jobs/{id}/cancel) проверяется после каждой страницы.
+Задача поиска с разбиением только планирует части (parser/partition.py) и
+ставит их дочерними задачами в ту же очередь.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+from contextlib import aclosing
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+from database.database import SessionLocal
+from database.migrations import init_db
+from database.models import ParseJob, FilterProfile
+from models.parse import LongCrawlFilters, PartitionFilters
+from parser.jobs import (
+    claim_parse_job, start_parse_session, save_page, pages_to_crawl, skip_pending_pages,
+    enqueue_partitions, cancel_parse_job, finish_parse_job, touch_parse_job, PARSE_JOB_STALE_AFTER,
+)
+from parser.partition import plan_partitions
+from parser.incremental import WatermarkTracker
+from parser.zakupki_parser import parse_zakupki
+from parser.crawler import close_crawl_engine
+from parser.throttle import close_throttle
+
+load_dotenv()
+
+POLL_INTERVAL = float(os.getenv("PARSE_WORKER_POLL_INTERVAL", "2"))
+WORKER_PROCESSES = int(os.getenv("PARSE_WORKER_PROCESSES", "1"))
+RETRY_DELAY = float(os.getenv("PARSE_RETRY_DELAY", "10"))  # пауза перед повтором упавших страниц
+PROGRESS_EVERY = 10  # страниц между сообщениями о скорости
+# Отметка идёт и между страницами: планирование или ожидание ограничителя бывают долгими
+HEARTBEAT_INTERVAL = PARSE_JOB_STALE_AFTER / 4
+
+_stopping = False
+
+
+def _request_stop(signum, frame):
+    global _stopping
+    _stopping = True
+    print(f"[worker {os.getpid()}] Получен сигнал {signum}, завершаем после текущей задачи")
+
+
+def _touch(job_id: int):
+    with SessionLocal() as db:
+        touch_parse_job(db, job_id)
+
+
+async def heartbeat(job_id: int):
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            await asyncio.to_thread(_touch, job_id)
+        except Exception as e:
+            print(f"[!] Задача {job_id}: не удалось обновить отметку воркера: {e}")
+
+
+async def plan_job(db, job: ParseJob):
+    """Поиск с разбиением: воркер только планирует части, их загружают дочерние задачи"""
+    worker_id = job.worker_id
+    try:
+        start_parse_session(db, job)
+        partitions = await plan_partitions(PartitionFilters(**job.filters))
+    except Exception as e:
+        db.rollback()
+        print(f"[!] Задача {job.id}: не удалось разбить поиск: {e}")
+        finish_parse_job(db, job, error=str(e))
+        return
+
+    db.refresh(job)
+    if job.cancel_requested:
+        cancel_parse_job(db, job)
+        print(f"[worker] Задача {job.id} отменена до запуска частей")
+        return
+    if not enqueue_partitions(db, job, partitions, worker_id):
+        print(f"[!] Задача {job.id} перехвачена другим воркером, части не ставим")
+        return
+    truncated = sum(1 for partition in partitions if partition.truncated)
+    print(f"[worker] Задача {job.id}: {sum(p.total for p in partitions)} результатов разбиты на {len(partitions)} частей, "
+          f"{job.pages_total} стр." + (f", не поместились целиком: {truncated}" if truncated else ""))
+
+
+async def run_job(job_id: int):
+    beat = asyncio.create_task(heartbeat(job_id))
+    try:
+        await _run_job(job_id)
+    finally:
+        beat.cancel()
+        await asyncio.gather(beat, return_exceptions=True)
+
+
+async def _run_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.query(ParseJob).filter_by(id=job_id).first()
+        if job.partitioned:
+            await plan_job(db, job)
+            return
+
+        # Обычные задачи проверены по ParseFilters при постановке, длинные — по LongCrawlFilters
+        filters = LongCrawlFilters(**job.filters)
+        profile = db.query(FilterProfile).filter_by(id=job.profile_id).first() if job.profile_id else None
+        tracker = WatermarkTracker(profile) if job.incremental and profile else None
+
+        cancelled = bool(job.cancel_requested)
+        reported = job.pages_done
+        try:
+            start_parse_session(db, job)
+            pages = [] if cancelled else pages_to_crawl(db, job)
+            if len(pages) < job.pages_total:
+                print(f"[worker] Задача {job.id}: продолжаем, осталось страниц {len(pages)} из {job.pages_total}")
+            while pages:
+                async with aclosing(parse_zakupki(filters, sequential=tracker is not None, pages=pages)) as results:
+                    async for page_number, records, error in results:
+                        written = save_page(db, job, page_number, records, error)
+                        if error:
+                            print(f"[!] Задача {job.id}, стр. {page_number}: {error}")
+                        else:
+                            print(f"[worker] Задача {job.id}, стр. {page_number}: {len(records)} тендеров, новых или изменённых {written}")
+                        reported = report_progress(job, reported)
+                        # После commit атрибуты перечитываются — видим отмену из API
+                        if job.cancel_requested:
+                            cancelled = True
+                            break
+                        if not tracker:
+                            continue
+                        if error:
+                            raise RuntimeError(f"Инкрементальный проход прерван на стр. {page_number}: {error}")
+                        seen = tracker.page_is_seen(records)
+                        tracker.observe(records)
+                        if seen:
+                            print(f"[worker] Задача {job.id}: стр. {page_number} не содержит новых тендеров, останавливаемся")
+                            break
+
+                # Инкрементальный проход повторять нечего: ошибка страницы его прерывает
+                pages = [] if cancelled or tracker else pages_to_crawl(db, job)
+                if pages:
+                    print(f"[worker] Задача {job.id}: повторяем упавшие страницы {pages} через {RETRY_DELAY:.0f} сек.")
+                    await asyncio.sleep(RETRY_DELAY)
+        except Exception as e:
+            db.rollback()
+            print(f"[!] Задача {job.id} завершилась ошибкой: {e}")
+            finish_parse_job(db, job, error=str(e))
+            return
+
+        if cancelled:
+            cancel_parse_job(db, job)
+            print(f"[worker] Задача {job.id} отменена, сохранено {job.tenders_count} тендеров")
+            return
+
+        if tracker:
+            skip_pending_pages(db, job)
+            tracker.apply(profile)
+            profile.updated_at = datetime.now(timezone.utc)
+            db.commit()
+
+        failed_pages = [page for page in job.pages if page.status == "failed"]
+        if failed_pages and len(failed_pages) == len(job.pages):
+            finish_parse_job(db, job, error="Не удалось загрузить ни одной страницы")
+            return
+
+        finish_parse_job(db, job)
+        print(f"[✅] Задача {job.id}: сохранено {job.tenders_count} тендеров")
+    finally:
+        db.close()
+
+
+def report_progress(job: ParseJob, reported: int) -> int:
+    """Скорость и оценка времени раз в PROGRESS_EVERY страниц; повторы страниц прогресс не двигают"""
+    if job.pages_done == reported or (job.pages_done % PROGRESS_EVERY and job.pages_done != job.pages_total):
+        return reported
+    progress = job.to_dict()
+    eta = progress["etaSeconds"]
+    print(f"[worker] Задача {job.id}: {job.pages_done}/{job.pages_total} стр., "
+          f"{progress['pagesPerMinute']} стр./мин" + (f", осталось ~{eta // 60} мин." if eta is not None else ""))
+    return job.pages_done
+
+
+async def worker_loop(worker_id: str):
+    try:
+        while not _stopping:
+            db = SessionLocal()
+            try:
+                job = claim_parse_job(db, worker_id)
+                job_id = job.id if job else None
+            finally:
+                db.close()
+
+            if job_id is None:
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            print(f"[worker {worker_id}] Взята задача {job_id}")
+            await run_job(job_id)
+    finally:
+        await close_crawl_engine()
+        await close_throttle()
+
+
+def run_worker():
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"[worker {worker_id}] Запущен")
+    # Один event loop на весь процесс: пул соединений CrawlEngine живёт между задачами
+    asyncio.run(worker_loop(worker_id))
+
+
+def main():
+    init_db()
+
+    arg_parser = argparse.ArgumentParser(description="Воркер очереди парсинга zakupki.gov.ru")
+    arg_parser.add_argument("--processes", type=int, default=WORKER_PROCESSES,
+                            help="Количество процессов-воркеров")
+    args = arg_parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker()
+        return
+
+    processes = [multiprocessing.Process(target=run_worker) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    # Пробрасываем остановку дочерним процессам, они доработают текущие задачи
+    def stop_children(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop_children)
+    signal.signal(signal.SIGINT, stop_children)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,10 @@
-import requests
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor
-import time, random
+import asyncio
+import itertools
+import os
 from tqdm import tqdm
 from models.parse import ParseFilters, ALLOWED_SORT_BY_STRINGS
-from database.models import ParsedTender
-from fastapi import HTTPException
+from parser.crawler import CrawlEngine, CrawlError, get_crawl_engine
+from parser.extractors import TenderExtractor, TenderRecord, get_extractor
 
 url_base = "https://zakupki.gov.ru/epz/contract/search/results.html"
 params = (
@@ -14,82 +13,79 @@ params = (
     "&budgetLevelsIdNameHidden=%7B%7D"
     "&recordsPerPage=_50&showLotsInfoHidden=false"
 )
+RECORDS_PER_PAGE = 50  # recordsPerPage=_50
 headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 YaBrowser/25.2.2.0 Yowser/2.5 Safari/537.36",
             "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
             "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
             "Connection": "keep-alive",
             "Referer": "https://zakupki.gov.ru/"}
 
+# Сколько страниц загружается одновременно; остальные ждут своей очереди,
+# а не висят сотнями задач в ограничителе
+PARSE_PAGE_WINDOW = int(os.getenv("PARSE_PAGE_WINDOW", "6"))
 
-def parse_zakupki(filters: ParseFilters):
-    max_workers = 3
-    all_results: list[ParsedTender] = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        pages = list(range(filters.pageStart, filters.pageEnd + 1))
-        tasks = [(filters, page) for page in pages]
-        futures = list(tqdm(executor.map(parse_page, tasks), total=len(pages)))
 
-    for page_results in futures:
-        all_results.extend(page_results)
+async def parse_zakupki(filters: ParseFilters, sequential: bool = False, pages: list[int] | None = None):
+    """
+    Парсит диапазон страниц через общий CrawlEngine и отдаёт страницы
+    по мере готовности: (page_number, records, error). Результаты не копятся
+    в памяти — вызывающий сразу пишет их в БД и пишет в лог ошибки. Страница,
+    которую не удалось загрузить или разобрать (сеть, изменившаяся вёрстка),
+    приходит с error, а не роняет весь проход — её повторяет воркер.
 
-    return all_results
+    sequential=True загружает страницы строго по порядку и следующую только
+    после того, как вызывающий обработал предыдущую, — так инкрементальный
+    проход может остановиться, не запросив лишних страниц.
 
+    pages — конкретные номера страниц (продолжение задачи, повтор упавших);
+    по умолчанию весь диапазон pageStart..pageEnd.
+    """
+    engine = get_crawl_engine()
+    extractor = get_extractor()
+    if pages is None:
+        pages = list(range(filters.pageStart, filters.pageEnd + 1))
 
-def parse_page(args: tuple[ParseFilters, int]):
-    filters, page_number = args
-    url = build_url(filters, page_number)
+    async def run(page_number: int):
+        try:
+            return page_number, await parse_page(engine, extractor, filters, page_number), None
+        except asyncio.CancelledError:
+            raise
+        except CrawlError as e:
+            return page_number, [], str(e)
+        except Exception as e:
+            return page_number, [], f"Ошибка разбора страницы: {e.__class__.__name__}: {e}"
+
+    if sequential:
+        for page in pages:
+            yield await run(page)
+        return
+
+    queue = iter(pages)
+    window = {asyncio.create_task(run(page)) for page in itertools.islice(queue, PARSE_PAGE_WINDOW)}
     try:
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-    except Exception as e:
-        print(f"[!] Ошибка на стр. {page_number}: {e}")
-        return []
+        with tqdm(total=len(pages)) as bar:
+            while window:
+                done, window = await asyncio.wait(window, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    next_page = next(queue, None)
+                    if next_page is not None:
+                        window.add(asyncio.create_task(run(next_page)))
+                    bar.update()
+                    yield task.result()
+    finally:
+        # Вызывающий остановился раньше (отмена задачи) — недогруженные страницы не нужны
+        for task in window:
+            task.cancel()
+        await asyncio.gather(*window, return_exceptions=True)
 
 
-    if response.status_code != 200:
-        raise HTTPException(status_code=502, detail="Ошибка загрузки страницы с zakupki.gov.ru")
-    
-    soup = BeautifulSoup(response.text, "html.parser")
-    results: list[ParsedTender] = []
-    
-    for block in soup.select(".search-registry-entry-block"):
-        try:
-            title_block = block.select_one(".registry-entry__header-mid__number")
-            title = title_block.get_text(strip=True)
-            link = title_block.select_one("a")["href"]
-            customer = block.select_one(".registry-entry__body-href").get_text(strip=False)
-            price = block.select_one(".price-block__value").get_text(strip=True)
-            contractNumber = block.select_one(".registry-entry__body-value").get_text(strip=True).replace('\n', '').replace(' ', '').replace("№", "№ ")
-            try:
-                purchaseObjects = block.select_one(".lots-wrap-content__body__val span span").get_text(strip=False)
-            except Exception as e:
-                purchaseObjects = ""
-            dates = block.select(".data-block__value")
-            contractDate = dates[0].get_text(strip=True)
-            executionDate = dates[1].get_text(strip=True)
-            publishDate = dates[2].get_text(strip=True)
-            updateDate = dates[3].get_text(strip=True)
-            # status_block = block.select_one(".registry-entry__header-mid__title")
-            # status = status_block.get_text(strip=True).lower() if status_block else ""
-            
-            results.append(ParsedTender(
-                title=title,
-                link=f"https://zakupki.gov.ru{link}",
-                customer=customer,
-                price=price,
-                contract_number=contractNumber,
-                purchase_objects=purchaseObjects,
-                contract_date=contractDate,
-                execution_date=executionDate,
-                publish_date=publishDate,
-                update_date=updateDate
-            ))
+async def parse_page(engine: CrawlEngine, extractor: TenderExtractor,
+                     filters: ParseFilters, page_number: int) -> list[TenderRecord]:
+    url = build_url(filters, page_number)
+    html = await engine.fetch_text(url, headers=headers)
 
-        except Exception as e:
-            continue
-        
-    time.sleep(random.uniform(1.0, 2.5))
-    return results
+    # Разбор страницы — CPU-работа, уводим её из event loop (lxml при этом отпускает GIL)
+    return await asyncio.to_thread(extractor.extract, html)
 
 def build_url(filters: ParseFilters, page_number: int):
     url = f"{url_base}{params}&pageNumber={page_number}"
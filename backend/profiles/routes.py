@@ -0,0 +1,142 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from auth.roles import require_role
+from auth.principal_cache import Principal
+from database.deps import get_db
+from database.models import CrawlSchedule, FilterProfile
+from models.crawl_schedule import CrawlScheduleCreate
+from models.filter_profile import FilterProfileCreate
+from models.parse import ParseFilters, UPDATE_DATE
+from parser.jobs import enqueue_parse_job
+from parser.scheduler import first_run_at
+
+router = APIRouter()
+
+
+def get_own_profile(db: Session, profile_id: int, user: Principal) -> FilterProfile:
+    profile = db.query(FilterProfile).filter_by(id=profile_id).first()
+    if not profile:
+        raise HTTPException(404, detail="Профиль не найден")
+    if profile.owner_username != user.username:
+        raise HTTPException(403, detail="Недостаточно прав")
+    return profile
+
+
+@router.post("/filter-profiles")
+def create_profile(data: FilterProfileCreate, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    existing = db.query(FilterProfile).filter_by(owner_username=user.username, name=data.name).first()
+    if existing:
+        raise HTTPException(400, detail="Профиль с таким названием уже существует")
+
+    profile = FilterProfile(
+        name=data.name,
+        owner_username=user.username,
+        filters=data.filters.model_dump(exclude_unset=True),
+        watermark_numbers=[],
+    )
+    db.add(profile)
+    db.commit()
+    db.refresh(profile)
+    return profile.to_dict()
+
+
+@router.get("/filter-profiles")
+def get_profiles(db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    profiles = db.query(FilterProfile).filter_by(owner_username=user.username)\
+        .order_by(FilterProfile.name.asc()).all()
+    return [profile.to_dict() for profile in profiles]
+
+
+@router.put("/filter-profiles/{profile_id}")
+def update_profile(profile_id: int, data: FilterProfileCreate, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    profile = get_own_profile(db, profile_id, user)
+    filters = data.filters.model_dump(exclude_unset=True)
+    if filters != profile.filters:
+        # Другие фильтры — другая выборка, старая отметка к ней не относится
+        profile.watermark_date = None
+        profile.watermark_numbers = []
+    profile.name = data.name
+    profile.filters = filters
+    profile.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    return profile.to_dict()
+
+
+@router.delete("/filter-profiles/{profile_id}")
+def delete_profile(profile_id: int, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    profile = get_own_profile(db, profile_id, user)
+    db.delete(profile)
+    db.commit()
+    return {"msg": "Профиль удалён"}
+
+
+@router.post("/filter-profiles/{profile_id}/run", status_code=202)
+def run_profile(profile_id: int, incremental: bool = True, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    profile = get_own_profile(db, profile_id, user)
+    filters = ParseFilters(**profile.filters)
+
+    if incremental and (filters.sortBy != UPDATE_DATE or filters.sortAscending):
+        raise HTTPException(400, detail="Инкрементальный режим работает только с сортировкой по дате обновления по убыванию")
+
+    job = enqueue_parse_job(db, filters, user.username, profile_id=profile.id, incremental=incremental)
+    return {"msg": "Парсинг поставлен в очередь", "jobId": job.id, "status": job.status}
+
+
+def get_own_schedule(db: Session, schedule_id: int, user: Principal) -> CrawlSchedule:
+    schedule = db.query(CrawlSchedule).filter_by(id=schedule_id).first()
+    if not schedule:
+        raise HTTPException(404, detail="Расписание не найдено")
+    if schedule.owner_username != user.username:
+        raise HTTPException(403, detail="Недостаточно прав")
+    return schedule
+
+
+def apply_schedule(db: Session, schedule: CrawlSchedule, data: CrawlScheduleCreate, user: Principal):
+    profile = get_own_profile(db, data.profileId, user)
+    filters = ParseFilters(**profile.filters)
+    if data.incremental and (filters.sortBy != UPDATE_DATE or filters.sortAscending):
+        raise HTTPException(400, detail="Инкрементальный режим работает только с сортировкой по дате обновления по убыванию")
+
+    schedule.profile_id = profile.id
+    schedule.interval_minutes = data.intervalMinutes
+    schedule.cron = data.cron
+    schedule.incremental = data.incremental
+    schedule.jitter_seconds = data.jitterSeconds
+    schedule.enabled = data.enabled
+    now = datetime.now(timezone.utc)
+    schedule.next_run_at = first_run_at(schedule, now)
+    schedule.updated_at = now
+
+
+@router.post("/crawl-schedules")
+def create_schedule(data: CrawlScheduleCreate, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    schedule = CrawlSchedule(owner_username=user.username, skipped_runs=0)
+    apply_schedule(db, schedule, data, user)
+    db.add(schedule)
+    db.commit()
+    db.refresh(schedule)
+    return schedule.to_dict()
+
+
+@router.get("/crawl-schedules")
+def get_schedules(db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    schedules = db.query(CrawlSchedule).filter_by(owner_username=user.username)\
+        .order_by(CrawlSchedule.id.asc()).all()
+    return [schedule.to_dict() for schedule in schedules]
+
+
+@router.put("/crawl-schedules/{schedule_id}")
+def update_schedule(schedule_id: int, data: CrawlScheduleCreate, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    schedule = get_own_schedule(db, schedule_id, user)
+    apply_schedule(db, schedule, data, user)
+    db.commit()
+    return schedule.to_dict()
+
+
+@router.delete("/crawl-schedules/{schedule_id}")
+def delete_schedule(schedule_id: int, db: Session = Depends(get_db), user: Principal = Depends(require_role("admin", "owner"))):
+    schedule = get_own_schedule(db, schedule_id, user)
+    db.delete(schedule)
+    db.commit()
+    return {"msg": "Расписание удалено"}
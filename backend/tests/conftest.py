@@ -0,0 +1,27 @@
+import os
+import sys
+import pytest
+
+# Модули читают окружение при импорте; create_engine к базе не подключается.
+# Тесты, которым нужен Postgres, пропускаются без DATABASE_URL (см. database_available)
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/tenders")
+os.environ.setdefault("THROTTLE_BACKEND", "local")
+os.environ.setdefault("SECRET_KEY", "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Postgres из DATABASE_URL с применёнными миграциями; без базы тест пропускается"""
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from database.database import engine
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except OperationalError:
+        pytest.skip("Postgres недоступен")
+    from database.migrations import init_db
+    init_db()
+    return engine
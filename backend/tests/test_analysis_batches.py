@@ -0,0 +1,68 @@
+import asyncio
+import uuid
+from sqlalchemy import delete
+import llm.analysis_batches as analysis_batches
+import llm.analysis_runs as analysis_runs
+from database.database import AsyncSessionLocal, SessionLocal, async_engine
+from database.models import AnalysisBatch, ParsedTender, ParseSession, ParseSessionTender, TenderAnalysis, User
+
+
+def make_session(username: str, tenders: int) -> tuple[int, list[int]]:
+    with SessionLocal() as db:
+        db.add(User(username=username, hashed_password="-", role="admin"))
+        db.flush()
+        session = ParseSession(owner_username=username)
+        rows = [ParsedTender(title=f"test-{uuid.uuid4()}") for _ in range(tenders)]
+        db.add_all([session, *rows])
+        db.flush()
+        db.add_all([ParseSessionTender(session_id=session.id, tender_id=row.id) for row in rows])
+        db.commit()
+        return session.id, [row.id for row in rows]
+
+
+def drop_session(username: str, session_id: int, tender_ids: list[int]):
+    with SessionLocal() as db:
+        db.execute(delete(AnalysisBatch).where(AnalysisBatch.session_id == session_id))
+        db.execute(delete(TenderAnalysis).where(TenderAnalysis.tender_id.in_(tender_ids)))
+        db.execute(delete(ParseSessionTender).where(ParseSessionTender.session_id == session_id))
+        db.execute(delete(ParseSession).where(ParseSession.id == session_id))
+        db.execute(delete(ParsedTender).where(ParsedTender.id.in_(tender_ids)))
+        db.execute(delete(User).where(User.username == username))
+        db.commit()
+
+
+def test_repeat_request_joins_slow_batch(database, monkeypatch):
+    async def slow_analysis(tender, progress):
+        await asyncio.sleep(1.5)
+        return "Анализ"
+
+    # Анализ идёт втрое дольше порога устаревания — пакет держит только отметка
+    monkeypatch.setattr(analysis_runs, "analyze_tender", slow_analysis)
+    monkeypatch.setattr(analysis_batches, "ANALYSIS_STALE_AFTER", 0.5)
+    monkeypatch.setattr(analysis_batches, "BATCH_HEARTBEAT_INTERVAL", 0.15)
+    username = f"test-{uuid.uuid4().hex[:8]}"
+    session_id, tender_ids = make_session(username, 2)
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as db:
+                first, created = await analysis_batches.create_batch(db, session_id, username)
+            assert created
+
+            await asyncio.sleep(1.0)
+            async with AsyncSessionLocal() as db:
+                repeat, created = await analysis_batches.create_batch(db, session_id, username)
+            assert not created
+            assert repeat.id == first.id
+
+            await asyncio.gather(*analysis_batches._batches.values())
+            async with AsyncSessionLocal() as db:
+                batch = await db.get(AnalysisBatch, first.id)
+                return batch.status, batch.done_count
+        finally:
+            await async_engine.dispose()
+
+    try:
+        assert asyncio.run(run()) == ("done", 2)
+    finally:
+        drop_session(username, session_id, tender_ids)
@@ -0,0 +1,46 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import llm.doc_cache as doc_cache_module
+from llm.doc_cache import DocumentCache
+
+
+def test_counters_exact_under_threads(tmp_path):
+    cache = DocumentCache(str(tmp_path), 1024 ** 3)
+    cache.put_chunk_result("ab" * 32, "выдержка")
+    reads = 4000
+
+    def read(index: int):
+        key = "ab" * 32 if index % 2 else "cd" * 32
+        return cache.get_chunk_result(key)
+
+    with ThreadPoolExecutor(16) as pool:
+        list(pool.map(read, range(reads)))
+
+    stats = cache.stats()
+    assert stats["chunk_hit"] == reads // 2
+    assert stats["chunk_miss"] == reads // 2
+    assert stats["chunk_hit_rate"] == 0.5
+
+
+def test_stale_missing_link_counts_as_miss(tmp_path, monkeypatch):
+    cache = DocumentCache(str(tmp_path), 1024 ** 3)
+    cache.put_link("0123", "")
+    assert cache.get_link("0123") == ""
+
+    monkeypatch.setattr(doc_cache_module, "DOC_NO_LINK_TTL", 60)
+    path = os.path.join(str(tmp_path), "links", doc_cache_module.sha256(b"0123"))
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert cache.get_link("0123") is None
+    assert cache.stats()["link_hit"] == 1
+    assert cache.stats()["link_miss"] == 1
+
+
+def test_evictions_are_counted(tmp_path):
+    cache = DocumentCache(str(tmp_path), 1000)
+    for index in range(5):
+        cache.put_chunk_result(f"{index:02d}" * 32, "x" * 300)
+    stats = cache.stats()
+    assert stats["evicted"] >= 2
+    assert stats["evicted_bytes"] >= 600
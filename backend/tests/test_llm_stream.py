@@ -0,0 +1,88 @@
+import asyncio
+import aiohttp
+import orjson
+from aiohttp import web
+import llm.analysis as analysis
+import llm.clients as clients
+
+WORDS = ["Договор", " содержит", " условие", " о", " неустойке", " и", " сроках."]
+
+
+def chunk(text: str) -> bytes:
+    return orjson.dumps({"result": {"alternatives": [{"message": {"text": text}}]}}) + b"\n"
+
+
+async def with_fake_llm(handler, read_timeout: float, call):
+    app = web.Application()
+    app.router.add_post("/completion", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    connections, _ = clients.CLIENTS["llm"]
+    saved_url, saved_client = analysis.LLM_URL, clients.CLIENTS["llm"]
+    analysis.LLM_URL = f"http://127.0.0.1:{port}/completion"
+    clients.CLIENTS["llm"] = (connections, aiohttp.ClientTimeout(total=None, sock_read=read_timeout))
+    try:
+        return await call()
+    finally:
+        analysis.LLM_URL, clients.CLIENTS["llm"] = saved_url, saved_client
+        await clients.close_http_clients()
+        await runner.cleanup()
+
+
+def slow_stream(delay: float):
+    async def handler(request):
+        body = await request.json()
+        assert body["completionOptions"]["stream"] is True
+        response = web.StreamResponse()
+        await response.prepare(request)
+        text = ""
+        for word in WORDS:
+            await asyncio.sleep(delay)
+            text += word
+            await response.write(chunk(text))
+        await response.write_eof()
+        return response
+    return handler
+
+
+def test_llm_client_has_no_total_timeout():
+    _, timeout = clients.CLIENTS["llm"]
+    assert timeout.total is None
+    assert timeout.sock_read
+
+
+def test_stream_longer_than_read_timeout_completes():
+    deltas = []
+
+    async def call():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await analysis.complete("текст", 100, on_text=deltas.append)
+        return result, loop.time() - started
+
+    # Весь ответ идёт ~1.4 сек — дольше таймаута чтения, но паузы между кусками короче
+    result, elapsed = asyncio.run(with_fake_llm(slow_stream(0.2), 0.5, call))
+    assert result == "".join(WORDS)
+    assert "".join(deltas) == result
+    assert elapsed > 1.0
+
+
+def test_non_streaming_caller_reads_stream():
+    result = asyncio.run(with_fake_llm(slow_stream(0.05), 0.5, lambda: analysis.complete("текст", 100)))
+    assert result == "".join(WORDS)
+
+
+def test_stalled_stream_times_out():
+    async def stalled(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(chunk("Начало"))
+        await asyncio.sleep(2)
+        return response
+
+    result = asyncio.run(with_fake_llm(stalled, 0.3, lambda: analysis.complete("текст", 100)))
+    assert result is None
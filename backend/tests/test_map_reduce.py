@@ -0,0 +1,32 @@
+import asyncio
+import pytest
+import llm.analysis as analysis
+from llm.doc_cache import DocumentCache
+
+PAGE = "Поставщик обязуется поставить товар, а Заказчик — принять и оплатить его. " * 40
+
+
+def test_failed_reduce_keeps_chunk_extracts(tmp_path, monkeypatch):
+    calls = []
+    fail_reduce = True
+
+    async def complete(message: str, max_tokens: int, temperature: float = 0.6, on_text=None):
+        calls.append(max_tokens)
+        if max_tokens == analysis.LLM_MAX_TOKENS and fail_reduce:
+            return None
+        return "Выдержка: неустойка 0,1% в день"
+
+    monkeypatch.setattr(analysis, "complete", complete)
+    monkeypatch.setattr(analysis, "doc_cache", DocumentCache(str(tmp_path), 1024 ** 3))
+    chunks = analysis.split_into_chunks("\n\n".join(PAGE for _ in range(20)))
+    assert len(chunks) > 1
+
+    with pytest.raises(analysis.AnalysisError, match="выдержки"):
+        asyncio.run(analysis.analyze_long_contract(chunks))
+    assert calls.count(analysis.LLM_MAP_MAX_TOKENS) == len(chunks)
+
+    # Повтор: фрагменты берутся из кеша, запрашивается только итоговый анализ
+    calls.clear()
+    fail_reduce = False
+    assert asyncio.run(analysis.analyze_long_contract(chunks))
+    assert calls == [analysis.LLM_MAX_TOKENS]
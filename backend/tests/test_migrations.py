@@ -0,0 +1,42 @@
+import uuid
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import text
+from database.migrations import backfill_typed_columns
+from parser.normalize import parse_price
+
+PRICES = {
+    "1 234 567,89 ₽": Decimal("1234567.89"),
+    "0,125": Decimal("0.12"),  # до чётного, в SQL было бы 0.13
+    "0,135": Decimal("0.14"),
+    "12345678901234567890,00": None,  # вне NUMERIC(18, 2)
+    "цена не указана": None,
+}
+
+
+def test_parse_price_rounds_half_even_and_rejects_overflow():
+    for raw, expected in PRICES.items():
+        assert parse_price(raw) == expected
+
+
+def test_backfill_matches_parse_price(database):
+    prefix = f"test-backfill-{uuid.uuid4().hex[:8]}-"
+    with database.begin() as conn:
+        for index, raw in enumerate(PRICES):
+            conn.execute(text(
+                "INSERT INTO parsed_tenders (title, price, contract_date, update_date) VALUES (:title, :price, :contract, :update)"
+            ), {"title": f"{prefix}{index}", "price": raw, "contract": " 05.03.2024 ", "update": "31.02.2024"})
+    try:
+        with database.begin() as conn:
+            backfill_typed_columns(conn, f"title LIKE '{prefix}%'")
+            rows = conn.execute(text(
+                "SELECT price, price_value, contract_date_value, update_date_value FROM parsed_tenders WHERE title LIKE :prefix"
+            ), {"prefix": f"{prefix}%"}).all()
+        assert len(rows) == len(PRICES)
+        for raw, price_value, contract_date_value, update_date_value in rows:
+            assert price_value == PRICES[raw]
+            assert contract_date_value == date(2024, 3, 5)
+            assert update_date_value is None
+    finally:
+        with database.begin() as conn:
+            conn.execute(text("DELETE FROM parsed_tenders WHERE title LIKE :prefix"), {"prefix": f"{prefix}%"})
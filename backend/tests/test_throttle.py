@@ -0,0 +1,35 @@
+import asyncio
+import time
+import parser.throttle as throttle
+
+
+def test_cancel_during_acquire_releases_slot(monkeypatch):
+    monkeypatch.setitem(throttle.UPSTREAMS, "test", throttle.UpstreamConfig(
+        rate=100, burst=100, concurrency=1, breaker_threshold=5, breaker_cooldown=1))
+    acquire = throttle._acquire
+
+    def slow_acquire(name, config):
+        # Слот выдаётся уже после того, как ожидающего отменили
+        time.sleep(0.3)
+        return acquire(name, config)
+
+    monkeypatch.setattr(throttle, "_acquire", slow_acquire)
+
+    async def run():
+        async def request():
+            async with throttle.throttle("test"):
+                pass
+
+        task = asyncio.create_task(request())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0.5)
+        assert task.cancelled()
+        assert throttle._local._in_flight["test"] == 0
+
+        # Единственный слот свободен — следующий запрос проходит сразу
+        monkeypatch.setattr(throttle, "_acquire", acquire)
+        await asyncio.wait_for(request(), 1)
+
+    asyncio.run(run())
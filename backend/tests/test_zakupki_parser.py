@@ -0,0 +1,38 @@
+import asyncio
+import parser.zakupki_parser as zakupki_parser
+from models.parse import ParseFilters
+from parser.crawler import CrawlError
+from parser.extractors import TenderExtractor, TenderRecord
+
+
+class FakeEngine:
+    async def fetch_text(self, url: str, headers=None) -> str:
+        if "pageNumber=2&" in url:
+            raise CrawlError("HTTP 503")
+        return url
+
+
+class FakeExtractor(TenderExtractor):
+    def extract(self, html: str) -> list[TenderRecord]:
+        if "pageNumber=3&" in html:
+            return None.records  # вёрстка изменилась, блока нет
+        return [TenderRecord(html[-20:], *[""] * 9)]
+
+    def extract_total(self, html: str) -> int | None:
+        return None
+
+
+def test_page_errors_do_not_stop_the_crawl(monkeypatch):
+    monkeypatch.setattr(zakupki_parser, "get_crawl_engine", FakeEngine)
+    monkeypatch.setattr(zakupki_parser, "get_extractor", FakeExtractor)
+    filters = ParseFilters(pageStart=1, pageEnd=4)
+
+    async def crawl():
+        return [result async for result in zakupki_parser.parse_zakupki(filters)]
+
+    results = {page: (records, error) for page, records, error in asyncio.run(crawl())}
+    assert sorted(results) == [1, 2, 3, 4]
+    assert results[2] == ([], "HTTP 503")
+    assert results[3][0] == [] and "AttributeError" in results[3][1]
+    assert results[1][1] is None and len(results[1][0]) == 1
+    assert results[4][1] is None
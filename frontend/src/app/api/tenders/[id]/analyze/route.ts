@@ -3,6 +3,55 @@ import { NextRequest, NextResponse } from 'next/server';
 import { cookies } from 'next/headers';
 import { getTokenFromCookies } from '@/libs/auth';
 
+// Бэкенд ждёт результат ограниченное время, затем отвечает 202 со статусом running —
+// тогда опрашиваем GET /tenders/{id}/analysis, пока анализ не завершится
+const ANALYSIS_POLL_INTERVAL_MS = 3000;
+const EMPTY_RESULT = 'Не удалось получить ответ';
+
+type AnalysisStatus = {
+  status: 'running' | 'done' | 'failed';
+  analysis: string | null;
+  error: string | null;
+};
+
+const sleep = (ms: number, signal: AbortSignal) =>
+  new Promise<void>((resolve, reject) => {
+    const timer = setTimeout(resolve, ms);
+    signal.addEventListener('abort', () => {
+      clearTimeout(timer);
+      reject(signal.reason);
+    }, { once: true });
+  });
+
+async function pollAnalysis(tenderId: string, headers: HeadersInit, signal: AbortSignal): Promise<NextResponse> {
+  while (true) {
+    await sleep(ANALYSIS_POLL_INTERVAL_MS, signal);
+    const res = await apiFetch(`/tenders/${tenderId}/analysis`, { headers, signal });
+    if (!res.ok) {
+      const error = await res.json().catch(() => ({}));
+      return NextResponse.json(
+        { detail: error.detail || 'Ошибка анализа тендера' },
+        { status: res.status }
+      );
+    }
+
+    const data: AnalysisStatus = await res.json();
+    console.log('[API] Analysis status:', data.status);
+    if (data.status === 'done') {
+      return NextResponse.json({ analysis: data.analysis, cached: false });
+    }
+    if (data.status === 'failed') {
+      if (data.error === EMPTY_RESULT) {
+        return NextResponse.json({ analysis: EMPTY_RESULT, cached: false });
+      }
+      return NextResponse.json(
+        { detail: `Ошибка анализа: ${data.error}` },
+        { status: 500 }
+      );
+    }
+  }
+}
+
 type RouteParams = {
   params: Promise<{
     id: string;
@@ -40,18 +89,25 @@ export async function POST(
     const tenderId = params.id;
     console.log('[API] Processing analysis for tender:', tenderId);
 
+    const headers = {
+      'Accept': 'application/json',
+      'Content-Type': 'application/json',
+      'Cookie': cookieHeader,
+      'Authorization': `Bearer ${token}`
+    };
+
     console.log('[API] Sending request to backend');
     const res = await apiFetch(`/tenders/${tenderId}/analyze`, {
       method: 'POST',
-      headers: {
-        'Accept': 'application/json',
-        'Content-Type': 'application/json',
-        'Cookie': cookieHeader,
-        'Authorization': `Bearer ${token}`
-      },
+      headers,
       credentials: 'include'
     });
     console.log('[API] Backend response status:', res.status);
+
+    if (res.status === 202) {
+      // Анализ ещё идёт — ждём его, пока клиент не закрыл запрос
+      return await pollAnalysis(tenderId, headers, request.signal);
+    }
     
     // Сначала получаем текст ответа
     const responseText = await res.text();